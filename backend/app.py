@@ -1,14 +1,22 @@
+from helpers import startup
+startup.profile_imports()
+
 import os
+import sys
 import json
-from flask import Flask, request, jsonify, render_template
+import time
+import signal
+import threading
+from collections import OrderedDict
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from flask import Flask, Response, request, jsonify, render_template, g
 from flask_cors import CORS
-import numpy as np
-from helpers.matrix import (
-    name_ing_data,
-    top_ten,
-)
+from helpers import metrics
+from helpers.matrix import top_ten, top_ten_for_vector, top_ten_vector, top_latent, format_recipe, food_warnings
 from helpers.cossimNameMatch import cossimNameMatch
-from helpers.reviews import rating_count_weight
+from helpers.artifacts import holder, activate, follow_review_log, watch_active_bundle
+from helpers.singleflight import SingleFlight
+from helpers.budget import Budget
 
 
 app = Flask(__name__)
@@ -17,15 +25,147 @@ CORS(app)
 base_dir = os.path.dirname(os.path.abspath(__file__)) # backend directory
 data_dir = os.path.join(base_dir, "data", "flavors")
 
-# Assuming 'matrix.py' provides these details
-from helpers.matrix import collect_flavor_profiles_from_directory, create_dict_from_directory, dish_id_ingr, recipes_file
-all_flavor_profiles = collect_flavor_profiles_from_directory(data_dir)
-json_dict = create_dict_from_directory(data_dir)
-# name_ing_data = dish_id_ingr(recipes_file, base_dir)
+# Load every data artifact the routes need, in dependency order: dish names/ids/ingredients,
+# flavor profiles and the SVD flavor matrix, then the review weights (ordered by dish id),
+# then the TF-IDF name index and the recipe detail store (RECIPE_STORE=json|db).
+# The versioned bundle is picked by helpers/artifacts.py and can be hot-swapped later.
+holder.load()
+startup.finish()
+
+# Latency budget of /get_similar_dishes; past it optional stages are skipped or cached neighbours served
+SIMILAR_DISHES_BUDGET = float(os.environ.get("SIMILAR_DISHES_BUDGET_MS", 800)) / 1000
+
+# How long a request without a cached result may wait in total for its computation (default: 5 budgets)
+SIMILAR_DISHES_MAX_WAIT = float(os.environ.get("SIMILAR_DISHES_MAX_WAIT_MS", 5000 * SIMILAR_DISHES_BUDGET)) / 1000
+
+# Concurrent requests for the same dish share one top_ten computation. A finished one stays joinable for
+# SIMILAR_DISHES_MAX_WAIT, so a request that timed out just before it finished still gets its result.
+similar_dishes_flight = SingleFlight("top_ten", linger=SIMILAR_DISHES_MAX_WAIT)
+
+# Last complete results of /get_similar_dishes by (dish, data version), served when a request runs out of budget
+SIMILAR_DISHES_CACHE_SIZE = 1024
+similar_dishes_cache = OrderedDict()
+similar_dishes_cache_lock = threading.Lock()
+
+# Built once and reused: compact separators, no key sorting and no circular reference checks keep
+# serialization on the C encoder's fast path
+fast_json = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"), check_circular=False)
+
+# How long browsers and proxies may reuse a /recipe/<id> response; the ETag covers data reloads
+RECIPE_MAX_AGE = int(os.environ.get("RECIPE_MAX_AGE", 86400))
+
+# REVIEW_LOG names an append-only review log whose new reviews are folded into the rating weights
+# (helpers/reviews.py); every worker process follows it with its own thread
+REVIEW_LOG = os.environ.get("REVIEW_LOG")
+
+# Every worker process reloads when the active bundle changes, checking every BUNDLE_POLL_SECONDS (0: never)
+BUNDLE_POLL_SECONDS = float(os.environ.get("BUNDLE_POLL_SECONDS", 10))
+
+background_pid = [None]
+background_lock = threading.Lock()
+
+# Serializes writes of the shared 'input_vector.txt' between request threads
+input_file_lock = threading.Lock()
+
+def reload_on_signal(signum, frame):
+    holder.reload_async()
+
+def install_reload_signal():
+    """
+    Make SIGHUP reload the active bundle in the background. Under gunicorn this must run in each
+    worker (gunicorn.conf.py post_worker_init): workers reset SIGHUP, and a HUP to the master only
+    restarts the workers from the data preloaded in it.
+    """
+    try:
+        signal.signal(signal.SIGHUP, reload_on_signal)
+    except (AttributeError, ValueError):
+        # Not available on Windows, or not running in the main thread
+        pass
+
+def start_background_threads():
+    """
+    Start the bundle watcher and the review log follower of this process, once per process: threads
+    of a preloaded gunicorn master do not survive the fork.
+    """
+    if background_pid[0] == os.getpid():
+        return
+    with background_lock:
+        if background_pid[0] != os.getpid():
+            background_pid[0] = os.getpid()
+            if BUNDLE_POLL_SECONDS > 0:
+                watch_active_bundle(holder, BUNDLE_POLL_SECONDS)
+            if REVIEW_LOG:
+                follow_review_log(holder, REVIEW_LOG, float(os.environ.get("REVIEW_POLL_SECONDS", 5)))
+
+# For the development server; gunicorn workers install it again in post_worker_init
+install_reload_signal()
+
+@app.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+
+@app.before_request
+def ensure_background_threads():
+    # Gunicorn workers start them in post_worker_init, other servers on the first request
+    start_background_threads()
 
-# Load the SVD flavor matrix
-dish_latentflavors_path = os.path.join(base_dir, "data", "dish-latent-flavors-matrix.npy")
-dish_latentflavors = np.load(dish_latentflavors_path)
+@app.after_request
+def record_request(response):
+    """
+    Record the latency and status of every request for the /metrics endpoint.
+    """
+    endpoint = request.endpoint or "unknown"
+    start = g.get("request_start")
+    if start is not None:
+        metrics.observe(f"route.{endpoint}", time.perf_counter() - start)
+    metrics.incr("requests_total", endpoint)
+    if response.status_code >= 500:
+        metrics.incr("request_errors_total", endpoint)
+    artifacts = g.get("artifacts") or holder.current
+    if artifacts is not None:
+        response.headers["X-Data-Version"] = artifacts.version
+    return response
+
+@app.route("/admin/reload", methods=["POST"])
+def admin_reload():
+    """
+    Load a data bundle in the background and swap it in once it is fully loaded. With {"version": ...} that
+    bundle is activated first (data/bundles/CURRENT), so the other worker processes load it too within
+    BUNDLE_POLL_SECONDS. Requires the X-Admin-Token header to match ADMIN_TOKEN; without ADMIN_TOKEN only
+    local requests are allowed.
+
+    Returns:
+        jsonify: JSON response with the version currently served and whether a reload was started.
+        status (int): 202 when a reload was started, 409 when one is already running, 400 for a version that
+                      is not a bundle name, 404 for an unknown version, 403 when the caller is not allowed.
+    """
+    token = os.environ.get("ADMIN_TOKEN")
+    if token is not None and request.headers.get("X-Admin-Token") != token:
+        return jsonify({"error": "forbidden"}), 403
+    if token is None and request.remote_addr not in ("127.0.0.1", "::1"):
+        return jsonify({"error": "forbidden"}), 403
+
+    version = (request.get_json(silent=True) or {}).get("version")
+    if version is not None:
+        try:
+            activate(version)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        except FileNotFoundError as e:
+            return jsonify({"error": str(e)}), 404
+    started = holder.reload_async(version)
+    return jsonify({"version": holder.current.version, "reloading": started,
+                    "last_error": holder.last_error}), (202 if started else 409)
+
+@app.route("/metrics", methods=["GET"])
+def metrics_page():
+    """
+    Expose per-stage latency histograms, request counts and cache hit ratios.
+
+    Returns:
+        Response: The metrics of all workers in the Prometheus text exposition format.
+    """
+    return Response(metrics.render_prometheus(), mimetype="text/plain; version=0.0.4")
 
 @app.route("/")
 def home():
@@ -46,7 +186,7 @@ def recipe_names():
         jsonify: JSON response containing a list of all dish names.
     """
     # Return all dish names as a list
-    return jsonify(name_ing_data[0])
+    return jsonify(holder.current.name_ing_data[0])
 
 @app.route('/filter_names', methods=['GET'])
 def filter_names():
@@ -62,7 +202,8 @@ def filter_names():
     if user_input:
         try:
             # Assuming cossimNameMatch and other required objects are defined/imported
-            filtered_names = cossimNameMatch(user_input)
+            artifacts = g.artifacts = holder.current
+            filtered_names = cossimNameMatch(user_input, artifacts.name_index, artifacts.names)
             return jsonify(filtered_names)
         except Exception as e:
             return jsonify({"error": str(e)}), 500
@@ -77,36 +218,199 @@ def store_user_input():
     Returns:
         jsonify: JSON response indicating the status and message of the operation; typically confirming successful storage.
     """
-    # Store the selected recipe name in 'input_vector.txt'
+    # Store the selected recipe name in 'input_vector.txt' (written atomically, readers never see a partial file)
     user_input = request.json.get("userInput")
     input_file_path = os.path.join(base_dir, "input_vector.txt")
-    with open(input_file_path, 'w') as file:
-        file.write(json.dumps(user_input))
+    with input_file_lock:
+        tmp_path = f"{input_file_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as file:
+            file.write(json.dumps(user_input))
+        os.replace(tmp_path, input_file_path)
     return jsonify({"status": "success", "message": "User input stored"})
 
 @app.route("/get_similar_dishes", methods=["POST"])
 def get_similar_dishes():
     """
-    Retrieve similar dishes based on a user's previously stored input. This function reads the user's input from a file,
-    and then utilizes a series of computations involving flavor profiles and ratings to determine similar dishes.
+    Retrieve similar dishes based on a user's input. The dish name is taken from the request body ({"userInput": ...});
+    requests without one fall back to the previously stored input in 'input_vector.txt', which is shared by all users.
+    It then utilizes a series of computations involving flavor profiles and ratings to determine similar dishes.
+
+    The request has a latency budget (SIMILAR_DISHES_BUDGET_MS, default 800). When the latent dimension explanations
+    are not expected to fit in it they are left empty, and a request waiting on an identical computation past its
+    budget is served the last complete result for that dish. Such responses carry an X-Degraded header naming what
+    was skipped ('latent_explanations', 'cached_neighbours'). The budget applies to the request that started the
+    computation too. Without a cached result a request keeps waiting on the computation, up to
+    SIMILAR_DISHES_MAX_WAIT_MS (default: five budgets) in total, and is answered with a 503 ('no_result') past it;
+    it never starts a second computation.
+
+    With {"view": "slim"} in the request body only what the result cards show is returned: one object per dish with
+    its id, name, scores, rating (null when the recipe has none), rating count, labels and a short summary. The
+    instructions are not formatted and the flavor dimensions are not computed for it; the full description,
+    instructions and matching flavor dimensions are fetched on demand from /recipe/<id>?similar_to=<dish>.
 
     Returns:
         jsonify: JSON response containing a list of dishes similar to the user's input. Each dish includes details such as
                  name, similarity score, and user ratings. If an error occurs, returns a JSON object with an 'error' key
                  and message detailing the exception.
-        status (int): HTTP status code indicating success (200) or internal server error (500).
+        status (int): HTTP status code indicating success (200), no result within SIMILAR_DISHES_MAX_WAIT_MS (503) or
+                      internal server error (500).
     """
-    # Load the user input from 'input_vector.txt'
-    input_file_path = os.path.join(base_dir, "input_vector.txt")
-    with open(input_file_path, 'r') as file:
-        user_input = json.loads(file.read())
+    body = request.get_json(silent=True) or {}
+    slim = body.get("view") == "slim"
+    user_input = body.get("userInput")
+    if user_input is None:
+        # Load the user input from 'input_vector.txt'
+        input_file_path = os.path.join(base_dir, "input_vector.txt")
+        with open(input_file_path, 'r') as file:
+            user_input = json.loads(file.read())
     
     # Fetch similar dishes based on the stored user input
+    budget = Budget("get_similar_dishes", SIMILAR_DISHES_BUDGET)
     try:
-        final_output = top_ten(user_input, name_ing_data, dish_latentflavors, recipes_file, rating_count_weight)
-        return jsonify(final_output)
+        artifacts = g.artifacts = holder.current
+        key = (user_input.lower(), artifacts.version, slim)
+
+        # The computation can outlive this request's wait, so it records its degradations in a budget of its own
+        compute_budget = Budget("get_similar_dishes", SIMILAR_DISHES_BUDGET)
+
+        def compute():
+            result = top_ten(user_input, artifacts.name_ing_data, artifacts.dish_latentflavors, artifacts.recipe_store,
+                             artifacts.rating_count_weight, artifacts.lat_dims, artifacts.search_index, compute_budget,
+                             slim)
+            if not compute_budget.degraded:
+                remember_similar_dishes(key, result)
+            return result, tuple(compute_budget.degraded)
+
+        try:
+            final_output, degraded = similar_dishes_flight.do(key, compute, timeout=max(budget.remaining(), 0))
+        except FutureTimeoutError:
+            final_output = cached_similar_dishes(key)
+            if final_output is not None:
+                budget.degrade("cached_neighbours")
+                degraded = ("cached_neighbours",)
+            else:
+                # Nothing to fall back on: keep waiting for the computation for a bounded time. It is still joinable
+                # if it finished since the timeout, so nothing is computed again.
+                try:
+                    result = similar_dishes_flight.wait(key, timeout=max(SIMILAR_DISHES_MAX_WAIT - budget.elapsed(), 0))
+                except FutureTimeoutError:
+                    result = None
+                if result is None:
+                    budget.degrade("no_result")
+                    response = jsonify({"error": "Similar dishes are still being computed, try again shortly"})
+                    response.headers["X-Degraded"] = "no_result"
+                    response.headers["Retry-After"] = "1"
+                    return response, 503
+                final_output, degraded = result
+
+        if slim:
+            # top_ten already returned the card fields only, without formatting instructions or explanations
+            response = Response(fast_json.encode(final_output), mimetype="application/json")
+        else:
+            response = jsonify(final_output)
+        if degraded:
+            response.headers["X-Degraded"] = ",".join(degraded)
+        return response
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+    finally:
+        budget.finish()
+
+@app.route("/similar_by_ingredients", methods=["POST"])
+def similar_by_ingredients():
+    """
+    Retrieve the dishes whose flavor profile is closest to a list of ingredients or flavor keywords, given in the
+    request body as {"ingredients": ["egg", "milk", "sweet"]} (or one comma-separated string). The terms are folded
+    into the latent flavor space (helpers/foldin.py) and ranked like a dish. {"view": "slim"} works as for
+    /get_similar_dishes.
+
+    Returns:
+        jsonify: JSON object with the matched and unknown terms and the results in the format of /get_similar_dishes.
+        status (int): 200 on success, 400 when no term is known, 503 when the data has no singular values, or no
+                      V from the same SVD, to fold queries in with.
+    """
+    body = request.get_json(silent=True) or {}
+    terms = body.get("ingredients") or []
+    if isinstance(terms, str):
+        terms = terms.split(",")
+    terms = [term for term in (str(term).strip() for term in terms) if term]
+
+    artifacts = g.artifacts = holder.current
+    if artifacts.fold_in is None:
+        return jsonify({"error": "Ingredient queries need U, Σ and V of one SVD build, run python -m helpers.matrix build"}), 503
+    vector, matched, unknown = artifacts.fold_in.query_vector(terms)
+    if not matched:
+        return jsonify({"error": "No known ingredient or flavor", "unknown": unknown}), 400
+
+    slim = body.get("view") == "slim"
+    try:
+        results = top_ten_for_vector(vector, artifacts.name_ing_data, artifacts.dish_latentflavors, artifacts.recipe_store,
+                                     artifacts.rating_count_weight, artifacts.lat_dims, artifacts.search_index, slim)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    if slim:
+        return Response(fast_json.encode({"matched": matched, "unknown": unknown, "results": results}),
+                        mimetype="application/json")
+    return jsonify({"matched": matched, "unknown": unknown, "results": results})
+
+@app.route("/recipe/<int:recipe_id>", methods=["GET"])
+def recipe_detail(recipe_id):
+    """
+    Return the details of one recipe: name, author, description, formatted instructions and labels. With
+    ?similar_to=<dish> the flavor dimensions the recipe shares with that dish are added, as in the last element of a
+    top_ten row. The response only depends on the URL and the data version, so it is cacheable: it carries
+    Cache-Control and an ETag, and a matching If-None-Match gets a 304 without a body.
+
+    Parameters:
+        recipe_id (int): The RecipeId of the recipe.
+
+    Returns:
+        Response: The recipe as JSON, 304 when the client's copy is current, or 404 for an unknown RecipeId or dish.
+    """
+    artifacts = g.artifacts = holder.current
+    try:
+        row = artifacts.recipe_store.get_recipes([recipe_id])[0]
+    except (KeyError, IndexError):
+        return jsonify({"error": f"Unknown recipe {recipe_id}"}), 404
+
+    instructions = format_recipe(row["RecipeInstructions"])
+    detail = {
+        "id": int(row["RecipeId"]),
+        "name": row["Name"],
+        "author": row.get("AuthorName"),
+        "description": row["Description"],
+        "instructions": instructions,
+        "labels": food_warnings(instructions),
+    }
+    similar_to = request.args.get("similar_to")
+    if similar_to:
+        try:
+            top_vects = top_ten_vector([[row["Name"]]], artifacts.name_ing_data[0], artifacts.dish_latentflavors)
+            lats = top_latent(similar_to, top_vects, artifacts.name_ing_data[0], artifacts.dish_latentflavors)[0]
+        except ValueError:
+            return jsonify({"error": f"Unknown dish {similar_to}"}), 404
+        detail["flavor_dimensions"] = [artifacts.lat_dims[index] for index in lats]
+
+    response = Response(fast_json.encode(detail), mimetype="application/json")
+    response.set_etag(f"{artifacts.version}-{recipe_id}-{similar_to or ''}")
+    response.cache_control.public = True
+    response.cache_control.max_age = RECIPE_MAX_AGE
+    return response.make_conditional(request)
+
+def remember_similar_dishes(key, result):
+    with similar_dishes_cache_lock:
+        similar_dishes_cache[key] = result
+        similar_dishes_cache.move_to_end(key)
+        while len(similar_dishes_cache) > SIMILAR_DISHES_CACHE_SIZE:
+            similar_dishes_cache.popitem(last=False)
+
+def cached_similar_dishes(key):
+    with similar_dishes_cache_lock:
+        result = similar_dishes_cache.get(key)
+    metrics.record_cache("similar_dishes", result is not None)
+    return result
 
 if __name__ == "__main__":
-    app.run(debug=True)
+    # `python app.py --startup-report` only prints the startup report (see helpers/startup.py)
+    if not startup.ENABLED or "--startup-report" not in sys.argv:
+        app.run(debug=True)
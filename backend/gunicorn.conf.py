@@ -0,0 +1,58 @@
+import gc
+import os
+
+
+"""
+Production serving configuration: gunicorn -c gunicorn.conf.py app:app
+
+The app (and with it all serving data) is imported once in the master before the workers are
+forked, so the workers share the loaded matrices copy-on-write instead of each loading their
+own copy. The data is read-only after loading (see ArtifactSet), and the NumPy scoring releases
+the GIL, so each worker serves several requests at once on threads.
+
+Every worker reloads on its own when the active bundle changes (BUNDLE_POLL_SECONDS in app.py)
+and on SIGHUP sent to it. A SIGHUP to the master only restarts the workers, which then start
+from the data preloaded in the master and catch up with the active bundle on their next check.
+
+Environment:
+    WEB_CONCURRENCY    number of worker processes (default: 2)
+    THREADS            request threads per worker (default: 4)
+    METRICS_DIR        where workers share their /metrics snapshots
+"""
+
+bind = os.environ.get("BIND", "0.0.0.0:5000")
+preload_app = True
+worker_class = "gthread"
+workers = int(os.environ.get("WEB_CONCURRENCY", 2))
+threads = int(os.environ.get("THREADS", 4))
+# Loading the data happens before the fork, but the first requests on a cold page cache can be slow
+timeout = 120
+
+# Must be set before the app is imported so that every worker writes its metrics snapshot
+os.environ.setdefault("METRICS_DIR", "/tmp/flavor-metrics")
+
+
+def on_starting(server):
+    # Snapshots left by a previous run would be added to this run's /metrics
+    from helpers import metrics
+    metrics.clear_snapshots()
+
+
+def pre_fork(server, worker):
+    # Move the loaded data out of the collector's generations: a collection in a worker would
+    # otherwise touch every object header and un-share the pages copied on write
+    gc.freeze()
+
+
+def post_worker_init(worker):
+    # Gunicorn resets the signal handlers of a new worker, and the app's threads stayed in the master
+    import app
+    app.install_reload_signal()
+    app.start_background_threads()
+
+
+def child_exit(server, worker):
+    # Runs in the master once the worker is reaped, so this also covers a worker SIGKILLed after a
+    # timeout; its snapshot would otherwise be counted after it is gone (max_requests, HUP)
+    from helpers import metrics
+    metrics.remove_snapshot(worker.pid)
@@ -1,47 +1,173 @@
 import os
+import re
+import json
+from contextlib import contextmanager
 import sqlalchemy as db
 
 class MySQLDatabaseHandler(object):
-    
+
     IS_DOCKER = True if 'DB_NAME' in os.environ else False
 
-    def __init__(self,MYSQL_USER,MYSQL_USER_PASSWORD,MYSQL_PORT,MYSQL_DATABASE,MYSQL_HOST = "localhost"):
-        
+    # Rows per executemany round trip in bulk_insert
+    CHUNK_SIZE = 1000
+
+    def __init__(self,MYSQL_USER,MYSQL_USER_PASSWORD,MYSQL_PORT,MYSQL_DATABASE,MYSQL_HOST = "localhost",
+                 pool_size = 5, max_overflow = 10, pool_recycle = 3600, engine_url = None):
+
         self.MYSQL_HOST = os.environ['DB_NAME'] if MySQLDatabaseHandler.IS_DOCKER else MYSQL_HOST
         self.MYSQL_USER = "admin" if MySQLDatabaseHandler.IS_DOCKER else MYSQL_USER
         self.MYSQL_USER_PASSWORD = "admin" if MySQLDatabaseHandler.IS_DOCKER else MYSQL_USER_PASSWORD
         self.MYSQL_PORT = 3306 if MySQLDatabaseHandler.IS_DOCKER else MYSQL_PORT
         self.MYSQL_DATABASE = "kardashiandb" if MySQLDatabaseHandler.IS_DOCKER else MYSQL_DATABASE
+        self.pool_size = pool_size
+        self.max_overflow = max_overflow
+        self.pool_recycle = pool_recycle
+        # engine_url overrides the MySQL URL, e.g. "sqlite://" for an in-process stand-in
+        self.engine_url = engine_url
         self.engine = self.validate_connection()
 
     def validate_connection(self):
-        print(f"mysql+pymysql://{self.MYSQL_USER}:{self.MYSQL_USER_PASSWORD}@{self.MYSQL_HOST}:{self.MYSQL_PORT}/{self.MYSQL_DATABASE}")
-        return db.create_engine(f"mysql+pymysql://{self.MYSQL_USER}:{self.MYSQL_USER_PASSWORD}@{self.MYSQL_HOST}:{self.MYSQL_PORT}/{self.MYSQL_DATABASE}")
+        if self.engine_url is not None:
+            # SQLite uses its own single-connection pools, the sizing options do not apply
+            return db.create_engine(self.engine_url, pool_pre_ping=True)
+        print(f"mysql+pymysql://{self.MYSQL_USER}:***@{self.MYSQL_HOST}:{self.MYSQL_PORT}/{self.MYSQL_DATABASE}")
+        return db.create_engine(
+            f"mysql+pymysql://{self.MYSQL_USER}:{self.MYSQL_USER_PASSWORD}@{self.MYSQL_HOST}:{self.MYSQL_PORT}/{self.MYSQL_DATABASE}",
+            pool_size=self.pool_size,
+            max_overflow=self.max_overflow,
+            pool_recycle=self.pool_recycle,
+            pool_pre_ping=True,
+        )
 
+    @contextmanager
     def lease_connection(self):
-        return self.engine.connect()
-    
+        """
+        Lease a pooled connection for the duration of a with-block; it is always returned to the pool.
+        """
+        conn = self.engine.connect()
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def transaction(self):
+        """
+        Lease a pooled connection inside a transaction, committed on success and rolled back on error.
+        """
+        with self.engine.begin() as conn:
+            yield conn
+
     def query_executor(self,query):
-        conn = self.lease_connection()
-        if type(query) == list:
-            for i in query:
-                conn.execute(i)
-        else:
-            conn.execute(query)
-        
+        with self.transaction() as conn:
+            if type(query) == list:
+                for i in query:
+                    conn.execute(db.text(i))
+            else:
+                conn.execute(db.text(query))
 
-    def query_selector(self,query):
-        conn = self.lease_connection()
-        data = conn.execute(query)
+    def query_selector(self,query,params = None):
+        # Rows are fetched before the connection goes back to the pool
+        with self.lease_connection() as conn:
+            data = conn.execute(db.text(query), params or {}).fetchall()
         return data
 
+    def bulk_insert(self,table,rows,replace = False,conn = None):
+        """
+        Insert a list of dicts (all with the same keys) into `table` with batched executemany calls,
+        all in one transaction. Returns the number of rows inserted.
+        """
+        if not rows:
+            return 0
+        columns = list(rows[0].keys())
+        for name in [table] + columns:
+            if not re.fullmatch(r"[A-Za-z_][A-Za-z0-9_]*", name):
+                raise ValueError(f"Invalid SQL identifier: {name}")
+        verb = "REPLACE" if replace else "INSERT"
+        statement = db.text(
+            f"{verb} INTO {table} ({', '.join(columns)}) VALUES ({', '.join(':' + c for c in columns)})")
+
+        if conn is None:
+            with self.transaction() as conn:
+                return self.bulk_insert(table, rows, replace, conn)
+        for start in range(0, len(rows), MySQLDatabaseHandler.CHUNK_SIZE):
+            conn.execute(statement, rows[start:start + MySQLDatabaseHandler.CHUNK_SIZE])
+        return len(rows)
+
+    def load_json_into_db(self,file_path = None,replace = True):
+        """
+        Bulk load the {"recipes": [...], "reviews": [...]} file written by transformJSON.py in a
+        single transaction. Returns a dict of table name to inserted row count.
+        """
+        if file_path is None:
+            file_path = os.path.join(os.environ['ROOT_PATH'],'init.json')
+        with open(file_path,'r',encoding='utf-8') as json_file:
+            data = json.load(json_file)
+        counts = {}
+        with self.transaction() as conn:
+            for table in ("recipes", "reviews"):
+                counts[table] = self.bulk_insert(table, data.get(table, []), replace, conn)
+        return counts
+
+    def load_ndjson_chunks(self,directory = None,replace = True):
+        """
+        Bulk load the NDJSON chunks written by transformJSON.py, one transaction per chunk, so a
+        failed load keeps the chunks before it and the rows of one chunk at most are in memory.
+        Returns a dict of table name to inserted row count.
+        """
+        from .transformJSON import TABLES, iter_chunks, read_ndjson
+        if directory is None:
+            directory = os.path.join(os.environ['ROOT_PATH'],'data','init-chunks')
+        counts = dict.fromkeys(TABLES, 0)
+        for _, paths in iter_chunks(directory):
+            with self.transaction() as conn:
+                for table in TABLES:
+                    counts[table] += self.bulk_insert(table, list(read_ndjson(paths[table])), replace, conn)
+        return counts
+
     def load_file_into_db(self,file_path  = None):
         if MySQLDatabaseHandler.IS_DOCKER:
             return
         if file_path is None:
             file_path = os.path.join(os.environ['ROOT_PATH'],'init.sql')
-        sql_file = open(file_path,"r")
-        sql_file_data = list(filter(lambda x:x != '',sql_file.read().split(";\n")))
+        with open(file_path,"r") as sql_file:
+            sql_file_data = split_sql_statements(sql_file.read())
         self.query_executor(sql_file_data)
-        sql_file.close()
 
+
+def split_sql_statements(sql):
+    """
+    Split a SQL script on semicolons that are outside string literals and comments.
+    """
+    statements = []
+    current = []
+    quote = None
+    i = 0
+    while i < len(sql):
+        char = sql[i]
+        if quote is not None:
+            current.append(char)
+            if char == "\\" and i + 1 < len(sql):
+                current.append(sql[i + 1])
+                i += 1
+            elif char == quote:
+                quote = None
+        elif char in ("'", '"', "`"):
+            quote = char
+            current.append(char)
+        elif sql.startswith("--", i) or char == "#":
+            end = sql.find("\n", i)
+            i = len(sql) if end == -1 else end
+            continue
+        elif sql.startswith("/*", i):
+            end = sql.find("*/", i + 2)
+            i = len(sql) if end == -1 else end + 2
+            continue
+        elif char == ";":
+            statements.append("".join(current).strip())
+            current = []
+        else:
+            current.append(char)
+        i += 1
+    statements.append("".join(current).strip())
+    return [statement for statement in statements if statement]
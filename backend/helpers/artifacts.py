@@ -0,0 +1,475 @@
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import threading
+from types import MappingProxyType
+import numpy as np
+from .startup import stage
+
+
+"""
+Versioned artifact bundles and the in-process holder that serves them.
+
+A bundle is a directory data/bundles/<version>/ holding a manifest.json and the data files:
+
+    {
+        "version": "2026-10-18.1",
+        "created": 1792300000,
+        "files": {"dish_latentflavors": {"path": "dish-latent-flavors-matrix.npy", "sha256": "..."}, ...}
+    }
+
+Logical names missing from a manifest (e.g. the shared 'flavors' directory) fall back to the
+default files in data/. data/bundles/CURRENT names the active version; ARTIFACT_BUNDLE overrides
+it with a bundle directory. Without either, the flat data/ directory is served as-is.
+
+Usage:
+    python -m helpers.artifacts build <version>     snapshot the current data/ files into a bundle
+    python -m helpers.artifacts activate <version>  make <version> the one loaded by workers
+"""
+
+base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+data_root = os.path.join(base_dir, "data")
+bundles_dir = os.path.join(data_root, "bundles")
+current_file = os.path.join(bundles_dir, "CURRENT")
+
+# Logical artifact name -> default file in data/
+DEFAULT_FILES = {
+    "dish_id_ingr": "dish_id_ingr.txt",
+    "flavor_profiles": "all_flavor_profiles.json",
+    "dish_latentflavors": "dish-latent-flavors-matrix.npy",
+    "latentflavor_flavors": "latentflavor_flavors.npy",
+    "recipes": "random-recipe.json",
+    "names_recipes": "reduced-recipe.json",
+    "flavors": "flavors",
+    "dish_latentflavors_int8": "dish-latent-flavors-int8.npz",
+    "latent_importance": "latent-importance.npy",
+    "ingredient_counts": "ingredient-flavor-counts.npz",
+    "name_index": "name-tfidf-index.npz",
+}
+
+# Written together by one SVD build (helpers/matrix.py flavor_matrix): U, Σ and V
+SVD_FILES = ("dish_latentflavors", "latent_importance", "latentflavor_flavors")
+
+# SCORING=int8 scores queries on the int8 index of helpers/quantize.py and memory-maps the float matrix;
+# SCORING=cascade scores them on the CASCADE_DIMS highest-energy dimensions first, approximately (helpers/cascade.py);
+# SCORING=sharded scatters them over shard processes or nodes (helpers/shards.py)
+SCORING = os.environ.get("SCORING", "float")
+
+# Dishes folded in at load time to check that U, Σ and V match, and the mean cosine they must reach
+FOLD_IN_CHECK_DISHES = 20
+FOLD_IN_MIN_AGREEMENT = 0.99
+
+# Seconds a replaced search index keeps running for the requests that still hold the old set
+RETIRE_GRACE = float(os.environ.get("RETIRE_GRACE_SECONDS", 30))
+
+
+class ArtifactSet(object):
+    """
+    One immutable generation of serving data. Requests read holder.current once and use
+    that set throughout, so a reload never mixes two versions within one request. Lists,
+    dicts and arrays are frozen (tuples, read-only mappings, read-only arrays) so request
+    threads can share them without locks and forked workers do not write to them.
+    """
+
+    def __init__(self, version, **artifacts):
+        object.__setattr__(self, "version", version)
+        object.__setattr__(self, "loaded_at", time.time())
+        for name, value in artifacts.items():
+            object.__setattr__(self, name, freeze(value))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("ArtifactSet is immutable, build a new one instead")
+
+    def replace(self, version, **changes):
+        """
+        Return a new set under another version with some artifacts replaced; the others are
+        shared with this set. The replacements must already be read-only (see freeze()).
+        """
+        artifacts = dict(vars(self), **changes)
+        artifacts.update(version=version, loaded_at=time.time())
+        new = object.__new__(ArtifactSet)
+        for name, value in artifacts.items():
+            object.__setattr__(new, name, value)
+        return new
+
+
+"""
+Returns a read-only equivalent of a loaded artifact: lists become tuples, dicts become
+read-only mappings and NumPy arrays are flagged read-only. Other objects are returned as-is.
+Numeric vectors the scans compute with (e.g. the rating weights) should be loaded as arrays,
+which stay arrays here.
+"""
+
+def freeze(value):
+    if isinstance(value, np.ndarray):
+        value.flags.writeable = False
+        return value
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    if isinstance(value, dict):
+        return MappingProxyType({key: freeze(item) for key, item in value.items()})
+    return value
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+"""
+Returns the directory of a bundle version, data/bundles/<version>.
+
+Raises:
+    ValueError: When the version is not a plain directory name (e.g. '../x' or an absolute
+    path), which would point the loader outside data/bundles.
+"""
+
+def bundle_path(version):
+    if (not isinstance(version, str) or version in ("", ".", "..") or os.path.basename(version) != version
+            or (os.path.altsep and os.path.altsep in version) or version != version.strip()):
+        raise ValueError(f"Invalid bundle version: {version!r}")
+    return os.path.join(bundles_dir, version)
+
+
+"""
+Returns the bundle directory to load: data/bundles/<version> when a version is given,
+otherwise ARTIFACT_BUNDLE or the version named in data/bundles/CURRENT. Returns None when no
+bundle is configured (flat data/ directory).
+"""
+
+def resolve_bundle(version=None):
+    if version is not None:
+        return bundle_path(version)
+    if os.environ.get("ARTIFACT_BUNDLE"):
+        return os.environ["ARTIFACT_BUNDLE"]
+    if os.path.exists(current_file):
+        with open(current_file, 'r') as file:
+            return bundle_path(file.read().strip())
+    return None
+
+
+"""
+Reads a bundle's manifest and returns its version and the absolute path of every artifact.
+
+Parameters:
+    bundle_dir (str or None): The bundle directory, or None for the flat data/ directory.
+
+    verify (bool, optional): Whether to check the sha256 of every file listed in the manifest.
+
+Returns:
+    tuple: (version (str), paths (dict of logical name to absolute path))
+"""
+
+def read_manifest(bundle_dir, verify=False):
+    paths = {name: os.path.join(data_root, file) for name, file in DEFAULT_FILES.items()}
+    if bundle_dir is None:
+        latent_path = paths["dish_latentflavors"]
+        mtime = int(os.path.getmtime(latent_path)) if os.path.exists(latent_path) else 0
+        return f"data-{mtime}", paths
+
+    with open(os.path.join(bundle_dir, "manifest.json"), 'r') as file:
+        manifest = json.load(file)
+    for name, entry in manifest["files"].items():
+        path = os.path.join(bundle_dir, entry["path"])
+        if verify and entry.get("sha256") and _sha256(path) != entry["sha256"]:
+            raise ValueError(f"Checksum mismatch for {name} in bundle {manifest['version']}")
+        paths[name] = path
+    return manifest["version"], paths
+
+
+"""
+Copies artifact files into a new bundle directory and writes its manifest.
+
+Parameters:
+    version (str): The version name of the bundle.
+
+    files (dict, optional): Source files by logical name. Defaults to every default file in
+    data/ except the shared 'flavors' directory. Σ (latent_importance) must come with the U
+    and V of its SVD build.
+
+Returns:
+    str: The bundle directory.
+"""
+
+def write_bundle(version, files=None):
+    if files is None:
+        files = {name: os.path.join(data_root, file) for name, file in DEFAULT_FILES.items()
+                 if name != "flavors" and os.path.isfile(os.path.join(data_root, file))}
+    if "latent_importance" in files and not all(name in files for name in SVD_FILES):
+        # Σ is only usable with the U and V of its own build
+        raise ValueError(f"A bundle with latent_importance needs all of {', '.join(SVD_FILES)}")
+    bundle_dir = bundle_path(version)
+    os.makedirs(bundle_dir)
+
+    manifest = {"version": version, "created": int(time.time()), "files": {}}
+    for name, source in files.items():
+        target = os.path.join(bundle_dir, os.path.basename(source))
+        shutil.copy2(source, target)
+        manifest["files"][name] = {"path": os.path.basename(source), "sha256": _sha256(target)}
+
+    with open(os.path.join(bundle_dir, "manifest.json"), 'w') as file:
+        json.dump(manifest, file, indent=4)
+    return bundle_dir
+
+
+"""
+Makes a bundle version the one loaded by workers on their next (re)load.
+"""
+
+def activate(version):
+    if not os.path.exists(os.path.join(bundle_path(version), "manifest.json")):
+        raise FileNotFoundError(f"No bundle named {version}")
+    tmp_path = current_file + ".tmp"
+    with open(tmp_path, 'w') as file:
+        file.write(version)
+    os.replace(tmp_path, current_file)
+
+
+"""
+Loads one complete ArtifactSet from a bundle, in dependency order, without touching the
+module globals of the helpers.
+
+Parameters:
+    bundle_dir (str or None): The bundle directory, or None for the flat data/ directory.
+
+Returns:
+    ArtifactSet
+"""
+
+def load_artifacts(bundle_dir=None):
+    from . import matrix, reviews, cossimNameMatch
+    from .recipeStore import JSONRecipeStore, recipe_store_from_env
+
+    version, paths = read_manifest(bundle_dir, verify=True)
+    matrix_data = matrix.load_data(paths, install=False, mmap_mode="r" if SCORING == "int8" else None)
+    rating_count_weight = reviews.load_data(matrix_data["name_ing_data"], paths, install=False)
+    # The weights multiply every scan's scores: a read-only array, so that requests do not convert N floats each
+    rating_count_weight[2] = np.asarray(rating_count_weight[2], dtype=np.float64)
+    name_data = cossimNameMatch.load_data(paths, install=False)
+    with stage("recipe store"):
+        recipe_store = recipe_store_from_env(paths["recipes"])
+        if isinstance(recipe_store, JSONRecipeStore):
+            # Parsed here rather than on the first request, so that preloaded gunicorn workers share
+            # the recipes copy-on-write and no request pays for the parse
+            recipe_store._load()
+
+    fold_in = None
+    if matrix_data["latent_importance"] is not None:
+        from .foldin import FoldIn
+        with stage("ingredient fold-in"):
+            fold_in = FoldIn.from_paths(paths, matrix_data["all_flavor_profiles"], matrix_data["latent_importance"],
+                                        matrix_data["json_dict"], paths["flavors"])
+            # U, Σ and V from different builds would fold queries into unrelated vectors
+            ingredients, dishes = matrix_data["name_ing_data"][2], matrix_data["dish_latentflavors"]
+            sample = np.random.default_rng(0).choice(len(dishes), size=min(FOLD_IN_CHECK_DISHES, len(dishes)), replace=False)
+            agreement = fold_in.agreement([ingredients[i] for i in sample], dishes[sample])
+            if agreement is not None and agreement < FOLD_IN_MIN_AGREEMENT:
+                print(f"Ingredient queries disabled: U, Σ and V do not come from the same SVD (agreement {agreement:.3f})")
+                fold_in = None
+
+    search_index = None
+    if SCORING == "sharded":
+        from .shards import sharded_index_from_env
+        with stage("dish shards"):
+            search_index = sharded_index_from_env(paths["dish_latentflavors"], rating_count_weight[2])
+    elif SCORING == "cascade":
+        from .cascade import CascadeIndex, DEFAULT_COARSE_DIMS, DEFAULT_SHORTLIST
+        with stage("cascade dish index"):
+            search_index = CascadeIndex(matrix_data["dish_latentflavors"], matrix_data["latent_importance"],
+                                        int(os.environ.get("CASCADE_DIMS", DEFAULT_COARSE_DIMS)),
+                                        int(os.environ.get("CASCADE_SHORTLIST", DEFAULT_SHORTLIST)))
+    elif SCORING == "int8":
+        from .quantize import QuantizedIndex
+        with stage("int8 dish index"):
+            int8_path = paths["dish_latentflavors_int8"]
+            # A bundle without its own int8 file must not pick up a stale one from data/
+            if os.path.exists(int8_path) and (bundle_dir is None or int8_path.startswith(bundle_dir)):
+                search_index = QuantizedIndex.load(int8_path)
+            else:
+                search_index = QuantizedIndex.build(matrix_data["dish_latentflavors"])
+
+    # bundle_version stays the same in the sets derived by replace() (e.g. review updates)
+    return ArtifactSet(version, bundle_version=version, rating_count_weight=rating_count_weight,
+                       recipe_store=recipe_store, search_index=search_index, fold_in=fold_in, **matrix_data,
+                       **name_data)
+
+
+class ArtifactHolder(object):
+    """
+    Holds the current ArtifactSet. A reload builds the new set completely in the background and
+    then swaps it in with a single reference assignment; in-flight requests keep the set they
+    already read. A search index that is not carried over to the new set (e.g. the shard
+    processes of helpers/shards.py) is closed, and the connection pool of a database recipe
+    store is disposed, once those requests had retire_grace seconds to finish.
+    """
+
+    def __init__(self, retire_grace=RETIRE_GRACE):
+        self._current = None
+        self._reload_lock = threading.Lock()
+        self._swap_lock = threading.Lock()
+        self.retire_grace = retire_grace
+        self.last_error = None
+
+    @property
+    def current(self):
+        return self._current
+
+    def load(self, version=None):
+        with self._reload_lock:
+            return self._load(version)
+
+    def _load(self, version):
+        artifacts = load_artifacts(resolve_bundle(version))
+        with self._swap_lock:
+            old, self._current = self._current, artifacts
+        self.last_error = None
+        self._retire(old, artifacts)
+        return artifacts
+
+    def _retire(self, old, new):
+        closers = []
+        index = getattr(old, "search_index", None)
+        if index is not None and index is not getattr(new, "search_index", None) and hasattr(index, "close"):
+            closers.append(index.close)
+        # Every reload of a DatabaseRecipeStore creates its own engine and pool
+        handler = getattr(getattr(old, "recipe_store", None), "handler", None)
+        if handler is not None and handler is not getattr(getattr(new, "recipe_store", None), "handler", None):
+            closers.append(handler.engine.dispose)
+        for close in closers:
+            timer = threading.Timer(self.retire_grace, close)
+            timer.daemon = True
+            timer.start()
+
+    def swap(self, expected, artifacts):
+        """
+        Replace the current set with artifacts derived from it. Returns False, without
+        swapping, when the current set is no longer expected (e.g. a reload finished meanwhile).
+        """
+        with self._swap_lock:
+            if self._current is not expected:
+                return False
+            self._current = artifacts
+        self._retire(expected, artifacts)
+        return True
+
+    def reload_async(self, version=None):
+        """
+        Start a background reload. Returns False when a reload is already running.
+        """
+        # Taken here rather than in the thread, so that only one of two concurrent calls starts a reload
+        if not self._reload_lock.acquire(blocking=False):
+            return False
+
+        def run():
+            try:
+                self._load(version)
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"Artifact reload failed, keeping version {self._current and self._current.version}: {e}")
+            finally:
+                self._reload_lock.release()
+
+        threading.Thread(target=run, name="artifact-reload", daemon=True).start()
+        return True
+
+
+holder = ArtifactHolder()
+
+
+"""
+Starts a background thread that reloads the holder whenever the active bundle (data/bundles/CURRENT,
+ARTIFACT_BUNDLE or the flat data/ directory) has another version than the one being served. Every
+worker process runs its own, so all workers converge on the active version after
+`python -m helpers.artifacts activate <version>`, whichever worker (if any) was told to reload.
+A version that failed to load is not retried until the active version changes again.
+
+Parameters:
+    holder (ArtifactHolder): The holder to reload.
+
+    interval (float, optional): Seconds between checks. Defaults to 10.
+"""
+
+def watch_active_bundle(holder, interval=10.0):
+
+    def run():
+        failed = None
+        while True:
+            time.sleep(interval)
+            version = None
+            try:
+                version = read_manifest(resolve_bundle())[0]
+                current = holder.current
+                if current is None or version == current.bundle_version or version == failed:
+                    continue
+                holder.load()
+                failed = None
+            except Exception as e:
+                failed = version
+                holder.last_error = str(e)
+                print(f"Artifact reload to the active version failed: {e}")
+
+    thread = threading.Thread(target=run, name="bundle-watch", daemon=True)
+    thread.start()
+    return thread
+
+
+"""
+Starts a background thread that folds the reviews appended to an append-only review log into
+the served rating weights (helpers/reviews.py ReviewAggregator). Every batch is swapped in as a
+new ArtifactSet version '<bundle version>+reviews.<n>'; after a reload the aggregator is
+rebuilt from the new weights and the log is replayed.
+
+Parameters:
+    holder (ArtifactHolder): The holder whose current set is updated.
+
+    log_path (str): The review log.
+
+    interval (float, optional): Seconds between polls of the log. Defaults to 5.
+"""
+
+def follow_review_log(holder, log_path, interval=5.0):
+    from .reviews import ReviewAggregator
+
+    def run():
+        source = aggregator = None
+        while True:
+            time.sleep(interval)
+            try:
+                current = holder.current
+                if current is not source:
+                    aggregator = ReviewAggregator(current.name_ing_data[1], current.rating_count_weight, log_path)
+                    base_version, generation, source = current.version, 0, current
+                updated = aggregator.poll()
+                if updated is None:
+                    continue
+                generation += 1
+                artifacts = current.replace(f"{base_version}+reviews.{generation}", rating_count_weight=updated)
+                if not holder.swap(current, artifacts):
+                    continue
+                source = artifacts
+                if hasattr(artifacts.search_index, "update_weights"):
+                    # Sharded search keeps its own copy of the weights
+                    artifacts.search_index.update_weights(updated[2])
+            except Exception as e:
+                print(f"Review log update failed: {e}")
+
+    thread = threading.Thread(target=run, name="review-log", daemon=True)
+    thread.start()
+    return thread
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3 or sys.argv[1] not in ("build", "activate"):
+        print("Usage: python -m helpers.artifacts build|activate <version>")
+        sys.exit(1)
+    if sys.argv[1] == "build":
+        print(f"Wrote {write_bundle(sys.argv[2])}")
+    else:
+        activate(sys.argv[2])
+        print(f"Activated {sys.argv[2]}")
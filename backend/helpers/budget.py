@@ -0,0 +1,55 @@
+import time
+from . import metrics
+
+
+"""
+Per-request latency budgets.
+
+A Budget is started when a request arrives. Before an optional stage, the code asks whether
+the stage still fits: the prediction is the mean duration of the stage's metrics span in this
+worker. Stages that do not fit are skipped and recorded as degradations, which the response
+reports and /metrics counts (budget_degraded_total), together with the requests that ran past
+their budget anyway (budget_overruns_total).
+
+Example:
+    budget = Budget("get_similar_dishes", 0.5)
+    if budget.allows("top_ten.top_latent"):
+        ...
+    else:
+        budget.degrade("latent_explanations")
+    budget.finish()
+"""
+
+
+class Budget(object):
+
+    def __init__(self, name, seconds):
+        self.name = name
+        self.seconds = seconds
+        self.start = time.perf_counter()
+        self.degraded = []
+
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+    def remaining(self):
+        return self.seconds - self.elapsed()
+
+    def allows(self, *stages):
+        """
+        Whether the given stages are expected to finish within the remaining budget. Stages
+        never observed in this worker are assumed to fit.
+        """
+        expected = sum(metrics.mean(stage) or 0.0 for stage in stages)
+        return self.remaining() > expected
+
+    def degrade(self, reason):
+        self.degraded.append(reason)
+        metrics.incr("budget_degraded_total", f"{self.name}.{reason}")
+
+    def finish(self):
+        """
+        Count the request as an overrun when it took longer than its budget.
+        """
+        if self.elapsed() > self.seconds:
+            metrics.incr("budget_overruns_total", self.name)
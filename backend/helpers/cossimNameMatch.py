@@ -1,9 +1,12 @@
 import os
+import re
+import sys
 import json
-import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 import heapq
+from collections import Counter
+import numpy as np
+from .metrics import span
+from .startup import stage
 
 
 """
@@ -25,56 +28,197 @@ def extract_names(json_data):
 
     return names
 
-# with open('backend\\data\\random-recipe.json', 'r', encoding='utf-8') as f:
-#     json_data = f.read()
-# names = extract_names(json_data)
-
-# Pre-compute the vectorizer and the TF-IDF matrix
-# vectorizer = TfidfVectorizer().fit(names)
-# tfidf_matrix = vectorizer.transform(names)
-
 file_path = os.path.join(os.path.dirname(__file__), '..', 'data', 'reduced-recipe.json')
 file_path = os.path.normpath(file_path)  # Normalize path for cross-platform compatibility
+name_index_path = os.path.normpath(os.path.join(os.path.dirname(__file__), '..', 'data', 'name-tfidf-index.npz'))
 
-try:
-    with open(file_path, 'r', encoding='utf-8') as f:
-        json_data = f.read()
-    names = extract_names(json_data)
+# TfidfVectorizer's default analysis: lowercase, then tokens of two or more word characters
+TOKEN_RE = re.compile(r"(?u)\b\w\w+\b")
 
-    vectorizer = TfidfVectorizer().fit(names)
-    tfidf_matrix = vectorizer.transform(names)
+# Populated by load_data()
+names = None
+name_index = None
 
 
+class NameIndex(object):
     """
-    Returns similar dish names within the database using cosine similarity, filtered by a relevance threshold.
+    The fitted TF-IDF model of the recipe names without sklearn: the vocabulary, the IDF vector 
+    and the L2-normalized name x term matrix. Queries are analyzed like TfidfVectorizer's 
+    defaults (lowercase, token_pattern r"(?u)\b\w\w+\b", raw counts x smoothed IDF, L2 norm), 
+    so the similarities are those of vectorizer.transform followed by the sparse dot product.
+
+    The matrix is persisted as CSR; in memory it is kept transposed (one posting list of 
+    (name, weight) per term) so a query only touches the names sharing one of its terms.
+    """
+
+    def __init__(self, vocabulary, idf, data, indices, indptr):
+        self.vocabulary = {term: column for column, term in enumerate(vocabulary)}
+        self.idf = np.asarray(idf, dtype=np.float64)
+        indices = np.asarray(indices)
+        rows = np.repeat(np.arange(len(indptr) - 1, dtype=np.int32), np.diff(indptr))
+        order = np.argsort(indices, kind="stable")
+        self.posting_rows = rows[order]
+        self.posting_weights = np.asarray(data, dtype=np.float64)[order]
+        self.posting_starts = np.concatenate(([0], np.cumsum(np.bincount(indices, minlength=len(vocabulary)))))
+        self.n_names = len(indptr) - 1
+
+    @classmethod
+    def from_vectorizer(cls, vectorizer, tfidf_matrix):
+        vocabulary = sorted(vectorizer.vocabulary_, key=vectorizer.vocabulary_.get)
+        tfidf_matrix = tfidf_matrix.tocsr()
+        tfidf_matrix.sort_indices()
+        return cls(vocabulary, vectorizer.idf_, tfidf_matrix.data, tfidf_matrix.indices, tfidf_matrix.indptr)
+
+    def query_weights(self, text):
+        """
+        The L2-normalized TF-IDF weights of a query, by term column.
+        """
+        counts = Counter(column for column in (self.vocabulary.get(token) for token in TOKEN_RE.findall(text.lower()))
+                         if column is not None)
+        weights = {column: count * self.idf[column] for column, count in counts.items()}
+        norm = np.sqrt(sum(weight * weight for weight in weights.values()))
+        return {column: weight / norm for column, weight in weights.items()} if norm else {}
+
+    def similarities(self, text):
+        """
+        The cosine similarity of the query with every name.
+        """
+        scores = np.zeros(self.n_names)
+        for column, weight in self.query_weights(text).items():
+            start, end = self.posting_starts[column], self.posting_starts[column + 1]
+            scores[self.posting_rows[start:end]] += weight * self.posting_weights[start:end]
+        return scores
 
-    Parameters:
-        user_input: user input of String
 
-        vectorizer: Precomputed TfidfVectorizer
+"""
+Fits the TF-IDF vectorizer over the recipe names (the offline build step, the only place sklearn 
+is imported) and saves the names, the vocabulary, the IDF vector and the L2-normalized CSR name 
+matrix as one compact artifact.
 
-        tfidf_matrix: Precomputed TF-IDF matrix
+Parameters:
+    recipes_path (str, optional): The recipes JSON file the names are read from. Defaults to 
+    data/reduced-recipe.json.
 
-        recipe_list: List of recipes
+    out_path (str, optional): The artifact. Defaults to data/name-tfidf-index.npz.
 
-        threshold: minimum cosine similarity score for a recipe to be considered similar
+Returns:
+    tuple: (names (list of str), NameIndex)
+"""
 
-    Returns:
-        top_results (list): ranked list of up to 10 results that meet the threshold
-    """
-    
-    def cossimNameMatch(user_input, vectorizer=vectorizer, tfidf_matrix=tfidf_matrix, recipe_list=names, threshold=0.3):
-
-        user_input_vector = vectorizer.transform([user_input])
-        cosine_sim = cosine_similarity(user_input_vector, tfidf_matrix)[0]
-        filtered_results = [(index, sim_score) for index, sim_score in enumerate(cosine_sim) if sim_score > threshold]
-        top_results = heapq.nlargest(10, filtered_results, key=lambda x: x[1])
-        dish_indices = [i[0] for i in top_results]
-        top_results = [recipe_list[i] for i in dish_indices]
-
-        return top_results
-
-except FileNotFoundError as e:
-    print(f"File not found: {e}")
-except Exception as e:
-    print(f"An error occurred: {e}")
\ No newline at end of file
+def build_name_index(recipes_path=file_path, out_path=name_index_path):
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
+    with open(recipes_path, 'r', encoding='utf-8') as f:
+        recipe_names = extract_names(f.read())
+    vectorizer = TfidfVectorizer().fit(recipe_names)
+    tfidf_matrix = vectorizer.transform(recipe_names)
+    tfidf_matrix.sort_indices()
+    vocabulary = sorted(vectorizer.vocabulary_, key=vectorizer.vocabulary_.get)
+
+    if out_path is not None:
+        # Names and terms contain no NUL characters, so they are stored as one joined UTF-8 blob each
+        np.savez(out_path,
+                 names=np.frombuffer("\0".join(recipe_names).encode('utf-8'), dtype=np.uint8),
+                 vocabulary=np.frombuffer("\0".join(vocabulary).encode('utf-8'), dtype=np.uint8),
+                 idf=vectorizer.idf_, data=tfidf_matrix.data, indices=tfidf_matrix.indices.astype(np.int32),
+                 indptr=tfidf_matrix.indptr.astype(np.int64))
+    return recipe_names, NameIndex(vocabulary, vectorizer.idf_, tfidf_matrix.data, tfidf_matrix.indices,
+                                   tfidf_matrix.indptr)
+
+
+"""
+Reads the names and the NameIndex saved by build_name_index.
+"""
+
+def read_name_index(path):
+    with np.load(path) as data:
+        recipe_names = data["names"].tobytes().decode('utf-8').split("\0")
+        vocabulary = data["vocabulary"].tobytes().decode('utf-8').split("\0")
+        return recipe_names, NameIndex(vocabulary, data["idf"], data["data"], data["indices"], data["indptr"])
+
+
+"""
+Loads the recipe names and their TF-IDF index from the artifact written by the build step 
+(`python -m helpers.cossimNameMatch build`). Without the artifact the index is fitted from the 
+recipes file, which imports sklearn.
+
+Parameters:
+    paths (dict, optional): Artifact paths by logical name ('name_index', 'names_recipes') from a 
+    versioned bundle. Defaults to the files in the data directory.
+
+    install (bool, optional): Whether to also bind the names and the index to the module 
+    globals. Defaults to True.
+
+Returns:
+    dict: names and name_index by name (None when loading failed).
+"""
+
+def load_data(paths=None, install=True):
+    paths = paths or {}
+    loaded = {"names": None, "name_index": None}
+
+    try:
+        index_path = paths.get("name_index", name_index_path)
+        if os.path.exists(index_path):
+            with stage("cossimNameMatch: name-tfidf-index.npz"):
+                loaded["names"], loaded["name_index"] = read_name_index(index_path)
+        else:
+            with stage("cossimNameMatch: fit TF-IDF"):
+                loaded["names"], loaded["name_index"] = build_name_index(paths.get("names_recipes", file_path), None)
+
+    except FileNotFoundError as e:
+        print(f"File not found: {e}")
+    except Exception as e:
+        print(f"An error occurred: {e}")
+
+    if install:
+        globals().update(loaded)
+    return loaded
+
+
+"""
+Returns similar dish names within the database using cosine similarity, filtered by a relevance threshold.
+
+Parameters:
+    user_input: user input of String
+
+    name_index: Precomputed NameIndex (defaults to the one loaded by load_data)
+
+    recipe_list: List of recipes (defaults to the names read by load_data)
+
+    threshold: minimum cosine similarity score for a recipe to be considered similar
+
+Returns:
+    top_results (list): ranked list of up to 10 results that meet the threshold
+"""
+
+def cossimNameMatch(user_input, name_index=None, recipe_list=None, threshold=0.3):
+    recipe_list = names if recipe_list is None else recipe_list
+    top_results = match_scores(user_input, name_index, threshold)
+    dish_indices = [i[0] for i in top_results]
+    top_results = [recipe_list[i] for i in dish_indices]
+
+    return top_results
+
+
+"""
+Returns the (name index, cosine similarity) pairs behind cossimNameMatch's results, best first.
+"""
+
+def match_scores(user_input, name_index=None, threshold=0.3):
+    name_index = globals()["name_index"] if name_index is None else name_index
+
+    with span("cossimNameMatch.similarity"):
+        # The rows are L2-normalized, so the cosine similarity is a sparse dot product
+        cosine_sim = name_index.similarities(user_input)
+    with span("cossimNameMatch.rank"):
+        filtered_results = [(int(index), cosine_sim[index]) for index in np.flatnonzero(cosine_sim > threshold)]
+        return heapq.nlargest(10, filtered_results, key=lambda x: x[1])
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2 or sys.argv[1] != "build":
+        print("Usage: python -m helpers.cossimNameMatch build")
+        sys.exit(1)
+    build_name_index()
+    print(f"Wrote {name_index_path}")
@@ -0,0 +1,192 @@
+import os
+import sys
+import threading
+import numpy as np
+from .metrics import record_cache
+from .matrix import create_dict_from_directory, fast_keyword_counts, parse_flavor_directory
+
+
+"""
+Fold-in queries: "what can I make with these ingredients".
+
+A dish row of the flavor matrix is the sum of the flavor keyword counts of its ingredients, and
+the SVD gives its latent vector as u = x V Σ^-1. The same projection applied to the counts of a
+list of ingredients (or flavor keywords) gives a query vector in the space of
+dish-latent-flavors-matrix.npy, which is then ranked like a dish. The projection is linear, so
+the latent vector of every term is computed once, cached, and a query is the sum of the vectors
+of its terms.
+
+The ingredient x flavor counts are precomputed offline, so queries do not read the ingredient
+JSON files:
+
+    python -m helpers.foldin build    write data/ingredient-flavor-counts.npz
+
+Without that file, the counts of an ingredient are read from its JSON file on first use.
+Folding in needs U, Σ and V of the same SVD (dish-latent-flavors-matrix.npy, latent-importance.npy
+and latentflavor_flavors.npy, written together by `python -m helpers.matrix build`); agreement()
+checks that they match. Components with a singular value below RCOND times the largest are
+numerically zero and are left out of the projection instead of being inverted.
+"""
+
+base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ingredient_counts_path = os.path.join(base_dir, "data", "ingredient-flavor-counts.npz")
+
+RCOND = 1e-8
+
+
+"""
+Computes the flavor keyword counts of every ingredient and saves them as an ingredient x flavor
+matrix, with columns in the order of all_flavor_profiles (the columns of the flavor matrix).
+Ingredients are named like the keys of create_dict_from_directory.
+
+Parameters:
+    flavors_dir (str): The directory containing the ingredient JSON files.
+
+    all_flavor_profiles (list of str): The sorted list of unique flavor profiles.
+
+    out_path (str, optional): The output file. Defaults to data/ingredient-flavor-counts.npz.
+
+    workers (int, optional): The worker processes parsing the files, as for parse_flavor_directory.
+    Defaults to 1.
+
+Returns:
+    str: The output file.
+"""
+
+def build_ingredient_counts(flavors_dir, all_flavor_profiles, out_path=ingredient_counts_path, workers=1):
+    ingredient_files = create_dict_from_directory(flavors_dir)
+    _, counts_by_file = parse_flavor_directory(flavors_dir, workers)
+    flavor_index = {flavor: i for i, flavor in enumerate(all_flavor_profiles)}
+
+    ingredients = sorted(ingredient_files)
+    counts = np.zeros((len(ingredients), len(all_flavor_profiles)), dtype=np.float32)
+    for row, ingredient in enumerate(ingredients):
+        for flavor, count in counts_by_file[ingredient_files[ingredient]].items():
+            if flavor in flavor_index:
+                counts[row, flavor_index[flavor]] = count
+
+    np.savez(out_path, ingredients=np.array(ingredients), counts=counts)
+    return out_path
+
+
+class FoldIn(object):
+    """
+    Projects ingredient and flavor keyword lists into the latent flavor space, caching the latent
+    vector of every term.
+    """
+
+    def __init__(self, all_flavor_profiles, latentflavor_flavors, importance, ingredients=None, counts=None,
+                 ingredient_files=None, flavors_dir=None, rcond=RCOND):
+        importance = np.asarray(importance, dtype=np.float64)
+        latentflavor_flavors = np.asarray(latentflavor_flavors, dtype=np.float64)
+        if latentflavor_flavors.shape[1] != len(importance):
+            raise ValueError(f"V has {latentflavor_flavors.shape[1]} components but Σ has {len(importance)}")
+        # x V Σ^-1 for a row of flavor counts x, over the numerically non-zero components only
+        self.components = importance > rcond * importance.max() if len(importance) else importance > 0
+        inverse = np.zeros(len(importance))
+        inverse[self.components] = 1 / importance[self.components]
+        self.projection = latentflavor_flavors * inverse
+        self.flavor_index = {flavor: i for i, flavor in enumerate(all_flavor_profiles)}
+        self.ingredient_rows = {str(name): row for row, name in enumerate(ingredients)} if ingredients is not None else {}
+        self.counts = counts
+        self.ingredient_files = ingredient_files or {}
+        self.flavors_dir = flavors_dir
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_paths(cls, paths, all_flavor_profiles, importance, ingredient_files, flavors_dir):
+        """
+        Load the projection from artifact paths ('latentflavor_flavors', 'ingredient_counts').
+        """
+        latentflavor_flavors = np.load(paths["latentflavor_flavors"])
+        ingredients = counts = None
+        if os.path.exists(paths.get("ingredient_counts", "")):
+            data = np.load(paths["ingredient_counts"])
+            ingredients, counts = data["ingredients"], data["counts"]
+        return cls(all_flavor_profiles, latentflavor_flavors, importance, ingredients, counts,
+                   ingredient_files, flavors_dir)
+
+    def _term_counts(self, term):
+        row = self.ingredient_rows.get(term)
+        if row is not None:
+            return self.counts[row]
+        if term in self.ingredient_files and self.flavors_dir is not None:
+            counts = np.zeros(len(self.flavor_index))
+            for flavor, count in fast_keyword_counts(os.path.join(self.flavors_dir, self.ingredient_files[term])).items():
+                if flavor in self.flavor_index:
+                    counts[self.flavor_index[flavor]] = count
+            return counts
+        if term in self.flavor_index:
+            counts = np.zeros(len(self.flavor_index))
+            counts[self.flavor_index[term]] = 1
+            return counts
+        return None
+
+    def term_vector(self, term):
+        """
+        The latent vector of one ingredient or flavor keyword, or None for an unknown term.
+        Ingredients take precedence over flavor keywords of the same name.
+        """
+        term = term.strip().lower()
+        with self._lock:
+            vector = self._cache.get(term)
+        record_cache("foldin_terms", vector is not None)
+        if vector is not None:
+            return vector
+
+        counts = self._term_counts(term)
+        if counts is None:
+            # Unknown terms are not cached, they come from user input
+            return None
+        vector = np.asarray(counts, dtype=np.float64) @ self.projection
+        vector.flags.writeable = False
+        with self._lock:
+            self._cache[term] = vector
+        return vector
+
+    def query_vector(self, terms):
+        """
+        Fold a list of ingredients and flavor keywords into one latent query vector.
+
+        Returns:
+            tuple: (vector (numpy.ndarray), matched terms (list), unknown terms (list))
+        """
+        vector = np.zeros(self.projection.shape[1])
+        matched, unknown = [], []
+        for term in terms:
+            term_vector = self.term_vector(term)
+            if term_vector is None:
+                unknown.append(term)
+            else:
+                vector += term_vector
+                matched.append(term)
+        return vector, matched, unknown
+
+    def agreement(self, ingredient_lists, dish_rows):
+        """
+        The mean cosine similarity, over the components kept, between the folded-in ingredient
+        lists of some dishes and their rows of U. Close to 1 when U, Σ and V come from the same
+        SVD; a U from another build gives unrelated vectors. Dishes without a known ingredient
+        are ignored.
+
+        Returns:
+            float or None: The mean cosine similarity, None when no dish could be folded in.
+        """
+        cosines = []
+        for ingredients, row in zip(ingredient_lists, dish_rows):
+            vector = self.query_vector(ingredients)[0][self.components]
+            row = np.asarray(row, dtype=np.float64)[self.components]
+            norms = np.linalg.norm(vector) * np.linalg.norm(row)
+            if norms > 0:
+                cosines.append(float(vector @ row / norms))
+        return float(np.mean(cosines)) if cosines else None
+
+
+if __name__ == "__main__":
+    from .matrix import data_dir, flavor_profiles_path, load_flavor_profiles
+
+    if len(sys.argv) != 2 or sys.argv[1] != "build":
+        print("Usage: python -m helpers.foldin build")
+        sys.exit(1)
+    print(f"Wrote {build_ingredient_counts(data_dir, load_flavor_profiles(data_dir, flavor_profiles_path), workers=None)}")
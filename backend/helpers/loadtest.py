@@ -0,0 +1,290 @@
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import threading
+import subprocess
+import http.client
+from urllib.parse import quote
+import numpy as np
+
+
+"""
+Local load driver replaying the search sessions of templates/base.html:
+
+    page load          GET  /recipe_names
+    typing             GET  /filter_names?query=<prefix>   (one per keystroke)
+    selection          POST /store_user_input
+                       POST /get_similar_dishes            (slim view)
+    opening a card     GET  /recipe/<id>?similar_to=<dish> (with probability --open-card)
+
+The dish a session looks for is drawn from a Zipf distribution over the recipe names, so a few
+dishes are popular and most are rare. Sessions run on --concurrency threads against the app
+in-process (Flask test client) or over HTTP against a local server, optionally a gunicorn
+started for the run:
+
+    python -m helpers.loadtest --sessions 200 --concurrency 8
+    python -m helpers.loadtest --url http://127.0.0.1:5000 --duration 60
+    python -m helpers.loadtest --gunicorn --concurrency 32 --think 0.05
+
+The report gives, per endpoint, the request count, throughput, p50/p95/p99/max latency and the
+error rate (5xx responses and connection errors).
+"""
+
+
+class InProcessTarget(object):
+    """
+    Calls the app through Flask's test client, one client per thread.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+
+    def request(self, method, path, body=None):
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        response = client.open(path, method=method, json=body)
+        return response.status_code, response.get_data()
+
+
+class HTTPTarget(object):
+    """
+    Calls a running server over HTTP, with one keep-alive connection per thread.
+    """
+
+    def __init__(self, url, timeout=30):
+        url = url.split("://", 1)[-1].rstrip("/")
+        self.host, _, port = url.partition(":")
+        self.port = int(port or 80)
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def request(self, method, path, body=None):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        try:
+            conn.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+            response = conn.getresponse()
+            return response.status, response.read()
+        except (OSError, http.client.HTTPException):
+            # Reconnect on the next request of this thread
+            conn.close()
+            self._local.conn = None
+            raise
+
+
+class Recorder(object):
+    """
+    Collects the latency and outcome of every request by endpoint.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+
+    def call(self, target, endpoint, method, path, body=None):
+        start = time.perf_counter()
+        try:
+            status, data = target.request(method, path, body)
+        except Exception:
+            status, data = None, None
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.latencies.setdefault(endpoint, []).append(elapsed)
+            if status is None or status >= 500:
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+        return status, data
+
+    def report(self, wall_seconds):
+        rows = []
+        for endpoint, latencies in sorted(self.latencies.items()):
+            latencies = np.array(latencies) * 1000
+            rows.append({
+                "endpoint": endpoint,
+                "requests": len(latencies),
+                "rps": len(latencies) / wall_seconds,
+                "p50_ms": float(np.percentile(latencies, 50)),
+                "p95_ms": float(np.percentile(latencies, 95)),
+                "p99_ms": float(np.percentile(latencies, 99)),
+                "max_ms": float(latencies.max()),
+                "error_rate": self.errors.get(endpoint, 0) / len(latencies),
+            })
+        return rows
+
+
+"""
+Returns the sampling order and cumulative Zipf probabilities of the query dishes: the dish of
+popularity rank r is drawn with probability proportional to 1 / r^exponent.
+"""
+
+def zipf_popularity(n, exponent, rng):
+    order = rng.permutation(n)
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    return order, np.cumsum(weights) / weights.sum()
+
+
+def run_session(target, recorder, names, popularity, rng, think, open_card):
+    order, cumulative = popularity
+
+    def pause(seconds):
+        if seconds > 0:
+            time.sleep(rng.exponential(seconds))
+
+    recorder.call(target, "recipe_names", "GET", "/recipe_names")
+    name = names[order[min(np.searchsorted(cumulative, rng.random()), len(order) - 1)]]
+
+    # base.html queries on every keystroke; people type faster than they think
+    typed = rng.integers(1, len(name) + 1)
+    for length in range(1, typed + 1):
+        pause(think / 5)
+        recorder.call(target, "filter_names", "GET", f"/filter_names?query={quote(name[:length])}")
+
+    pause(think)
+    recorder.call(target, "store_user_input", "POST", "/store_user_input", {"userInput": name})
+    status, data = recorder.call(target, "get_similar_dishes", "POST", "/get_similar_dishes",
+                                 {"userInput": name, "view": "slim"})
+
+    if status == 200 and rng.random() < open_card:
+        results = json.loads(data)
+        if results:
+            pause(think)
+            recipe = results[rng.integers(len(results))]
+            recorder.call(target, "recipe", "GET", f"/recipe/{recipe['id']}?similar_to={quote(name)}")
+
+
+"""
+Runs sessions on several threads until the session count or the duration is reached.
+
+Parameters:
+    target: InProcessTarget or HTTPTarget.
+
+    sessions (int, optional): The total number of sessions. Defaults to 100.
+
+    duration (float, optional): Stop starting sessions after this many seconds instead.
+
+    concurrency (int, optional): The number of concurrent sessions. Defaults to 8.
+
+    think (float, optional): The mean think time in seconds between steps (keystrokes use a
+    fifth of it). Defaults to 0 (closed loop, maximum load).
+
+    zipf (float, optional): The Zipf exponent of the dish popularity. Defaults to 1.1.
+
+    open_card (float, optional): The probability that a session opens a result. Defaults to 0.5.
+
+    seed (int, optional): The random seed. Defaults to 0.
+
+Returns:
+    tuple: (per endpoint report rows (list of dict), sessions run (int), wall time in seconds)
+"""
+
+def run_load(target, sessions=100, duration=None, concurrency=8, think=0.0, zipf=1.1, open_card=0.5, seed=0):
+    status, data = target.request("GET", "/recipe_names")
+    if status != 200:
+        raise RuntimeError(f"/recipe_names returned {status}")
+    names = json.loads(data)
+    popularity = zipf_popularity(len(names), zipf, np.random.default_rng(seed))
+
+    recorder = Recorder()
+    lock = threading.Lock()
+    started = [0]
+    start = time.perf_counter()
+
+    def worker(worker_seed):
+        rng = np.random.default_rng(worker_seed)
+        while True:
+            with lock:
+                if duration is not None:
+                    if time.perf_counter() - start >= duration:
+                        return
+                elif started[0] >= sessions:
+                    return
+                started[0] += 1
+            run_session(target, recorder, names, popularity, rng, think, open_card)
+
+    threads = [threading.Thread(target=worker, args=(seed + 1 + i,), daemon=True) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+    return recorder.report(wall), started[0], wall
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+"""
+Starts gunicorn with backend/gunicorn.conf.py on a free local port and waits until it answers.
+
+Returns:
+    tuple: (subprocess.Popen, base URL)
+"""
+
+def start_gunicorn(timeout=300):
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    port = _free_port()
+    process = subprocess.Popen([sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py",
+                                "--bind", f"127.0.0.1:{port}", "app:app"], cwd=backend_dir)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with {process.returncode}")
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+            conn.request("GET", "/metrics")
+            if conn.getresponse().status == 200:
+                return process, f"http://127.0.0.1:{port}"
+        except OSError:
+            time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError("gunicorn did not start in time")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay search sessions against the app and report latencies.")
+    parser.add_argument("--url", help="base URL of a running server (default: in-process test client)")
+    parser.add_argument("--gunicorn", action="store_true", help="start a local gunicorn for the run")
+    parser.add_argument("--sessions", type=int, default=100)
+    parser.add_argument("--duration", type=float, help="run for this many seconds instead of --sessions")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--think", type=float, default=0.0, help="mean think time between steps in seconds")
+    parser.add_argument("--zipf", type=float, default=1.1, help="Zipf exponent of the dish popularity")
+    parser.add_argument("--open-card", type=float, default=0.5, help="probability of opening a result")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    server = None
+    if args.gunicorn:
+        server, url = start_gunicorn()
+        target = HTTPTarget(url)
+    elif args.url:
+        target = HTTPTarget(args.url)
+    else:
+        sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        from app import app
+        target = InProcessTarget(app)
+
+    try:
+        rows, count, wall = run_load(target, args.sessions, args.duration, args.concurrency, args.think,
+                                     args.zipf, args.open_card, args.seed)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    print(f"{count} sessions in {wall:.1f}s ({count / wall:.1f} sessions/s)")
+    print(f"{'endpoint':>20} {'requests':>9} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'max ms':>8} {'errors':>7}")
+    for row in rows:
+        print(f"{row['endpoint']:>20} {row['requests']:>9} {row['rps']:>8.1f} {row['p50_ms']:>8.2f} "
+              f"{row['p95_ms']:>8.2f} {row['p99_ms']:>8.2f} {row['max_ms']:>8.2f} {row['error_rate']:>7.2%}")
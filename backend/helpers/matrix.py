@@ -1,12 +1,16 @@
 import os
+import sys
 import json
+import hashlib
 from collections import Counter
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
 import re
 import numpy as np
 import ast
-from scipy.sparse.linalg import svds
 from numpy import linalg as LA
-from .reviews import rating_count_weight
+from .metrics import span
+from .startup import stage
 
 
 """
@@ -144,6 +148,83 @@ def extract_keywords(json_file):
     return dict(sorted(keyword_counts.items(), key=lambda item: item[1], reverse=True))
 
 
+# Matches the molecules[].flavor_profile values without decoding the rest of the file
+# (the fooddb_/fema_flavor_profile keys do not match because of the leading quote)
+FLAVOR_PROFILE_RE = re.compile(r'"flavor_profile"\s*:\s*"((?:[^"\\]|\\.)*)"')
+
+
+"""
+Counts the flavor profile keywords of an ingredient's JSON file like extract_keywords, but 
+only scans the raw text for the 'flavor_profile' fields instead of decoding the whole file.
+
+Parameters:
+    json_file (str): The path to the JSON file containing data about an ingredient.
+
+Returns:
+    Counter: The occurrence count (int) of each flavor profile keyword (str).
+"""
+
+def fast_keyword_counts(json_file):
+    keyword_counts = Counter()
+    with open(json_file, 'r') as f:
+        text = f.read()
+
+    for match in FLAVOR_PROFILE_RE.finditer(text):
+        value = match.group(1)
+        if '\\' in value:
+            value = json.loads('"' + value + '"')
+        keyword_counts.update(keyword for keyword in value.split('@') if keyword)
+
+    return keyword_counts
+
+
+def _parse_flavor_chunk(directory, items):
+    return [(item, dict(fast_keyword_counts(os.path.join(directory, item)))) for item in items]
+
+
+"""
+Parses every ingredient JSON file in a directory. With several workers the files are split 
+into chunks that are fanned out over a process pool, and the partial results are merged. Only 
+the offline builds use the pool: forking from a threaded server (e.g. in a reload thread of a 
+gunicorn worker) is unsafe, and on the 934 files of data/flavors the serial scan is as fast.
+
+Parameters:
+    directory (str): The path to the directory containing the ingredient JSON files.
+
+    workers (int, optional): The number of worker processes. Defaults to 1, which parses 
+    serially in this process; None uses one per CPU.
+
+    chunk_size (int, optional): The number of files per work unit. Defaults to 32.
+
+Returns:
+    tuple: A tuple containing:
+        - all_flavor_profiles (list of str): The sorted list of unique flavor profiles, as 
+        returned by collect_flavor_profiles_from_directory.
+
+        - keyword_counts (dict): A dictionary mapping each JSON file name to the counts of its 
+        flavor profile keywords, usable by merge_counts and flavor_matrix.
+"""
+
+def parse_flavor_directory(directory, workers=1, chunk_size=32):
+    items = sorted(item for item in os.listdir(directory) if item.endswith('.json'))
+    chunks = [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+
+    if workers == 1:
+        results = [_parse_flavor_chunk(directory, chunk) for chunk in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_parse_flavor_chunk, [directory] * len(chunks), chunks))
+
+    keyword_counts = {}
+    vocabulary = set()
+    for partial in results:
+        for item, counts in partial:
+            keyword_counts[item] = counts
+            vocabulary.update(counts)
+
+    return sorted(vocabulary), keyword_counts
+
+
 """
 Aggregates the flavor profile keyword occurrences from a list of JSON files 
 representing different ingredients. It returns a dictionary sorted by the 
@@ -153,6 +234,9 @@ Parameters:
     json_files (list of str): A list of strings where each string is the filename 
     of a JSON file containing ingredient data.
 
+    keyword_counts_by_file (dict, optional): Precomputed keyword counts per file name, as 
+    returned by parse_flavor_directory. When given, no file is read.
+
 Returns:
     dict: A dictionary where each key is a flavor profile keyword (str) and each value 
     is the total occurrence count (int) of that keyword across all provided JSON files.
@@ -163,11 +247,14 @@ Example:
     files, sorted by frequency.
 """
 
-def merge_counts(json_files):
+def merge_counts(json_files, keyword_counts_by_file=None):
     merged_keyword_counts = Counter()
     for json_file in json_files:
-        full_path = os.path.join(data_dir, json_file)
-        keyword_counts = extract_keywords(full_path)
+        if keyword_counts_by_file is not None:
+            keyword_counts = keyword_counts_by_file[json_file]
+        else:
+            full_path = os.path.join(data_dir, json_file)
+            keyword_counts = extract_keywords(full_path)
         merged_keyword_counts.update(keyword_counts)
 
     merged_keyword_counts = dict(
@@ -256,7 +343,7 @@ def dish_id_ingr(recipes, base_dir):
 """
 Returns a matrix representing the flavor profiles of dishes and applies Singular Value 
 Decomposition (SVD) to this matrix. It saves the matrix of dishes against latent flavor 
-dimensions (U) with a k-value of 80
+dimensions (U) with a k-value of 80, and the singular values (Σ) of those dimensions
 
 Parameters:
     ndishes (int): The number of dishes, which determines the number of rows in the matrix.
@@ -272,6 +359,9 @@ Parameters:
     base_dir (str): A string representing the path to the directory where the matrix of dishes against 
     latent flavor dimensions (U) with a k-value of 80 is saved
 
+    keyword_counts_by_file (dict, optional): Precomputed keyword counts per ingredient file, as returned 
+    by parse_flavor_directory, so each ingredient file is parsed once instead of once per dish.
+
 Returns:
     matrix: a matrix (flavor matrix) representing the flavor profiles of dishes. Each row of the matrix 
     corresponds to a dish while each column represents a flavor. At row i, column j in the matrix is the 
@@ -284,7 +374,10 @@ Example:
     resulting matrices to disk.
 """
 
-def flavor_matrix(ndishes, nflavors, name_ing_data, json_dict, all_flavor_profiles, base_dir):
+def flavor_matrix(ndishes, nflavors, name_ing_data, json_dict, all_flavor_profiles, base_dir, keyword_counts_by_file=None):
+    # Offline build only: scipy is not imported on the serving path
+    from scipy.sparse.linalg import svds
+
     matrix = np.zeros((ndishes, nflavors), dtype=float)
     row = 0
     for ingredient_list in name_ing_data[2]:
@@ -294,7 +387,7 @@ def flavor_matrix(ndishes, nflavors, name_ing_data, json_dict, all_flavor_profil
             if ingredient.lower() in json_dict.keys():
                 acc.append(json_dict[ingredient.lower()])
 
-        flavors = merge_counts(acc)
+        flavors = merge_counts(acc, keyword_counts_by_file)
         for flavor in flavors.keys():
             ind = all_flavor_profiles.index(flavor)
             val = flavors[flavor]
@@ -302,9 +395,12 @@ def flavor_matrix(ndishes, nflavors, name_ing_data, json_dict, all_flavor_profil
 
         row += 1
     dish_latentflavors, importance, latentflavor_flavors_trans = svds(matrix, k = 80)
+    # U, Σ and V are only consistent within one svds run (signs and basis change between runs),
+    # so all three are written together
     np.save((os.path.join(base_dir, "data", "dish-latent-flavors-matrix")), dish_latentflavors)
-    #np.save((os.path.join(base_dir, "data", "latentflavor_flavors")), latentflavor_flavors_trans.T)
-    #print(latentflavor_flavors_trans.T)
+    # Σ, in the same (ascending) column order as U, used to order the dimensions by energy
+    np.save((os.path.join(base_dir, "data", "latent-importance")), importance)
+    np.save((os.path.join(base_dir, "data", "latentflavor_flavors")), latentflavor_flavors_trans.T)
     #np.save((os.path.join(base_dir, "data","flavors-matrix.npy")), matrix)
     return(matrix)
 
@@ -334,6 +430,38 @@ def load_user_input(filename):
     return user_input_string
 
 
+"""
+Scores every dish against the query vector with the rating-weighted cosine similarity and 
+returns the ten best dishes (excluding the query dish itself). This is the exact float scan 
+used by top_ten when no quantized index is given.
+
+Returns:
+    tuple: (indices of the ten best dishes, cosine similarities of all dishes, weighted scores 
+    of all dishes)
+"""
+
+def _exact_ranking(index, vect, matrix_comp, rating_count_weight):
+    with span("top_ten.similarity"):
+        # One matrix-vector product instead of a Python loop over the dishes: NumPy releases the
+        # GIL inside it, so concurrent requests of a threaded worker can score at the same time
+        denominators = LA.norm(vect) * LA.norm(matrix_comp, axis=1)
+        cos_sim = np.divide(matrix_comp @ vect, denominators, out=np.zeros(len(denominators)),
+                            where=denominators != 0)
+        dish_sim = np.asarray(rating_count_weight[2], dtype=float) * cos_sim
+
+    with span("top_ten.rank"):
+        dish_cossim = np.array(dish_sim)
+        top = np.argsort(dish_cossim)[-11:]
+        ordered = top[::-1]
+        # index is None for query vectors that are not a dish (helpers/foldin.py)
+        final = ordered if index is None else np.delete(ordered, np.where(ordered == index))
+
+        if np.size(final) != 10:
+            final = final[:10]  
+
+    return final, cos_sim, dish_sim
+
+
 """
 Identifies and returns the top ten dishes most similar to the user's input based on cosine similarity 
 and returns detailed information about these dishes, including their names, cosine similarity
@@ -347,12 +475,29 @@ Parameters:
 
     matrix_comp (numpy.ndarray): The matrix containing the flavor vectors that represents each dish.
 
-    recipes (str): The path to the JSON file containing the recipes data.
+    recipes (str or recipe store): The path to the JSON file containing the recipes data, or a 
+    recipe store from helpers/recipeStore.py that fetches the result rows by RecipeId.
+
+    rating_count_weight (list of lists): The ratings, counts and weights ordered like the dishes.
+
+    lat_dims (dict, optional): The words of each latent dimension. Defaults to the ones loaded by 
+    load_data().
+
+    search_index (optional): An int8 QuantizedIndex (helpers/quantize.py) or a CascadeIndex 
+    (helpers/cascade.py) of matrix_comp. When given, dishes are scored approximately and only a 
+    shortlist is re-ranked exactly.
+
+    budget (Budget, optional): The latency budget of the request (helpers/budget.py). When the
+    latent dimension explanations are not expected to fit in it, they are skipped (empty lists)
+    and 'latent_explanations' is recorded in budget.degraded.
+
+    slim (bool, optional): Return only what a result card shows, as slim_dish() dicts. The 
+    instructions are not formatted and the latent dimension explanations are not computed.
 
 Returns:
     list: A list of lists, where each inner list contains the names, cosine similarity scores, 
     ranking scores (cosine similarity score weighted by rating), IDs, descriptions, recipes, 
-    ratings (1-5), rating counts and labels
+    ratings (1-5), rating counts, labels and latent dimension words; with slim, a list of dicts
 
 Example:
     Given a user's input dish name, the corresponding lists of dish names and IDs, a 
@@ -360,62 +505,150 @@ Example:
     information for the top ten most similar dishes.
 """
 
-def top_ten(query_sim, name_ing_data, matrix_comp, recipes,rating_count_weight):
-    index = name_ing_data[0].index(query_sim.lower())
-    vect = matrix_comp[index,:]
+def top_ten(query_sim, name_ing_data, matrix_comp, recipes,rating_count_weight, lat_dims=None, search_index=None,
+            budget=None, slim=False):
+    with span("top_ten.lookup"):
+        index = name_ing_data[0].index(query_sim.lower())
+        vect = matrix_comp[index,:]
 
-    dish_sim = []
-    cos_sim = []
-    for row,weight in zip(matrix_comp,rating_count_weight[2]):
-        if (LA.norm(vect) * LA.norm(row)) != 0:
-            cos = np.dot(vect, row) / (LA.norm(vect) * LA.norm(row))
-            cos_sim.append(cos)
-            dish_sim.append(weight*cos)
-        else:
-            dish_sim.append(0)
-            cos_sim.append(0)
+    if search_index is not None:
+        # Approximate scan of every dish, exact float re-rank of a shortlist
+        with span("top_ten.similarity_index"):
+            final, cos_sim, dish_sim = search_index.search(index, matrix_comp, rating_count_weight[2])
+    else:
+        final, cos_sim, dish_sim = _exact_ranking(index, vect, matrix_comp, rating_count_weight)
 
-    dish_cossim = np.array(dish_sim)
-    top = np.argsort(dish_cossim)[-11:]
-    ordered = top[::-1]
-    final = np.delete(ordered, np.where(ordered == index))
+    info = _result_rows(final, cos_sim, dish_sim, name_ing_data, recipes, rating_count_weight, slim)
+    if slim:
+        return [slim_dish(dish) for dish in info]
 
-    if np.size(final) != 10:
-        final = final[:10]  
+    # Computing the latent dimensions and transforming them, unless the request has no time left
+    if budget is not None and not budget.allows("top_ten.top_ten_vector", "top_ten.top_latent"):
+        budget.degrade("latent_explanations")
+        transformed_lats = [[] for _ in info]
+    else:
+        with span("top_ten.top_ten_vector"):
+            top_vects = top_ten_vector(info, name_ing_data[0], matrix_comp)
+        with span("top_ten.top_latent"):
+            lats = top_latent(query_sim, top_vects, name_ing_data[0], matrix_comp)
+        # lat_dims is computed once by load_data()
+        if lat_dims is None:
+            lat_dims = globals()["lat_dims"]
+        transformed_lats = [[lat_dims[index] for index in sublist] for sublist in lats]
 
-    info = []
-    cos_scores = np.array(cos_sim)
-    top1 = np.argsort(cos_scores)[-11:]
-    ordered1 = top1[::-1]
-    final1 = np.delete(ordered1, np.where(ordered1 == index))
+    # Adding transformed_lats to the output
+    for i, dish_info in enumerate(info):
+        dish_info.append(transformed_lats[i])
 
-    if np.size(final1) != 10:
-        final1 = final1[:10]
+    return(info)
 
-    with open(recipes, 'r', encoding='utf-8') as f:
-        data = json.load(f)
 
-        for indx in final:
-            name = data[indx]["Name"]
-            id = data[indx]["RecipeId"]
-            desc = data[indx]["Description"]
-            recipe = format_recipe(data[indx]["RecipeInstructions"])
-            labels = food_warnings(recipe)
+"""
+Returns the ten dishes most similar to an arbitrary latent flavor vector, such as an ingredient 
+list folded into the latent space by helpers/foldin.py, in the same format as top_ten. No dish 
+is excluded from the results.
+
+Parameters:
+    vect (numpy.ndarray): The query vector in the latent flavor space.
+
+    name_ing_data, matrix_comp, recipes, rating_count_weight, lat_dims, search_index, slim: As for 
+    top_ten.
+
+Returns:
+    list: A list in the format of top_ten.
+"""
+
+def top_ten_for_vector(vect, name_ing_data, matrix_comp, recipes, rating_count_weight, lat_dims=None, search_index=None,
+                       slim=False):
+    if search_index is not None:
+        with span("top_ten.similarity_index"):
+            final, cos_sim, dish_sim = search_index.search_vector(vect, matrix_comp, rating_count_weight[2])
+    else:
+        final, cos_sim, dish_sim = _exact_ranking(None, vect, matrix_comp, rating_count_weight)
+
+    info = _result_rows(final, cos_sim, dish_sim, name_ing_data, recipes, rating_count_weight, slim)
+    if slim:
+        return [slim_dish(dish) for dish in info]
+
+    with span("top_ten.top_ten_vector"):
+        top_vects = top_ten_vector(info, name_ing_data[0], matrix_comp)
+    with span("top_ten.top_latent"):
+        lats = top_latent(None, top_vects, name_ing_data[0], matrix_comp, query_vector=vect)
+    if lat_dims is None:
+        lat_dims = globals()["lat_dims"]
+    for dish_info, sublist in zip(info, lats):
+        dish_info.append([lat_dims[index] for index in sublist])
+
+    return info
+
+
+"""
+Fetches the recipes of the ranked dishes and builds the result rows shared by top_ten and 
+top_ten_for_vector: name, cosine similarity, ranking score, ID, description, recipe, rating, 
+rating count and labels. With slim the recipe is left as None and the labels come from 
+recipe_labels().
+"""
+
+def _result_rows(final, cos_sim, dish_sim, name_ing_data, recipes, rating_count_weight, slim=False):
+    info = []
+
+    with span("top_ten.load_recipes"):
+        if hasattr(recipes, "get_recipes"):
+            # A recipe store (helpers/recipeStore.py): only the ten result rows are fetched
+            data = recipes.get_recipes([name_ing_data[1][indx] for indx in final])
+        else:
+            with open(recipes, 'r', encoding='utf-8') as f:
+                all_recipes = json.load(f)
+            data = [all_recipes[indx] for indx in final]
+
+    with span("top_ten.details"):
+        for row, indx in zip(data, final):
+            name = row["Name"]
+            id = row["RecipeId"]
+            desc = row["Description"]
+            if slim:
+                recipe = None
+                labels = list(recipe_labels(row["RecipeInstructions"]))
+            else:
+                recipe = format_recipe(row["RecipeInstructions"])
+                labels = food_warnings(recipe)
             rating = rating_count_weight[0][indx]
             count = rating_count_weight[1][indx]
             info.append([name, cos_sim[indx], dish_sim[indx], id, desc, recipe, rating, count, labels])
 
-    # Computing the latent dimensions and transforming them
-    top_vects = top_ten_vector(info, name_ing_data[0], matrix_comp)
-    lats = top_latent(query_sim, top_vects, name_ing_data[0], matrix_comp)
-    lat_dims = find_latent_dims(all_flavor_profiles, base_dir)
-    transformed_lats = [[lat_dims[index] for index in sublist] for sublist in lats]
+    return info
 
-    # Adding transformed_lats to the output
-    for i, dish_info in enumerate(info):
-        dish_info.append(transformed_lats[i])
 
-    return(info)
+"""
+Projects one row of top_ten onto the fields of a result card: id, name, similarity and ranking 
+scores, rating (None for a recipe without one), rating count, labels and a summary of at most 
+200 characters of the description.
+"""
+
+def slim_dish(dish):
+    name, cos, weighted, recipe_id, desc, _, rating, count, labels = dish[:9]
+    desc = desc or ""
+    return {
+        "id": int(recipe_id),
+        "name": name,
+        "similarity": float(cos),
+        "score": float(weighted),
+        "rating": None if rating is None else float(rating),
+        "count": int(count),
+        "labels": labels,
+        "summary": desc if len(desc) <= 200 else desc[:200] + "...",
+    }
+
+
+"""
+Returns the labels of a recipe (see food_warnings) from its raw instructions. The result only 
+depends on the instructions, so it is cached: result cards do not format the same recipes 
+again on every request.
+"""
+
+@lru_cache(maxsize=8192)
+def recipe_labels(instructions):
+    return tuple(food_warnings(format_recipe(instructions)))
 
 
 """
@@ -467,15 +700,21 @@ Parameters:
     dish_order (list): A list of dishes in the order they appear in the matrix.
 
     matrix_comp (np.array): The matrix containing the flavor vectors that represents each dish.
+
+    query_vector (np.array, optional): The latent vector to compare with instead of the vector of the 
+    dish named query_sim (e.g. a folded-in ingredient list).
     
 Returns:
     final (list of lists): A list of lists, where each sublist contains the top five latent dimensions 
     for one of the top ten dishes
 """
 
-def top_latent(query_sim, top_ten_vects, dish_order, matrix_comp):
-    indx = dish_order.index(query_sim.lower())
-    in_vect = matrix_comp[indx,:]
+def top_latent(query_sim, top_ten_vects, dish_order, matrix_comp, query_vector=None):
+    if query_vector is None:
+        indx = dish_order.index(query_sim.lower())
+        in_vect = matrix_comp[indx,:]
+    else:
+        in_vect = query_vector
     in_vect = np.argsort(in_vect)[::-1]
     final = []
 
@@ -520,18 +759,22 @@ Parameters:
     all_flavor_profiles (list): A list of all flavor profile names.
 
     base_dir (str): The base directory where the data files are located.
+
+    v_path (str, optional): The path to the latent flavor matrix (V). Defaults to 
+    data/latentflavor_flavors.npy under base_dir.
     
 Returns:
     lat_dims_dict (dict): A dictionary where keys are latent dimension indices and values 
     are lists of top flavor profile names.
 """
 
-def find_latent_dims(all_flavor_profiles, base_dir):
+def find_latent_dims(all_flavor_profiles, base_dir, v_path=None):
     flavor_dict = {}
     for i, name in enumerate(all_flavor_profiles):
         flavor_dict[name] = i
 
-    v_path = os.path.join(base_dir, "data", "latentflavor_flavors.npy")
+    if v_path is None:
+        v_path = os.path.join(base_dir, "data", "latentflavor_flavors.npy")
     v = np.load(v_path)
 
     word_to_index = flavor_dict
@@ -601,31 +844,166 @@ base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 data_dir = os.path.join(base_dir, "data", "flavors")
 recipes_file = os.path.join(base_dir, "data", "random-recipe.json")
 dish_id_ingr_path = os.path.normpath(os.path.join(base_dir, 'data', 'dish_id_ingr.txt'))
+flavor_profiles_path = os.path.join(base_dir, "data", "all_flavor_profiles.json")
+
+#U in SVD (dish against latent dimensions)
+dish_latentflavors_path = os.path.join(base_dir, "data", "dish-latent-flavors-matrix.npy")
+
+#Σ in SVD (singular value of each latent dimension)
+latent_importance_path = os.path.join(base_dir, "data", "latent-importance.npy")
 
 # Contains (dish_name, dish_id, ingredients)
 #dish_id_ingr(recipes_file, base_dir)
 
-with open(dish_id_ingr_path, 'r') as file:
-    content = file.read()
-    input = ast.literal_eval(content)
-name_ing_data = input
+# Populated by load_data()
+name_ing_data = None
+all_flavor_profiles = None
+ndishes = 0
+nflavors = 0
+json_dict = None
+dish_latentflavors = None
+lat_dims = None
+latent_importance = None
 
-#Testing Purposes:
-# Collect all unique flavor profiles from JSONs in the current directory
-all_flavor_profiles = collect_flavor_profiles_from_directory(data_dir)
 
-# Total Number of Dishes
-ndishes = len(name_ing_data[0])
+"""
+Returns a fingerprint of the ingredient JSON files in a directory: the SHA-256 of their names 
+and contents. The contents are hashed rather than the mtimes, which a git clone or a copy into 
+an image resets; on the 934 files of data/flavors this takes about a quarter of a parse.
 
-# Total Number of Flavors
-nflavors = len(all_flavor_profiles)
+Parameters:
+    directory (str): The path to the directory containing the ingredient JSON files.
 
-json_dict = create_dict_from_directory(data_dir)
-#matrix = flavor_matrix(ndishes, nflavors, name_ing_data, json_dict, all_flavor_profiles)
+Returns:
+    str: The hex digest of the directory.
+"""
+
+def flavor_directory_fingerprint(directory):
+    digest = hashlib.sha256()
+    for item in sorted(item for item in os.listdir(directory) if item.endswith('.json')):
+        digest.update(item.encode('utf-8') + b'\0')
+        with open(os.path.join(directory, item), 'rb') as file:
+            digest.update(file.read())
+        digest.update(b'\0')
+    return digest.hexdigest()
 
-#U in SVD (dish against latent dimensions)
-dish_latentflavors_path = os.path.join(base_dir, "data", "dish-latent-flavors-matrix.npy")
-dish_latentflavors = np.load(dish_latentflavors_path)
+
+"""
+Returns the sorted list of all unique flavor profiles, reading it from a cached JSON artifact 
+when the cache was built from the current contents of the flavor directory, and parsing every 
+ingredient file otherwise. The cache is only written by the offline build 
+(write_flavor_profiles), never at serve time; a stale or unkeyed cache is ignored.
+
+Parameters:
+    directory (str): The path to the directory containing the ingredient JSON files.
+
+    cache_path (str): The path to the cached flavor profile list.
+
+Returns:
+    list: A sorted list of unique flavor profile strings.
+"""
+
+def load_flavor_profiles(directory, cache_path):
+    if os.path.exists(cache_path):
+        with open(cache_path, 'r') as file:
+            cached = json.load(file)
+        if isinstance(cached, dict) and cached.get("fingerprint") == flavor_directory_fingerprint(directory):
+            return cached["flavor_profiles"]
+        print(f"{cache_path} does not match {directory}, parsing the directory "
+              "(python -m helpers.matrix build rewrites the cache)")
+
+    flavor_profiles, _ = parse_flavor_directory(directory)
+    return flavor_profiles
+
+
+"""
+Parses the flavor directory and writes the flavor profile cache read by load_flavor_profiles, 
+keyed on the fingerprint of the directory. The file is replaced atomically.
+
+Parameters:
+    directory (str): The path to the directory containing the ingredient JSON files.
+
+    cache_path (str): The path to write the cached flavor profile list to.
+
+    workers (int, optional): The number of worker processes, as in parse_flavor_directory. 
+    Defaults to None, one per CPU.
+
+Returns:
+    tuple: The flavor profiles and keyword counts, as returned by parse_flavor_directory.
+"""
+
+def write_flavor_profiles(directory, cache_path, workers=None):
+    fingerprint = flavor_directory_fingerprint(directory)
+    flavor_profiles, keyword_counts = parse_flavor_directory(directory, workers=workers)
+    tmp_path = f"{cache_path}.tmp-{os.getpid()}"
+    with open(tmp_path, 'w') as file:
+        json.dump({"fingerprint": fingerprint, "flavor_profiles": flavor_profiles}, file)
+    os.replace(tmp_path, cache_path)
+    return flavor_profiles, keyword_counts
+
+
+"""
+Loads every artifact the serving path needs, in order. Nothing is loaded at import time; the 
+app calls this during its init phase, and helpers/artifacts.py calls it with the paths of a 
+versioned bundle when reloading.
+
+Parameters:
+    paths (dict, optional): Artifact paths by logical name ('dish_id_ingr', 'flavor_profiles', 
+    'flavors', 'dish_latentflavors', 'latentflavor_flavors'). Missing names use the default 
+    files in the data directory.
+
+    install (bool, optional): Whether to also bind the loaded artifacts to the module globals. 
+    Defaults to True.
+
+    mmap_mode (str, optional): Memory-map the dish latent flavor matrix instead of reading it 
+    (e.g. 'r' when an int8 index does the full scans). Defaults to None.
+
+Returns:
+    dict: The loaded artifacts (name_ing_data, all_flavor_profiles, json_dict, 
+    dish_latentflavors, lat_dims, latent_importance) by name.
+"""
+
+def load_data(paths=None, install=True, mmap_mode=None):
+    paths = paths or {}
+    flavors_dir = paths.get("flavors", data_dir)
+
+    with stage("matrix: dish_id_ingr.txt"):
+        # The file is written with json.dumps, json.load is much faster than ast.literal_eval
+        with open(paths.get("dish_id_ingr", dish_id_ingr_path), 'r') as file:
+            loaded_name_ing_data = json.load(file)
+
+    with stage("matrix: flavor profiles"):
+        # Collect all unique flavor profiles from JSONs in the flavor directory
+        loaded_flavor_profiles = load_flavor_profiles(flavors_dir, paths.get("flavor_profiles", flavor_profiles_path))
+
+    with stage("matrix: flavor directory index"):
+        loaded_json_dict = create_dict_from_directory(flavors_dir)
+    #matrix = flavor_matrix(ndishes, nflavors, name_ing_data, json_dict, all_flavor_profiles)
+
+    with stage("matrix: dish-latent-flavors-matrix.npy"):
+        loaded_latentflavors = np.load(paths.get("dish_latentflavors", dish_latentflavors_path), mmap_mode=mmap_mode)
+
+    with stage("matrix: latent dimension words"):
+        loaded_lat_dims = find_latent_dims(loaded_flavor_profiles, base_dir, paths.get("latentflavor_flavors"))
+
+    # Only written by flavor_matrix builds that persist Σ
+    importance_path = paths.get("latent_importance", latent_importance_path)
+    loaded_importance = np.load(importance_path) if os.path.exists(importance_path) else None
+
+    loaded = {
+        "name_ing_data": loaded_name_ing_data,
+        "all_flavor_profiles": loaded_flavor_profiles,
+        "json_dict": loaded_json_dict,
+        "dish_latentflavors": loaded_latentflavors,
+        "lat_dims": loaded_lat_dims,
+        "latent_importance": loaded_importance,
+    }
+    if install:
+        globals().update(loaded)
+        # Total Number of Dishes / Total Number of Flavors
+        globals().update(ndishes=len(loaded_name_ing_data[0]), nflavors=len(loaded_flavor_profiles))
+
+    return loaded
 
 """
 final_output1 = top_ten("Cottage Cheese Banana Sundae", name_ing_data, dish_latentflavors, recipes_file, rating_count_weight)
@@ -635,4 +1013,18 @@ lats = top_latent("Cottage Cheese Banana Sundae", top_vects, name_ing_data[0], d
 
 
 
-    
\ No newline at end of file
+    
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2 or sys.argv[1] != "build":
+        print("Usage: python -m helpers.matrix build")
+        sys.exit(1)
+    # Rebuild the flavor profile cache and U, Σ and V of the flavor matrix from dish_id_ingr.txt
+    # and the ingredient files
+    with open(dish_id_ingr_path, 'r') as file:
+        build_name_ing_data = json.load(file)
+    build_flavor_profiles, build_counts = write_flavor_profiles(data_dir, flavor_profiles_path)
+    flavor_matrix(len(build_name_ing_data[0]), len(build_flavor_profiles), build_name_ing_data,
+                  create_dict_from_directory(data_dir), build_flavor_profiles, base_dir, build_counts)
+    print(f"Wrote {flavor_profiles_path} and U, Σ and V of the flavor matrix to {os.path.dirname(dish_latentflavors_path)}")
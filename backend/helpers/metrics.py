@@ -0,0 +1,246 @@
+import os
+import json
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+
+
+"""
+Lightweight in-process instrumentation: per-stage latency histograms, request counters
+and cache hit/miss counters, rendered in the Prometheus text exposition format.
+
+Every worker process keeps its own registry. When the METRICS_DIR environment variable is
+set (e.g. when running several gunicorn workers), each worker also writes a snapshot of
+its registry to METRICS_DIR/<pid>.json so that whichever worker serves /metrics can
+aggregate the numbers of all workers.
+"""
+
+# Histogram bucket upper bounds in seconds
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+METRICS_DIR = os.environ.get("METRICS_DIR")
+SNAPSHOT_INTERVAL = 5.0
+
+_lock = threading.Lock()
+_histograms = {}
+_counters = {}
+_last_snapshot = [0.0]
+
+
+"""
+Records one latency observation (in seconds) for a named stage.
+
+Parameters:
+    name (str): The name of the stage, e.g. 'top_ten.similarity'.
+
+    seconds (float): The measured duration.
+"""
+
+def observe(name, seconds):
+    slot = bisect.bisect_left(BUCKETS, seconds)
+    with _lock:
+        hist = _histograms.get(name)
+        if hist is None:
+            hist = _histograms[name] = {"buckets": [0] * (len(BUCKETS) + 1), "sum": 0.0, "count": 0}
+        hist["buckets"][slot] += 1
+        hist["sum"] += seconds
+        hist["count"] += 1
+    _maybe_snapshot()
+
+
+"""
+Increments a named counter, optionally split by a label value.
+
+Parameters:
+    name (str): The name of the counter, e.g. 'requests_total'.
+
+    label (str, optional): A label value the counter is split by (endpoint, status, ...).
+
+    amount (int, optional): The amount to add. Defaults to 1.
+"""
+
+def incr(name, label="", amount=1):
+    with _lock:
+        key = (name, label)
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+"""
+Records a cache lookup so hit ratios can be computed from /metrics.
+
+Parameters:
+    cache (str): The name of the cache.
+
+    hit (bool): Whether the lookup was served from the cache.
+"""
+
+def record_cache(cache, hit):
+    incr("cache_hits_total" if hit else "cache_misses_total", cache)
+
+
+"""
+Context manager timing the enclosed block as one stage.
+
+Example:
+    with span("top_ten.load_recipes"):
+        data = json.load(f)
+"""
+
+@contextmanager
+def span(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start)
+
+
+"""
+Returns the mean duration (in seconds) of a stage in this worker, or None before its first
+observation. Used by helpers/budget.py to predict whether a stage fits in a request's budget.
+"""
+
+def mean(name):
+    with _lock:
+        hist = _histograms.get(name)
+        if hist is None or hist["count"] == 0:
+            return None
+        return hist["sum"] / hist["count"]
+
+
+"""
+Returns a JSON-serializable copy of this worker's registry.
+"""
+
+def snapshot():
+    with _lock:
+        return {
+            "histograms": {name: {"buckets": list(h["buckets"]), "sum": h["sum"], "count": h["count"]}
+                           for name, h in _histograms.items()},
+            "counters": [[name, label, value] for (name, label), value in _counters.items()],
+        }
+
+
+def _maybe_snapshot(force=False):
+    if METRICS_DIR is None:
+        return
+    now = time.monotonic()
+    if not force and now - _last_snapshot[0] < SNAPSHOT_INTERVAL:
+        return
+    _last_snapshot[0] = now
+    try:
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        path = os.path.join(METRICS_DIR, f"{os.getpid()}.json")
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w') as file:
+            json.dump(snapshot(), file)
+        os.replace(tmp_path, path)
+    except OSError:
+        pass
+
+
+"""
+Removes the snapshot of one worker, e.g. when gunicorn retires it, so that /metrics stops
+counting a process that no longer serves requests.
+
+Parameters:
+    pid (int): The process id of the worker.
+"""
+
+def remove_snapshot(pid):
+    if METRICS_DIR is None:
+        return
+    for path in (os.path.join(METRICS_DIR, f"{pid}.json"), os.path.join(METRICS_DIR, f"{pid}.json.tmp")):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+"""
+Removes the snapshots of all workers. Called when the server starts, since the snapshots
+of a previous run (or of a crashed worker) would otherwise be aggregated forever.
+"""
+
+def clear_snapshots():
+    if METRICS_DIR is None or not os.path.isdir(METRICS_DIR):
+        return
+    for item in os.listdir(METRICS_DIR):
+        if item.endswith('.json') or item.endswith('.json.tmp'):
+            remove_snapshot(item.split('.')[0])
+
+
+"""
+Merges the snapshots of all workers. Without METRICS_DIR only this worker is reported.
+
+Returns:
+    dict: A snapshot with the same layout as snapshot(), summed over workers.
+"""
+
+def aggregate():
+    if METRICS_DIR is None or not os.path.isdir(METRICS_DIR):
+        return snapshot()
+    _maybe_snapshot(force=True)
+
+    histograms = {}
+    counters = {}
+    for item in os.listdir(METRICS_DIR):
+        if not item.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(METRICS_DIR, item), 'r') as file:
+                worker = json.load(file)
+        except (OSError, ValueError):
+            continue
+        for name, h in worker["histograms"].items():
+            merged = histograms.setdefault(name, {"buckets": [0] * (len(BUCKETS) + 1), "sum": 0.0, "count": 0})
+            merged["buckets"] = [a + b for a, b in zip(merged["buckets"], h["buckets"])]
+            merged["sum"] += h["sum"]
+            merged["count"] += h["count"]
+        for name, label, value in worker["counters"]:
+            counters[(name, label)] = counters.get((name, label), 0) + value
+
+    return {
+        "histograms": histograms,
+        "counters": [[name, label, value] for (name, label), value in counters.items()],
+    }
+
+
+"""
+Renders the (aggregated) registry in the Prometheus text exposition format.
+
+Returns:
+    str: The metrics page served by /metrics.
+"""
+
+def render_prometheus():
+    data = aggregate()
+    lines = ["# TYPE stage_latency_seconds histogram"]
+    for name in sorted(data["histograms"]):
+        h = data["histograms"][name]
+        cumulative = 0
+        for bound, count in zip(BUCKETS, h["buckets"]):
+            cumulative += count
+            lines.append(f'stage_latency_seconds_bucket{{stage="{name}",le="{bound}"}} {cumulative}')
+        lines.append(f'stage_latency_seconds_bucket{{stage="{name}",le="+Inf"}} {h["count"]}')
+        lines.append(f'stage_latency_seconds_sum{{stage="{name}"}} {h["sum"]:.6f}')
+        lines.append(f'stage_latency_seconds_count{{stage="{name}"}} {h["count"]}')
+
+    counters = {}
+    for name, label, value in data["counters"]:
+        counters.setdefault(name, []).append((label, value))
+    for name in sorted(counters):
+        lines.append(f"# TYPE {name} counter")
+        for label, value in sorted(counters[name]):
+            lines.append(f'{name}{{name="{label}"}} {value}')
+
+    hits = dict(counters.get("cache_hits_total", []))
+    misses = dict(counters.get("cache_misses_total", []))
+    if hits or misses:
+        lines.append("# TYPE cache_hit_ratio gauge")
+        for cache in sorted(set(hits) | set(misses)):
+            total = hits.get(cache, 0) + misses.get(cache, 0)
+            lines.append(f'cache_hit_ratio{{name="{cache}"}} {hits.get(cache, 0) / total:.4f}')
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,234 @@
+import os
+import sys
+import time
+import numpy as np
+from numpy import linalg as LA
+
+
+"""
+Int8 quantized storage and scoring for the dish x latent flavor matrix (U in the SVD).
+
+Every row is L2-normalized and each latent dimension is scaled into [-127, 127] and stored as
+int8, which is 8x smaller than the float64 matrix. A query is scored against all dishes with
+the int8 codes; only the best candidates are then re-scored exactly on the float rows, so the
+final ranking and scores are the same as the full float scan whenever the true top ten are
+among the candidates.
+
+Usage:
+    python -m helpers.quantize build    write data/dish-latent-flavors-int8.npz
+    python -m helpers.quantize report   recall@10 of the int8 search against the exact ranking
+"""
+
+# Rows scored per block, bounds the float32 temporary created from the int8 codes
+BLOCK_ROWS = 65536
+
+
+class QuantizedIndex(object):
+
+    def __init__(self, codes, scales):
+        self.codes = codes
+        self.scales = scales
+
+    @classmethod
+    def build(cls, matrix_comp):
+        """
+        Quantize the row-normalized matrix with one scale per latent dimension.
+        """
+        matrix_comp = np.asarray(matrix_comp, dtype=np.float64)
+        norms = LA.norm(matrix_comp, axis=1)
+        unit = matrix_comp / np.where(norms == 0, 1, norms)[:, None]
+        scales = np.abs(unit).max(axis=0) / 127
+        scales[scales == 0] = 1
+        codes = np.clip(np.rint(unit / scales), -127, 127).astype(np.int8)
+        return cls(codes, scales.astype(np.float32))
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        return cls(data["codes"], data["scales"])
+
+    def save(self, path):
+        np.savez(path, codes=self.codes, scales=self.scales)
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + self.scales.nbytes
+
+    def approximate_scores(self, query_vector):
+        """
+        Approximate cosine similarity of the query against every dish, from the int8 codes.
+        """
+        query_norm = LA.norm(query_vector)
+        if query_norm == 0:
+            return np.zeros(len(self.codes), dtype=np.float32)
+        scaled_query = (np.asarray(query_vector) / query_norm * self.scales).astype(np.float32)
+        scores = np.empty(len(self.codes), dtype=np.float32)
+        for start in range(0, len(self.codes), BLOCK_ROWS):
+            block = self.codes[start:start + BLOCK_ROWS]
+            scores[start:start + len(block)] = block.astype(np.float32) @ scaled_query
+        return scores
+
+    def search(self, query_index, matrix_comp, weights, k=10, candidates=100):
+        """
+        Return the k dishes with the highest rating-weighted cosine similarity to the dish at
+        query_index (excluding itself): the int8 scores select `candidates` dishes, which are
+        re-ranked with exact float cosine similarities from matrix_comp.
+
+        Returns:
+            tuple: (indices (np.ndarray) in ranking order, cosine similarity by index (dict),
+            weighted score by index (dict))
+        """
+        return self.search_vector(matrix_comp[query_index], matrix_comp, weights, k, candidates, exclude=query_index)
+
+    def search_vector(self, query_vector, matrix_comp, weights, k=10, candidates=100, exclude=None):
+        """
+        Same as search, for an arbitrary latent query vector (e.g. a folded-in ingredient
+        list). The dish at index exclude, if any, is left out of the results.
+        """
+        weights = np.asarray(weights, dtype=np.float64)
+        query_vector = np.asarray(query_vector, dtype=np.float64)
+
+        approx = self.approximate_scores(query_vector) * weights
+        if exclude is not None:
+            approx[exclude] = -np.inf
+        candidates = min(max(candidates, k), len(approx) - (exclude is not None))
+        shortlist = np.argpartition(-approx, candidates - 1)[:candidates]
+        return exact_rerank(shortlist, query_vector, matrix_comp, weights, k)
+
+
+"""
+Re-scores a shortlist of dishes with exact float cosine similarities and returns the k best.
+Shared by the int8 index and the cascaded search of helpers/cascade.py.
+
+Parameters:
+    shortlist (numpy.ndarray): The candidate dish indices.
+
+    query_vector (numpy.ndarray): The flavor vector of the query dish.
+
+    matrix_comp (numpy.ndarray): The float dish x latent flavor matrix (may be memory-mapped).
+
+    weights (numpy.ndarray): The rating weight of every dish.
+
+    k (int): The number of results.
+
+Returns:
+    tuple: (indices (np.ndarray) in ranking order, cosine similarity by index (dict),
+    weighted score by index (dict))
+"""
+
+def exact_rerank(shortlist, query_vector, matrix_comp, weights, k):
+    # Sorted so that rows of a memory-mapped matrix are read in file order
+    shortlist = np.sort(shortlist)
+    rows = np.asarray(matrix_comp[shortlist], dtype=np.float64)
+    denominators = LA.norm(query_vector) * LA.norm(rows, axis=1)
+    cos = np.divide(rows @ query_vector, denominators, out=np.zeros(len(rows)), where=denominators != 0)
+    weighted = weights[shortlist] * cos
+
+    order = np.argsort(-weighted, kind="stable")[:k]
+    final = shortlist[order]
+    return (final, dict(zip(final.tolist(), cos[order].tolist())),
+            dict(zip(final.tolist(), weighted[order].tolist())))
+
+
+"""
+Returns the exact ranking of top_ten (the k dishes with the highest rating-weighted cosine
+similarity to the dish at query_index, excluding itself) with one vectorized float scan.
+
+Parameters:
+    matrix_comp (numpy.ndarray): The matrix containing the flavor vectors that represents each dish.
+
+    weights (list or numpy.ndarray): The rating weight of every dish (rating_count_weight[2]).
+
+    query_index (int): The row of the query dish.
+
+    k (int, optional): The number of results. Defaults to 10.
+
+Returns:
+    numpy.ndarray: The indices of the k best dishes, best first.
+"""
+
+def exact_top_k(matrix_comp, weights, query_index, k=10):
+    matrix_comp = np.asarray(matrix_comp, dtype=np.float64)
+    query_vector = matrix_comp[query_index]
+    denominators = LA.norm(query_vector) * LA.norm(matrix_comp, axis=1)
+    cos = np.divide(matrix_comp @ query_vector, denominators, out=np.zeros(len(matrix_comp)),
+                    where=denominators != 0)
+    weighted = np.asarray(weights, dtype=np.float64) * cos
+    weighted[query_index] = -np.inf
+    return np.argsort(-weighted, kind="stable")[:k]
+
+
+"""
+Compares an approximate search index (QuantizedIndex, or CascadeIndex from helpers/cascade.py) 
+with the exact ranking over a sample of query dishes.
+
+Parameters:
+    matrix_comp (numpy.ndarray): The float dish x latent flavor matrix.
+
+    weights (list or numpy.ndarray): The rating weight of every dish.
+
+    index (optional): The index to evaluate. An int8 QuantizedIndex is built from matrix_comp when 
+    not given.
+
+    sample (int, optional): The number of query dishes. Defaults to 200.
+
+    candidates (int, optional): The re-rank shortlist size. Defaults to 100.
+
+    seed (int, optional): The seed of the query sample. Defaults to 0.
+
+Returns:
+    dict: recall@10, the fraction of identical top-10 lists, mean query times and the memory of
+    the float matrix and of the index.
+"""
+
+def accuracy_report(matrix_comp, weights, index=None, sample=200, candidates=100, seed=0):
+    index = QuantizedIndex.build(matrix_comp) if index is None else index
+    rng = np.random.default_rng(seed)
+    queries = rng.choice(len(matrix_comp), size=min(sample, len(matrix_comp)), replace=False)
+
+    recall = []
+    identical = 0
+    exact_time = 0.0
+    index_time = 0.0
+    for query_index in queries:
+        start = time.perf_counter()
+        expected = exact_top_k(matrix_comp, weights, query_index)
+        exact_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        found = index.search(query_index, matrix_comp, weights, candidates=candidates)[0]
+        index_time += time.perf_counter() - start
+
+        recall.append(len(set(expected.tolist()) & set(found.tolist())) / len(expected))
+        identical += int(np.array_equal(expected, found))
+
+    return {
+        "queries": len(queries),
+        "candidates": candidates,
+        "recall@10": float(np.mean(recall)),
+        "identical_top10": identical / len(queries),
+        "exact_ms": 1000 * exact_time / len(queries),
+        "index_ms": 1000 * index_time / len(queries),
+        "float_bytes": int(np.asarray(matrix_comp).nbytes),
+        "index_bytes": int(index.nbytes),
+    }
+
+
+if __name__ == "__main__":
+    from .matrix import dish_latentflavors_path
+    from .reviews import load_data
+
+    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    int8_path = os.path.join(base_dir, "data", "dish-latent-flavors-int8.npz")
+    dish_latentflavors = np.load(dish_latentflavors_path)
+
+    if len(sys.argv) == 2 and sys.argv[1] == "build":
+        QuantizedIndex.build(dish_latentflavors).save(int8_path)
+        print(f"Wrote {int8_path}")
+    elif len(sys.argv) == 2 and sys.argv[1] == "report":
+        weights = load_data(install=False)[2]
+        for name, value in accuracy_report(dish_latentflavors, weights).items():
+            print(f"{name:>16}: {value}")
+    else:
+        print("Usage: python -m helpers.quantize build|report")
+        sys.exit(1)
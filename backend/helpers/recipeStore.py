@@ -0,0 +1,115 @@
+import os
+import json
+import threading
+from collections import OrderedDict
+from .metrics import record_cache, span
+
+
+"""
+Recipe detail stores used by top_ten to fetch the rows of its results by RecipeId.
+
+    JSONRecipeStore      reads the recipes JSON file once and indexes it by RecipeId (default)
+    DatabaseRecipeStore  queries the 'recipes' table through MySQLDatabaseHandler, with one
+                         'WHERE RecipeId IN (...)' query per call and a local LRU cache in front
+
+Both return, for a list of RecipeIds, the list of recipe dicts (Name, RecipeId, Description,
+RecipeInstructions, ...) in the same order.
+"""
+
+DETAIL_COLUMNS = ("RecipeId", "Name", "AuthorName", "Description", "RecipeInstructions")
+
+
+class JSONRecipeStore(object):
+
+    def __init__(self, recipes_file):
+        self.recipes_file = recipes_file
+        self._by_id = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._by_id is None:
+                with open(self.recipes_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                self._by_id = {int(recipe["RecipeId"]): recipe for recipe in data}
+        return self._by_id
+
+    def get_recipes(self, recipe_ids):
+        by_id = self._by_id if self._by_id is not None else self._load()
+        return [by_id[int(recipe_id)] for recipe_id in recipe_ids]
+
+
+class DatabaseRecipeStore(object):
+
+    def __init__(self, handler, cache_size = 2048, table = "recipes"):
+        self.handler = handler
+        self.cache_size = cache_size
+        self.table = table
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _cache_get(self, recipe_id):
+        with self._lock:
+            recipe = self._cache.get(recipe_id)
+            if recipe is not None:
+                self._cache.move_to_end(recipe_id)
+        record_cache("recipe_store", recipe is not None)
+        return recipe
+
+    def _cache_put(self, recipe_id, recipe):
+        with self._lock:
+            self._cache[recipe_id] = recipe
+            self._cache.move_to_end(recipe_id)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def get_recipes(self, recipe_ids):
+        recipe_ids = [int(recipe_id) for recipe_id in recipe_ids]
+        found = {}
+        missing = []
+        for recipe_id in recipe_ids:
+            recipe = self._cache_get(recipe_id)
+            if recipe is None:
+                missing.append(recipe_id)
+            else:
+                found[recipe_id] = recipe
+
+        if missing:
+            params = {f"id{i}": recipe_id for i, recipe_id in enumerate(missing)}
+            query = (f"SELECT {', '.join(DETAIL_COLUMNS)} FROM {self.table} "
+                     f"WHERE RecipeId IN ({', '.join(':' + key for key in params)})")
+            with span("recipe_store.query"):
+                rows = self.handler.query_selector(query, params)
+            for row in rows:
+                recipe = dict(zip(DETAIL_COLUMNS, row))
+                found[int(recipe["RecipeId"])] = recipe
+                self._cache_put(int(recipe["RecipeId"]), recipe)
+
+        return [found[recipe_id] for recipe_id in recipe_ids]
+
+
+"""
+Builds the recipe store selected by the RECIPE_STORE environment variable: 'json' (default)
+or 'db'. The database store connects with the MYSQL_* environment variables, falling back
+to the docker-compose credentials.
+
+Parameters:
+    recipes_file (str): The path to the recipes JSON file used by the JSON store.
+
+Returns:
+    JSONRecipeStore or DatabaseRecipeStore
+"""
+
+def recipe_store_from_env(recipes_file):
+    if os.environ.get("RECIPE_STORE", "json") != "db":
+        return JSONRecipeStore(recipes_file)
+
+    from .MySQLDatabaseHandler import MySQLDatabaseHandler
+    handler = MySQLDatabaseHandler(
+        os.environ.get("MYSQL_USER", "admin"),
+        os.environ.get("MYSQL_USER_PASSWORD", "admin"),
+        int(os.environ.get("MYSQL_PORT", 3306)),
+        os.environ.get("MYSQL_DATABASE", "kardashiandb"),
+        os.environ.get("MYSQL_HOST", "localhost"),
+    )
+    return DatabaseRecipeStore(handler, int(os.environ.get("RECIPE_CACHE_SIZE", 2048)))
@@ -0,0 +1,298 @@
+import os
+import sys
+import json
+import time
+import numpy as np
+from numpy import linalg as LA
+from collections import Counter
+
+
+"""
+Ranking-equivalence and recall regression harness.
+
+Golden rankings are recorded once from the original implementation: the per-dish loop of the
+first top_ten for a sample of dishes, and cossimNameMatch's TfidfVectorizer for a sample of name
+queries. Every engine, including the current top_ten and name index, is then run over the same
+queries behind a common interface and compared with them:
+
+    python -m helpers.regression record [golden.json]              record the golden rankings
+    python -m helpers.regression compare [golden.json] [engine...]  compare engines (default: all)
+
+An engine has a kind ('dish' or 'name') and a rank(query) method returning the ranked items
+(RecipeIds for dishes, names for name queries) and their scores. The report gives, per engine,
+recall@10, the fraction of identical top-10 lists, the Spearman rank correlation over the items
+both rankings share, the largest score delta on those items and the query latency.
+"""
+
+base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+golden_path = os.path.join(base_dir, "data", "golden-rankings.json")
+
+
+class TopTenEngine(object):
+    """
+    The full top_ten, with the given search index (None: the exact float scan).
+    """
+    kind = "dish"
+
+    def __init__(self, artifacts, search_index=None):
+        self.artifacts = artifacts
+        self.search_index = search_index
+
+    def rank(self, query):
+        from .matrix import top_ten
+        a = self.artifacts
+        rows = top_ten(query, a.name_ing_data, a.dish_latentflavors, a.recipe_store, a.rating_count_weight,
+                       a.lat_dims, self.search_index)
+        return [int(row[3]) for row in rows], [float(row[2]) for row in rows]
+
+    def close(self):
+        pass
+
+
+class BaselineTopTenEngine(TopTenEngine):
+    """
+    The ranking of the original top_ten: one cosine similarity per dish in a Python loop, then the
+    eleven best scores without the query dish. The golden dish rankings come from it, so that the
+    rewritten scans are checked against the code they replaced rather than against themselves.
+    """
+
+    def rank(self, query):
+        a = self.artifacts
+        index = a.name_ing_data[0].index(query.lower())
+        vect = a.dish_latentflavors[index, :]
+        vect_norm = LA.norm(vect)
+        dish_sim = []
+        for row, weight in zip(a.dish_latentflavors, a.rating_count_weight[2]):
+            if (vect_norm * LA.norm(row)) != 0:
+                dish_sim.append(weight * (np.dot(vect, row) / (vect_norm * LA.norm(row))))
+            else:
+                dish_sim.append(0)
+
+        ordered = np.argsort(np.array(dish_sim))[-11:][::-1]
+        final = np.delete(ordered, np.where(ordered == index))[:10]
+        return [int(a.name_ing_data[1][i]) for i in final], [float(dish_sim[i]) for i in final]
+
+
+class SearchIndexEngine(TopTenEngine):
+    """
+    Only the ranking stage of a search index (QuantizedIndex, CascadeIndex, ShardedIndex), without
+    the recipe details of top_ten.
+    """
+
+    def rank(self, query):
+        a = self.artifacts
+        index = a.name_ing_data[0].index(query.lower())
+        final, _, weighted = self.search_index.search(index, a.dish_latentflavors, a.rating_count_weight[2])
+        return [int(a.name_ing_data[1][i]) for i in final], [float(weighted[i]) for i in final]
+
+    def close(self):
+        if hasattr(self.search_index, "close"):
+            self.search_index.close()
+
+
+class NameIndexEngine(object):
+    """
+    cossimNameMatch on the persisted NameIndex.
+    """
+    kind = "name"
+
+    def __init__(self, artifacts):
+        self.artifacts = artifacts
+
+    def rank(self, query):
+        from .cossimNameMatch import match_scores
+        results = match_scores(query, self.artifacts.name_index)
+        return [self.artifacts.names[i] for i, _ in results], [float(score) for _, score in results]
+
+    def close(self):
+        pass
+
+
+class SklearnNameEngine(NameIndexEngine):
+    """
+    The original cossimNameMatch: a TfidfVectorizer refitted over the names.
+    """
+
+    def __init__(self, artifacts):
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        super().__init__(artifacts)
+        self.vectorizer = TfidfVectorizer().fit(artifacts.names)
+        self.tfidf_matrix = self.vectorizer.transform(artifacts.names)
+
+    def rank(self, query):
+        cosine_sim = self.tfidf_matrix.dot(self.vectorizer.transform([query]).T).toarray().ravel()
+        filtered = [(index, score) for index, score in enumerate(cosine_sim) if score > 0.3]
+        results = sorted(filtered, key=lambda x: x[1], reverse=True)[:10]
+        return [self.artifacts.names[i] for i, _ in results], [float(score) for _, score in results]
+
+
+def _int8(artifacts):
+    from .quantize import QuantizedIndex
+    return SearchIndexEngine(artifacts, QuantizedIndex.build(artifacts.dish_latentflavors))
+
+
+def _cascade(artifacts):
+    from .cascade import CascadeIndex
+    return SearchIndexEngine(artifacts, CascadeIndex(artifacts.dish_latentflavors, artifacts.latent_importance))
+
+
+def _sharded(artifacts):
+    from .shards import ShardedIndex
+    from .artifacts import read_manifest, resolve_bundle
+    matrix_path = read_manifest(resolve_bundle())[1]["dish_latentflavors"]
+    index = ShardedIndex.start_local(matrix_path, artifacts.rating_count_weight[2], int(os.environ.get("SHARDS", 0)) or None)
+    return SearchIndexEngine(artifacts, index)
+
+
+# Engine name -> factory taking the loaded ArtifactSet
+ENGINES = {
+    "baseline": BaselineTopTenEngine,
+    "top_ten": lambda artifacts: TopTenEngine(artifacts, artifacts.search_index),
+    "exact": lambda artifacts: TopTenEngine(artifacts),
+    "int8": _int8,
+    "cascade": _cascade,
+    "sharded": _sharded,
+    "name_index": NameIndexEngine,
+    "sklearn_names": SklearnNameEngine,
+}
+
+
+"""
+Samples the queries and records the rankings of the original implementation (BaselineTopTenEngine
+and SklearnNameEngine).
+
+Parameters:
+    artifacts (ArtifactSet): The loaded data.
+
+    dishes (int, optional): The number of dish queries. Defaults to 200.
+
+    queries (int, optional): The number of name queries. Defaults to 200.
+
+    seed (int, optional): The seed of the samples. Defaults to 0.
+
+Returns:
+    dict: The golden rankings: {"version", "dish": [...], "name": [...]}, each entry holding the
+    query, the ranked items and their scores.
+"""
+
+def record_golden(artifacts, dishes=200, queries=200, seed=0):
+    rng = np.random.default_rng(seed)
+    dish_names = artifacts.name_ing_data[0]
+    # Duplicate names resolve to their first dish in top_ten, keep one query per name
+    dish_queries = sorted({dish_names[i] for i in rng.choice(len(dish_names), size=min(dishes, len(dish_names)),
+                                                              replace=False)})
+
+    name_queries = []
+    for i in rng.choice(len(artifacts.names), size=min(queries, len(artifacts.names)), replace=False):
+        words = artifacts.names[i].split()
+        # Full names, single words and word pairs, as typed into the search box
+        name_queries.append([artifacts.names[i], words[0] if words else "", " ".join(words[:2])][len(name_queries) % 3])
+
+    golden = {"version": artifacts.version, "dish": [], "name": []}
+    for kind, engine, sample in (("dish", BaselineTopTenEngine(artifacts), dish_queries),
+                                 ("name", SklearnNameEngine(artifacts), name_queries)):
+        for query in sample:
+            items, scores = engine.rank(query)
+            golden[kind].append({"query": query, "items": items, "scores": scores})
+    return golden
+
+
+def _keyed(items):
+    # Repeated items (e.g. recipes sharing a name) are told apart by their occurrence number
+    seen = Counter()
+    keyed = []
+    for item in items:
+        keyed.append((item, seen[item]))
+        seen[item] += 1
+    return keyed
+
+
+def _spearman(expected, found):
+    common = [item for item in expected if item in set(found)]
+    if len(common) < 2:
+        return 1.0 if len(common) == len(expected) == len(found) else 0.0
+    expected_rank = np.argsort(np.argsort([expected.index(item) for item in common]))
+    found_rank = np.argsort(np.argsort([found.index(item) for item in common]))
+    n = len(common)
+    return float(1 - 6 * np.sum((expected_rank - found_rank) ** 2) / (n * (n * n - 1)))
+
+
+"""
+Runs one engine over the golden queries of its kind and compares the rankings.
+
+Parameters:
+    engine: An engine (see ENGINES).
+
+    golden (dict): The golden rankings from record_golden.
+
+Returns:
+    dict: queries, recall@10, identical_top10, spearman, max_score_delta, mean_ms and p95_ms.
+"""
+
+def compare_engine(engine, golden):
+    recall, identical, spearman, latencies = [], 0, [], []
+    max_delta = 0.0
+    for entry in golden[engine.kind]:
+        start = time.perf_counter()
+        items, scores = engine.rank(entry["query"])
+        latencies.append(time.perf_counter() - start)
+
+        expected, found = _keyed(entry["items"]), _keyed(items)
+        if expected:
+            recall.append(len(set(expected) & set(found)) / len(expected))
+        identical += int(expected == found)
+        spearman.append(_spearman(expected, found))
+        found_scores = dict(zip(found, scores))
+        for item, score in zip(expected, entry["scores"]):
+            if item in found_scores:
+                max_delta = max(max_delta, abs(found_scores[item] - score))
+
+    latencies = np.array(latencies) * 1000
+    count = len(golden[engine.kind])
+    return {
+        "queries": count,
+        "recall@10": float(np.mean(recall)) if recall else 1.0,
+        "identical_top10": identical / count if count else 1.0,
+        "spearman": float(np.mean(spearman)) if spearman else 1.0,
+        "max_score_delta": max_delta,
+        "mean_ms": float(latencies.mean()) if count else 0.0,
+        "p95_ms": float(np.percentile(latencies, 95)) if count else 0.0,
+    }
+
+
+if __name__ == "__main__":
+    from .artifacts import holder
+
+    if len(sys.argv) < 2 or sys.argv[1] not in ("record", "compare"):
+        print("Usage: python -m helpers.regression record [golden.json]")
+        print("       python -m helpers.regression compare [golden.json] [engine ...]")
+        print(f"Engines: {', '.join(ENGINES)}")
+        sys.exit(1)
+
+    args = sys.argv[2:]
+    path = args.pop(0) if args and args[0].endswith(".json") else golden_path
+    artifacts = holder.load()
+
+    if sys.argv[1] == "record":
+        golden = record_golden(artifacts)
+        with open(path, 'w') as file:
+            json.dump(golden, file)
+        print(f"Wrote {len(golden['dish'])} dish and {len(golden['name'])} name rankings to {path}")
+        sys.exit(0)
+
+    with open(path, 'r') as file:
+        golden = json.load(file)
+    if golden["version"] != artifacts.version:
+        print(f"Warning: golden rankings recorded on data {golden['version']}, comparing on {artifacts.version}")
+
+    print(f"{'engine':>14} {'kind':>5} {'recall@10':>10} {'identical':>10} {'spearman':>9} "
+          f"{'max delta':>10} {'mean ms':>9} {'p95 ms':>9}")
+    for name in args or ENGINES:
+        engine = ENGINES[name](artifacts)
+        try:
+            report = compare_engine(engine, golden)
+        finally:
+            engine.close()
+        print(f"{name:>14} {engine.kind:>5} {report['recall@10']:>10.4f} {report['identical_top10']:>10.3f} "
+              f"{report['spearman']:>9.4f} {report['max_score_delta']:>10.2e} {report['mean_ms']:>9.3f} "
+              f"{report['p95_ms']:>9.3f}")
@@ -1,11 +1,16 @@
 import ast
 import os
 import json
+import threading
 from collections import defaultdict
+import numpy as np
+from . import metrics
+from .startup import stage
 
 current_script_dir = os.path.dirname(os.path.abspath(__file__))
 recipe_path = os.path.normpath(os.path.join(current_script_dir, '..', 'data', 'random-recipe.json'))
 reviews_path = os.path.normpath(os.path.join(current_script_dir, '..', 'data', 'reviews.json'))
+review_log_path = os.path.normpath(os.path.join(current_script_dir, '..', 'data', 'reviews.log'))
 dish_id_ingr_path = os.path.normpath(os.path.join(current_script_dir, '..', 'data', 'dish_id_ingr.txt'))
 
 
@@ -35,27 +40,42 @@ def better_reviews(recipe_data):
                 rating = review['AggregatedRating']
                 count = review['ReviewCount']
 
-            if count == 0:
-                count_weight = 0.005
-            elif count <= 5:
-                count_weight = 0.01
-            elif count < 10:
-                count_weight = 0.015
-            else:
-                count_weight = 0.02
-
-            if rating is None:
-                weight = 0.25 + count_weight + 1 
-            elif rating < 3:
-                weight = (0.5 + (rating - 1) * 0.25) + count_weight + 1  
-            else:
-                weight = (1.0 + (rating - 3) * 0.25) + count_weight + 1  
-
+            weight = review_weight(rating, count)
             final_dict[recipe_id] = {'average_rating': rating, 'review_count': count, 'weight': weight}
 
     return final_dict
 
-testweight = better_reviews(recipe_path)
+
+"""
+The ranking weight of a recipe from its average rating and review count, as used by 
+better_reviews() and the incremental ReviewAggregator.
+
+Parameters:
+    rating (float or None): The average rating (1-5), None when the recipe has no rating.
+
+    count (int): The number of reviews.
+
+Returns:
+    float: The weight the cosine similarity of the recipe is multiplied by.
+"""
+
+def review_weight(rating, count):
+    if count == 0:
+        count_weight = 0.005
+    elif count <= 5:
+        count_weight = 0.01
+    elif count < 10:
+        count_weight = 0.015
+    else:
+        count_weight = 0.02
+
+    if rating is None:
+        weight = 0.25 + count_weight + 1 
+    elif rating < 3:
+        weight = (0.5 + (rating - 1) * 0.25) + count_weight + 1  
+    else:
+        weight = (1.0 + (rating - 3) * 0.25) + count_weight + 1  
+    return weight
 
 
 """
@@ -97,8 +117,6 @@ def construct_reviews(recipe_data, review_data):
     
     return big_dict
 
-ditct = construct_reviews(recipe_path,reviews_path)
-
 
 """
 A weighting system for the reviews, updates the dict values to that weighing value
@@ -158,11 +176,149 @@ def rerank(id_rating_dict, id_ordered):
     return(rating_count_weight)
 
 
-with open(dish_id_ingr_path, 'r') as file:
-    content = file.read()
-    input = ast.literal_eval(content)
-name_ing_data = input
-rating_count_weight = rerank(testweight,name_ing_data[1])
+# Populated by load_data()
+rating_count_weight = None
+
+
+"""
+Computes the review weights used by the ranking and stores them in the module global
+'rating_count_weight'. Only the recipes file is read; construct_reviews() over reviews.json
+is not needed for the weights and is not run during init.
+
+Parameters:
+    name_ing_data (tuple, optional): The (dish names, dish IDs, ingredients) tuple already
+    loaded by helpers.matrix. Read from dish_id_ingr.txt when not given.
+
+    paths (dict, optional): Artifact paths by logical name ('recipes', 'dish_id_ingr') from a
+    versioned bundle. Missing names use the default files in the data directory.
+
+    install (bool, optional): Whether to also bind the weights to the module global.
+    Defaults to True.
+
+Returns:
+    rating_count_weight (list of lists): ratings, counts and weights ordered like the dish IDs.
+"""
+
+def load_data(name_ing_data=None, paths=None, install=True):
+    global rating_count_weight
+    paths = paths or {}
+
+    if name_ing_data is None:
+        with open(paths.get("dish_id_ingr", dish_id_ingr_path), 'r') as file:
+            name_ing_data = ast.literal_eval(file.read())
+
+    with stage("reviews: random-recipe.json weights"):
+        loaded = rerank(better_reviews(paths.get("recipes", recipe_path)), name_ing_data[1])
+
+    if install:
+        rating_count_weight = loaded
+    return loaded
+
+
+"""
+Appends new reviews to the append-only review log read by ReviewAggregator, one JSON object
+per line.
+
+Parameters:
+    reviews (list of dict): The reviews, each with a 'RecipeId' and a 'Rating' (1-5).
+
+    log_path (str, optional): The review log. Defaults to data/reviews.log.
+"""
+
+def append_reviews(reviews, log_path=review_log_path):
+    lines = "".join(json.dumps({"RecipeId": int(review["RecipeId"]), "Rating": float(review["Rating"])}) + "\n"
+                    for review in reviews)
+    # One write call per batch, so concurrent writers do not interleave within a line
+    with open(log_path, 'a', encoding='utf-8') as file:
+        file.write(lines)
+
+
+class ReviewAggregator(object):
+    """
+    Keeps a running rating sum and review count per dish and folds review batches from the
+    append-only log into them, so the ranking weights follow new reviews without re-reading
+    the recipes file. Each batch costs O(batch) for the aggregation plus one copy of the
+    rating, count and weight vectors, which are returned as new read-only objects for an
+    atomic swap (the vectors being served are never modified).
+
+    The sums start from AggregatedRating x ReviewCount of the loaded weights. The log is read
+    from the beginning for every new aggregator, so it should only hold reviews newer than
+    the data the weights were computed from.
+    """
+
+    def __init__(self, dish_ids, rating_count_weight, log_path=review_log_path):
+        self.log_path = log_path
+        self.offset = 0
+        self.index = {int(dish_id): row for row, dish_id in enumerate(dish_ids)}
+        ratings, counts, _ = rating_count_weight
+        self.counts = np.array(counts, dtype=np.int64)
+        self.sums = np.array([rating or 0.0 for rating in ratings], dtype=np.float64) * self.counts
+        self.rating_count_weight = rating_count_weight
+        self._lock = threading.Lock()
+
+    def read_batch(self):
+        """
+        Read the reviews appended to the log since the last call. A trailing line without its
+        newline is still being written and is left for the next call.
+        """
+        if not os.path.exists(self.log_path):
+            return []
+        with open(self.log_path, 'rb') as file:
+            file.seek(self.offset)
+            data = file.read()
+        end = data.rfind(b"\n") + 1
+        self.offset += end
+
+        batch = []
+        for line in data[:end].splitlines():
+            try:
+                review = json.loads(line)
+                batch.append((int(review["RecipeId"]), float(review["Rating"])))
+            except (ValueError, KeyError, TypeError):
+                metrics.incr("reviews_skipped_total", "malformed")
+        return batch
+
+    def apply(self, batch):
+        """
+        Fold a batch of (RecipeId, rating) pairs into the running sums.
+
+        Returns:
+            rating_count_weight (tuple): New ratings, counts and weights vectors, or None when
+            the batch touched no known dish.
+        """
+        with self._lock:
+            touched = set()
+            applied = 0
+            for recipe_id, rating in batch:
+                row = self.index.get(recipe_id)
+                if row is None:
+                    metrics.incr("reviews_skipped_total", "unknown_recipe")
+                    continue
+                self.sums[row] += rating
+                self.counts[row] += 1
+                touched.add(row)
+                applied += 1
+            if not touched:
+                return None
+
+            ratings, counts, weights = self.rating_count_weight
+            ratings, counts, weights = list(ratings), list(counts), np.array(weights, dtype=np.float64)
+            for row in touched:
+                count = int(self.counts[row])
+                ratings[row] = float(self.sums[row] / count)
+                counts[row] = count
+                weights[row] = review_weight(ratings[row], count)
+            weights.flags.writeable = False
+
+            self.rating_count_weight = (tuple(ratings), tuple(counts), weights)
+            metrics.incr("reviews_applied_total", amount=applied)
+            return self.rating_count_weight
+
+    def poll(self):
+        """
+        Apply whatever was appended to the log. Returns the new vectors, or None.
+        """
+        return self.apply(self.read_batch())
 
 
 """
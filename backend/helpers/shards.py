@@ -0,0 +1,268 @@
+import os
+import sys
+import heapq
+import secrets
+import threading
+import multiprocessing
+from multiprocessing.connection import Listener, Client
+import numpy as np
+from numpy import linalg as LA
+
+
+"""
+Sharded scatter-gather similarity search.
+
+The rows of the dish x latent flavor matrix are split into contiguous shards, each served by
+its own process. A shard memory-maps the .npy file and keeps only its slice (and its slice of
+the rating weights) resident. A query vector is sent to every shard, each returns its local
+top-k by rating-weighted cosine similarity, and the coordinator merges them into the global
+top-k. The result is exact, so it plugs into top_ten as a search_index.
+
+Shards talk over multiprocessing.connection (TCP with an auth key), so the same protocol works
+for local processes and for shards on other machines:
+
+    python -m helpers.shards serve <start> <end> <port> [host]    serve rows [start, end) on a node
+
+and point the app at them with SHARD_ADDRESSES=host1:port,host2:port (SCORING=sharded). The
+connections unpickle what they receive, so remote shards and their coordinator must share a
+secret SHARD_AUTHKEY and neither starts without one; shards listen on 127.0.0.1 unless another
+host is given. Local shards started by the app get a random key of their own.
+"""
+
+
+"""
+Returns the auth key shared by remote shards and their coordinator, from SHARD_AUTHKEY.
+
+Raises:
+    RuntimeError: When SHARD_AUTHKEY is not set.
+"""
+
+def shard_authkey():
+    key = os.environ.get("SHARD_AUTHKEY")
+    if not key:
+        raise RuntimeError("SHARD_AUTHKEY must be set to a shared secret for remote shards")
+    return key.encode()
+
+
+def _local_top_k(unit_rows, weights, start, query_unit, exclude, k):
+    cos = unit_rows @ query_unit
+    weighted = weights * cos
+    local_exclude = exclude - start
+    if 0 <= local_exclude < len(weighted):
+        weighted[local_exclude] = -np.inf
+    k = min(k, len(weighted))
+    if k == 0:
+        return []
+    best = np.argpartition(-weighted, k - 1)[:k]
+    return [(float(weighted[i]), int(start + i), float(cos[i])) for i in best if weighted[i] != -np.inf]
+
+
+def _handle(conn, shard):
+    try:
+        while True:
+            message = conn.recv()
+            if message[0] == "search":
+                _, query_unit, exclude, k = message
+                conn.send(_local_top_k(shard["unit"], shard["weights"], shard["start"], query_unit, exclude, k))
+            elif message[0] == "range":
+                conn.send((shard["start"], shard["end"]))
+            elif message[0] == "weights":
+                # Reference flip, in-flight searches keep the old array
+                shard["weights"] = np.asarray(message[1], dtype=np.float64)
+                conn.send(True)
+            else:
+                break
+    except (EOFError, OSError):
+        pass
+    finally:
+        conn.close()
+
+
+"""
+Serves one shard until the process is terminated: rows [start, end) of the matrix file and the
+matching rating weights. One thread per coordinator connection; the matrix product releases
+the GIL, so concurrent queries overlap.
+
+Parameters:
+    address (tuple): The (host, port) to listen on; port 0 picks a free port.
+
+    matrix_path (str): The path to the dish x latent flavor .npy file.
+
+    start (int), end (int): The row range of the shard.
+
+    weights (numpy.ndarray): The rating weights of the rows of the shard.
+
+    authkey (bytes): The key coordinators must authenticate with.
+
+    ready (Connection, optional): Receives the bound address once the shard is listening.
+"""
+
+def serve_shard(address, matrix_path, start, end, weights, authkey, ready=None):
+    rows = np.asarray(np.load(matrix_path, mmap_mode='r')[start:end], dtype=np.float64)
+    norms = LA.norm(rows, axis=1)
+    shard = {
+        "start": start,
+        "end": end,
+        # Zero rows stay zero, which gives them a cosine similarity of 0 as in top_ten
+        "unit": rows / np.where(norms == 0, 1, norms)[:, None],
+        "weights": np.asarray(weights, dtype=np.float64),
+    }
+    listener = Listener(address, backlog=128, authkey=authkey)
+    if ready is not None:
+        ready.send(listener.address)
+        ready.close()
+    while True:
+        try:
+            conn = listener.accept()
+        except (multiprocessing.AuthenticationError, EOFError, OSError):
+            # A client with the wrong key (or one that hung up during the handshake) is dropped
+            continue
+        threading.Thread(target=_handle, args=(conn, shard), daemon=True).start()
+
+
+class ShardedIndex(object):
+    """
+    Coordinator: scatters each query to all shards and merges their local top-k lists. Every
+    thread keeps its own connection to every shard, so concurrent requests do not block on
+    each other.
+    """
+
+    def __init__(self, addresses, authkey, processes=None):
+        self.addresses = list(addresses)
+        self.authkey = authkey
+        self.processes = processes or []
+        # Forked processes (gunicorn workers with preload_app) inherit the index but not the shards
+        self.owner = os.getpid()
+        self._local = threading.local()
+        self._ranges = None
+
+    @classmethod
+    def start_local(cls, matrix_path, weights, n_shards=None):
+        """
+        Start n_shards shard processes on this machine (default: one per CPU), listening on
+        127.0.0.1 with a random auth key known only to this coordinator.
+        """
+        n_rows = np.load(matrix_path, mmap_mode='r').shape[0]
+        n_shards = n_shards or os.cpu_count() or 1
+        bounds = np.linspace(0, n_rows, n_shards + 1).astype(int)
+        weights = np.asarray(weights, dtype=np.float64)
+        authkey = secrets.token_bytes(32)
+
+        addresses, processes = [], []
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            receiver, sender = multiprocessing.Pipe(duplex=False)
+            process = multiprocessing.Process(
+                target=serve_shard,
+                args=(("127.0.0.1", 0), matrix_path, int(start), int(end), weights[start:end], authkey, sender),
+                daemon=True)
+            process.start()
+            addresses.append(receiver.recv())
+            processes.append(process)
+        return cls(addresses, authkey, processes)
+
+    def _connections(self):
+        connections = getattr(self._local, "connections", None)
+        if connections is None:
+            connections = self._local.connections = [Client(address, authkey=self.authkey) for address in self.addresses]
+        return connections
+
+    def ranges(self):
+        """
+        The (start, end) row range of every shard, as reported by the shards themselves.
+        """
+        if self._ranges is None:
+            ranges = []
+            for conn in self._connections():
+                conn.send(("range",))
+                ranges.append(tuple(conn.recv()))
+            self._ranges = ranges
+        return self._ranges
+
+    def search(self, query_index, matrix_comp, weights=None, k=10, candidates=None):
+        """
+        Exact top-k by rating-weighted cosine similarity to the dish at query_index (excluding
+        itself). The weights live in the shards; the argument is accepted for compatibility with
+        the other search indices. Same return value as QuantizedIndex.search.
+        """
+        return self.search_vector(matrix_comp[query_index], matrix_comp, weights, k, exclude=query_index)
+
+    def search_vector(self, query_vector, matrix_comp=None, weights=None, k=10, candidates=None, exclude=None):
+        """
+        Same as search, for an arbitrary latent query vector. The dish at index exclude, if
+        any, is left out of the results.
+        """
+        query_vector = np.asarray(query_vector, dtype=np.float64)
+        query_norm = LA.norm(query_vector)
+        query_unit = query_vector / query_norm if query_norm != 0 else query_vector
+        # -1 lies outside every shard's row range
+        exclude = -1 if exclude is None else int(exclude)
+
+        connections = self._connections()
+        try:
+            for conn in connections:
+                conn.send(("search", query_unit, exclude, k))
+            partials = [conn.recv() for conn in connections]
+        except (EOFError, OSError):
+            # Drop this thread's connections so the next query reconnects
+            self._local.connections = None
+            raise
+
+        merged = heapq.nlargest(k, (hit for partial in partials for hit in partial), key=lambda hit: hit[0])
+        final = np.array([index for _, index, _ in merged], dtype=int)
+        return (final, {index: cos for _, index, cos in merged},
+                {index: weighted for weighted, index, _ in merged})
+
+    def update_weights(self, weights):
+        """
+        Push a new weight vector to the shards, each getting the slice of its own row range.
+        """
+        weights = np.asarray(weights, dtype=np.float64)
+        ranges = self.ranges()
+        if any(end > len(weights) for _, end in ranges):
+            raise ValueError(f"{len(weights)} weights do not cover the shard ranges {ranges}")
+        for conn, (start, end) in zip(self._connections(), ranges):
+            conn.send(("weights", weights[start:end]))
+            conn.recv()
+
+    def close(self):
+        """
+        Stop the shard processes started by start_local. Remote shards keep running, and so do
+        local shards when called in a process forked from the one that started them: the parent
+        and the other forked processes still query them.
+        """
+        if os.getpid() != self.owner:
+            return
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            process.join(5)
+
+
+"""
+Builds the coordinator configured by the environment: SHARD_ADDRESSES=host:port,... connects
+to running shards, otherwise SHARDS (default: one per CPU) local shard processes are started.
+"""
+
+def sharded_index_from_env(matrix_path, weights):
+    if os.environ.get("SHARD_ADDRESSES"):
+        addresses = []
+        for address in os.environ["SHARD_ADDRESSES"].split(","):
+            host, port = address.rsplit(":", 1)
+            addresses.append((host, int(port)))
+        return ShardedIndex(addresses, shard_authkey())
+    return ShardedIndex.start_local(matrix_path, weights, int(os.environ.get("SHARDS", 0)) or None)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (5, 6) or sys.argv[1] != "serve":
+        print("Usage: SHARD_AUTHKEY=<secret> python -m helpers.shards serve <start> <end> <port> [host]")
+        sys.exit(1)
+    from .matrix import dish_latentflavors_path
+    from .reviews import load_data
+
+    authkey = shard_authkey()
+    start, end, port = int(sys.argv[2]), int(sys.argv[3]), int(sys.argv[4])
+    host = sys.argv[5] if len(sys.argv) == 6 else "127.0.0.1"
+    weights = np.asarray(load_data(install=False)[2], dtype=np.float64)[start:end]
+    print(f"Serving rows [{start}, {end}) on {host}:{port}")
+    serve_shard((host, port), dish_latentflavors_path, start, end, weights, authkey)
@@ -0,0 +1,88 @@
+import time
+import threading
+from concurrent.futures import Future
+from . import metrics
+
+
+"""
+Single-flight request coalescing: while a computation for a key is running, identical calls
+wait for its result instead of starting their own. Only the locking primitives of the
+threading module are used, so it works under threaded servers and, once monkey-patched,
+under gevent.
+
+Example:
+    similar_dishes = SingleFlight("top_ten")
+    result = similar_dishes.do(("pulled pork", version), lambda: top_ten(...))
+"""
+
+
+class SingleFlight(object):
+
+    def __init__(self, name, linger=0.0):
+        self.name = name
+        # Seconds a finished computation stays available to wait(), for callers that timed out just before it finished
+        self.linger = linger
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._finished = {}
+
+    def do(self, key, fn, timeout=None):
+        """
+        Return fn() for the first caller of a key; concurrent callers with the same key get the
+        same result (or exception) once it is ready. The result is shared, so it must not be
+        mutated by callers. Callers that wait longer than timeout seconds get a
+        concurrent.futures.TimeoutError; the computation itself keeps running. With a timeout
+        the first caller runs fn on a thread of its own, so the timeout applies to it as well.
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+
+        if not leader:
+            # A computation saved
+            metrics.incr("singleflight_coalesced_total", self.name)
+            return future.result(timeout)
+
+        metrics.incr("singleflight_computed_total", self.name)
+        if timeout is None:
+            self._run(key, fn, future)
+            return future.result()
+        threading.Thread(target=self._run, args=(key, fn, future), daemon=True).start()
+        return future.result(timeout)
+
+    def _run(self, key, fn, future):
+        try:
+            future.set_result(fn())
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                del self._calls[key]
+                if self.linger > 0:
+                    now = time.monotonic()
+                    self._finished = {k: (f, expiry) for k, (f, expiry) in self._finished.items() if expiry > now}
+                    self._finished[key] = (future, now + self.linger)
+
+    def wait(self, key, timeout=None):
+        """
+        Return the result of the computation running for a key, or of one that finished less
+        than linger seconds ago; None when there is neither. Unlike do() it never starts a
+        computation. Raises concurrent.futures.TimeoutError when the computation does not finish
+        within timeout seconds.
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            if future is None:
+                future, expiry = self._finished.get(key, (None, 0))
+                if expiry <= time.monotonic():
+                    future = None
+        if future is None:
+            return None
+        metrics.incr("singleflight_coalesced_total", self.name)
+        return future.result(timeout)
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
@@ -0,0 +1,108 @@
+import os
+import sys
+import time
+import builtins
+from contextlib import contextmanager
+
+
+"""
+Startup report mode. Set STARTUP_REPORT=1 (or run `python app.py --startup-report`) to get
+a breakdown of where cold start time goes: the import time of every module imported for
+the first time and the duration of every stage of the data init phase.
+
+This module only uses the standard library so it can be enabled before anything heavy
+is imported.
+"""
+
+ENABLED = os.environ.get("STARTUP_REPORT", "") not in ("", "0") or "--startup-report" in sys.argv
+
+_process_start = time.perf_counter()
+_imports = []
+_stages = []
+_original_import = builtins.__import__
+_import_depth = [0]
+
+
+def _profiling_import(name, globals=None, locals=None, fromlist=(), level=0):
+    if level != 0 or name in sys.modules:
+        return _original_import(name, globals, locals, fromlist, level)
+    depth = _import_depth[0]
+    _import_depth[0] += 1
+    start = time.perf_counter()
+    try:
+        return _original_import(name, globals, locals, fromlist, level)
+    finally:
+        _import_depth[0] -= 1
+        _imports.append((depth, name, time.perf_counter() - start))
+
+
+"""
+Starts recording the import time of every module imported from now on. Does nothing
+unless the startup report mode is enabled.
+"""
+
+def profile_imports():
+    if ENABLED:
+        builtins.__import__ = _profiling_import
+
+
+"""
+Context manager timing one stage (one artifact load) of the init phase. Records nothing
+unless the startup report mode is enabled: every reload runs through the stages again, and
+long-running workers would keep the timings forever.
+
+Parameters:
+    name (str): The name of the stage, e.g. 'load dish-latent-flavors-matrix.npy'.
+"""
+
+@contextmanager
+def stage(name):
+    if not ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _stages.append((name, time.perf_counter() - start))
+
+
+"""
+Returns the startup report as text: top-level imports sorted by cumulative time, followed
+by the init stages in the order they ran.
+
+Parameters:
+    limit (int, optional): The number of imports listed. Defaults to 25.
+
+Returns:
+    str: The report.
+"""
+
+def report(limit=25):
+    lines = [f"Startup report (pid {os.getpid()})", "", "Imports (cumulative seconds, top level only):"]
+    top_level = [(elapsed, name) for depth, name, elapsed in _imports if depth == 0]
+    for elapsed, name in sorted(top_level, reverse=True)[:limit]:
+        lines.append(f"  {elapsed:8.3f}  {name}")
+    lines.append(f"  {sum(e for e, _ in top_level):8.3f}  total ({len(_imports)} modules)")
+
+    lines.append("")
+    lines.append("Init stages:")
+    for name, elapsed in _stages:
+        lines.append(f"  {elapsed:8.3f}  {name}")
+    lines.append(f"  {sum(e for _, e in _stages):8.3f}  total")
+
+    lines.append("")
+    lines.append(f"Time since startup module import: {time.perf_counter() - _process_start:.3f}s")
+    return "\n".join(lines)
+
+
+"""
+Stops import profiling and prints the report. Does nothing unless the startup report mode
+is enabled.
+"""
+
+def finish():
+    if not ENABLED:
+        return
+    builtins.__import__ = _original_import
+    print(report(), file=sys.stderr)
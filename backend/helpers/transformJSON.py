@@ -1,27 +1,283 @@
+import os
 import json
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 
-with open('../data/reduced-recipe.json', 'r') as file:
-    recipes = json.load(file)
 
-transformed_data = {"recipes": [], "reviews": []}
+"""
+Streaming export of the recipe dump into the rows of the recipes and reviews tables.
 
-for recipe in recipes:
-    recipe_info = {
-        "RecipeId": recipe["RecipeId"],
-        "Name": recipe["Name"],
-        "AuthorName": recipe["AuthorName"],
-        "Description": recipe["Description"],
-        "RecipeInstructions": recipe["RecipeInstructions"],
-    }
-    review_info = {
-        "RecipeId": recipe["RecipeId"],
-        "AggregatedRating": recipe["AggregatedRating"],
+The dump (a JSON array of recipes) is decoded one record at a time, so memory does not grow with
+its size. Records are cut into chunks of --chunk-size, and each chunk is written as two compact
+NDJSON files (one JSON row per line) by a pool of worker processes:
+
+    <out_dir>/recipes-00000.ndjson    {"RecipeId": ..., "Name": ..., "AuthorName": ..., ...}
+    <out_dir>/reviews-00000.ndjson    {"RecipeId": ..., "AggregatedRating": ...}
+    <out_dir>/manifest.json           the chunk list, written once every chunk is done
+
+Chunk files are written to a temporary name and renamed, so an interrupted export can be run
+again and only redoes the chunks that are missing. The chunks are loaded one transaction each by
+MySQLDatabaseHandler.load_ndjson_chunks. The single init.json file copied into the Docker image
+can still be assembled from the chunks with --init-json.
+
+    python -m helpers.transformJSON [--source data/reduced-recipe.json] [--out-dir data/init-chunks]
+                                    [--chunk-size 5000] [--workers N] [--init-json init.json]
+"""
+
+base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+source_path = os.path.join(base_dir, "data", "reduced-recipe.json")
+chunks_dir = os.path.join(base_dir, "data", "init-chunks")
+
+TABLES = ("recipes", "reviews")
+MANIFEST = "manifest.json"
+
+RECIPE_FIELDS = ("RecipeId", "Name", "AuthorName", "Description", "RecipeInstructions")
+REVIEW_FIELDS = ("RecipeId", "AggregatedRating")
+
+
+"""
+Yields the elements of a top-level JSON array one at a time, reading the file in blocks.
+
+Parameters:
+    path (str): The JSON file.
+
+    block_size (int, optional): The number of characters read at a time. Defaults to 1 MiB.
+"""
+
+def iter_json_array(path, block_size=1 << 20):
+    decoder = json.JSONDecoder()
+    with open(path, 'r', encoding='utf-8') as file:
+        buffer = file.read(block_size).lstrip()
+        if not buffer.startswith("["):
+            raise ValueError(f"{path} does not contain a JSON array")
+        buffer, position, eof = buffer[1:], 0, False
+        while True:
+            # Skip whitespace and the separator before the next element
+            while position < len(buffer) and buffer[position] in " \t\r\n,":
+                position += 1
+            if position < len(buffer) and buffer[position] == "]":
+                return
+            try:
+                element, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                # The element is cut at the end of the block, read more
+                block = file.read(block_size)
+                eof = not block
+                buffer, position = buffer[position:] + block, 0
+                continue
+            yield element
+            position = end
+            if position > block_size:
+                buffer, position = buffer[position:], 0
+
+
+def chunk_paths(out_dir, index):
+    return {table: os.path.join(out_dir, f"{table}-{index:05d}.ndjson") for table in TABLES}
+
+
+def _chunk_done(out_dir, index):
+    return all(os.path.exists(path) for path in chunk_paths(out_dir, index).values())
+
+
+def _write_ndjson(path, rows):
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, 'w', encoding='utf-8') as file:
+        for row in rows:
+            file.write(json.dumps(row, ensure_ascii=False, separators=(",", ":")))
+            file.write("\n")
+    os.replace(tmp_path, path)
+
+
+def _export_chunk(out_dir, index, recipes):
+    # The recipes file is renamed last, a chunk counts as done once both files exist
+    paths = chunk_paths(out_dir, index)
+    _write_ndjson(paths["reviews"], ({field: recipe[field] for field in REVIEW_FIELDS} for recipe in recipes))
+    _write_ndjson(paths["recipes"], ({field: recipe[field] for field in RECIPE_FIELDS} for recipe in recipes))
+    return index, len(recipes)
+
+
+def _read_manifest(out_dir):
+    path = os.path.join(out_dir, MANIFEST)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as file:
+        return json.load(file)
+
+
+"""
+Exports the recipe dump as chunked NDJSON files, resuming an interrupted export. Temporary 
+files left behind by the interrupted run are removed first.
+
+Parameters:
+    source (str, optional): The recipe dump. Defaults to data/reduced-recipe.json.
+
+    out_dir (str, optional): The output directory. Defaults to data/init-chunks.
+
+    chunk_size (int, optional): The number of recipes per chunk. Defaults to 5000. Resuming must
+    use the chunk size of the interrupted run, so that the chunk boundaries match.
+
+    workers (int, optional): The number of worker processes. Defaults to the number of CPUs;
+    1 writes serially in this process.
+
+Returns:
+    dict: The manifest: {"source", "chunk_size", "rows", "resumed_chunks",
+    "chunks": [{"index", "rows", "recipes", "reviews"}]}
+"""
+
+def export_chunks(source=source_path, out_dir=chunks_dir, chunk_size=5000, workers=None):
+    os.makedirs(out_dir, exist_ok=True)
+    marker_path = os.path.join(out_dir, ".chunk-size")
+    if os.path.exists(marker_path):
+        with open(marker_path, 'r') as file:
+            previous = int(file.read())
+        if previous != chunk_size:
+            raise ValueError(f"{out_dir} was exported with chunk size {previous}, not {chunk_size}")
+    else:
+        with open(marker_path, 'w') as file:
+            file.write(str(chunk_size))
+
+    # The manifest describes a finished export only
+    if os.path.exists(os.path.join(out_dir, MANIFEST)):
+        os.remove(os.path.join(out_dir, MANIFEST))
+
+    # Temporary files of an interrupted run are never renamed into place
+    for item in os.listdir(out_dir):
+        if ".ndjson.tmp-" in item:
+            os.remove(os.path.join(out_dir, item))
+
+    rows = {}
+    skipped = 0
+
+    def chunks():
+        chunk = []
+        for recipe in iter_json_array(source):
+            chunk.append(recipe)
+            if len(chunk) == chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def pending():
+        nonlocal skipped
+        for index, chunk in enumerate(chunks()):
+            if _chunk_done(out_dir, index):
+                rows[index] = len(chunk)
+                skipped += 1
+                continue
+            yield index, chunk
+
+    if workers == 1:
+        for index, chunk in pending():
+            rows[index] = _export_chunk(out_dir, index, chunk)[1]
+    else:
+        workers = workers or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # Bound the chunks held in memory to a couple per worker
+            limit = 2 * workers
+            futures = []
+            for index, chunk in pending():
+                futures.append(executor.submit(_export_chunk, out_dir, index, chunk))
+                if len(futures) >= limit:
+                    done_index, count = futures.pop(0).result()
+                    rows[done_index] = count
+            for future in futures:
+                done_index, count = future.result()
+                rows[done_index] = count
+
+    # Chunks past the end of a shorter source are stale
+    index = len(rows)
+    while any(os.path.exists(path) for path in chunk_paths(out_dir, index).values()):
+        for path in chunk_paths(out_dir, index).values():
+            if os.path.exists(path):
+                os.remove(path)
+        index += 1
+
+    manifest = {
+        "source": os.path.basename(source),
+        "chunk_size": chunk_size,
+        "rows": sum(rows.values()),
+        "resumed_chunks": skipped,
+        "chunks": [dict({"index": i, "rows": rows[i]},
+                        **{table: os.path.basename(path) for table, path in chunk_paths(out_dir, i).items()})
+                   for i in sorted(rows)],
     }
+    tmp_path = os.path.join(out_dir, f"{MANIFEST}.tmp")
+    with open(tmp_path, 'w') as file:
+        json.dump(manifest, file, indent=2)
+    os.replace(tmp_path, os.path.join(out_dir, MANIFEST))
+    return manifest
+
+
+"""
+Yields the chunks of an export in order, from its manifest or, for an export that has not
+finished, from the chunk files present.
+
+Returns:
+    generator: (index (int), {table name: NDJSON path}) for every chunk.
+"""
+
+def iter_chunks(out_dir=chunks_dir):
+    manifest = _read_manifest(out_dir)
+    if manifest is not None:
+        for chunk in manifest["chunks"]:
+            yield chunk["index"], {table: os.path.join(out_dir, chunk[table]) for table in TABLES}
+        return
+    index = 0
+    while _chunk_done(out_dir, index):
+        yield index, chunk_paths(out_dir, index)
+        index += 1
+
+
+def read_ndjson(path):
+    with open(path, 'r', encoding='utf-8') as file:
+        for line in file:
+            if line.strip():
+                yield json.loads(line)
+
+
+"""
+Assembles the {"recipes": [...], "reviews": [...]} file read by load_json_into_db from the chunks
+of an export, compact and without holding the rows in memory.
+
+Returns:
+    str: The output file.
+"""
+
+def write_init_json(out_path, out_dir=chunks_dir):
+    chunks = list(iter_chunks(out_dir))
+    tmp_path = f"{out_path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as outfile:
+        outfile.write("{")
+        for position, table in enumerate(TABLES):
+            outfile.write(f'{"," if position else ""}"{table}":[')
+            first = True
+            for _, paths in chunks:
+                with open(paths[table], 'r', encoding='utf-8') as file:
+                    for line in file:
+                        line = line.strip()
+                        if line:
+                            outfile.write(line if first else "," + line)
+                            first = False
+            outfile.write("]")
+        outfile.write("}")
+    os.replace(tmp_path, out_path)
+    return out_path
 
-    transformed_data["recipes"].append(recipe_info)
-    transformed_data["reviews"].append(review_info)
 
-with open('../init.json', 'w') as outfile:
-    json.dump(transformed_data, outfile, indent=4)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the recipe dump as chunked NDJSON rows of recipes and reviews.")
+    parser.add_argument("--source", default=source_path)
+    parser.add_argument("--out-dir", default=chunks_dir)
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    parser.add_argument("--workers", type=int, help="worker processes (default: number of CPUs)")
+    parser.add_argument("--init-json", help="also assemble a single init.json file at this path")
+    args = parser.parse_args()
 
-print("Transformation complete. The data is saved in 'transformed_recipes.json'.")
+    manifest = export_chunks(args.source, args.out_dir, args.chunk_size, args.workers)
+    print(f"Exported {manifest['rows']} recipes in {len(manifest['chunks'])} chunks to {args.out_dir} "
+          f"({manifest['resumed_chunks']} already done)")
+    if args.init_json:
+        print(f"Wrote {write_init_json(args.init_json, args.out_dir)}")
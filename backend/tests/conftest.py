@@ -0,0 +1,8 @@
+import os
+import sys
+
+
+# The tests import the helpers package the way app.py does, from the backend directory
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if backend_dir not in sys.path:
+    sys.path.insert(0, backend_dir)
@@ -0,0 +1,129 @@
+import json
+import pytest
+import sqlalchemy as db
+from helpers.MySQLDatabaseHandler import MySQLDatabaseHandler, split_sql_statements
+from helpers.transformJSON import chunk_paths
+
+
+TABLES = [
+    "CREATE TABLE recipes (RecipeId INTEGER PRIMARY KEY, Name TEXT, AuthorName TEXT, Description TEXT, "
+    "RecipeInstructions TEXT)",
+    "CREATE TABLE reviews (RecipeId INTEGER PRIMARY KEY, AggregatedRating REAL)",
+]
+
+
+def _recipe(i):
+    return {"RecipeId": i, "Name": f"Dish {i}", "AuthorName": "cook", "Description": None,
+            "RecipeInstructions": 'c("Mix; then bake.")'}
+
+
+@pytest.fixture
+def handler():
+    handler = MySQLDatabaseHandler(None, None, None, None, engine_url="sqlite://")
+    handler.query_executor(TABLES)
+    # Every connection leased from the pool must be handed back
+    handler.leased = []
+    db.event.listen(handler.engine, "checkout", lambda *args: handler.leased.append(1))
+    db.event.listen(handler.engine, "checkin", lambda *args: handler.leased.pop())
+    yield handler
+    handler.engine.dispose()
+
+
+def _count(handler, table):
+    return handler.query_selector(f"SELECT COUNT(*) FROM {table}")[0][0]
+
+
+def test_connections_go_back_to_the_pool(handler):
+    with handler.lease_connection() as conn:
+        assert conn.execute(db.text("SELECT 1")).scalar() == 1
+        assert handler.leased == [1]
+    assert handler.leased == []
+
+    with pytest.raises(db.exc.OperationalError):
+        handler.query_selector("SELECT * FROM missing")
+    assert handler.leased == []
+
+    handler.bulk_insert("recipes", [_recipe(1)])
+    rows = handler.query_selector("SELECT Name FROM recipes WHERE RecipeId = :id", {"id": 1})
+    assert [tuple(row) for row in rows] == [("Dish 1",)]
+    assert handler.leased == []
+
+
+def test_transaction_rolls_back_on_error(handler):
+    with pytest.raises(RuntimeError):
+        with handler.transaction() as conn:
+            handler.bulk_insert("recipes", [_recipe(1)], conn=conn)
+            raise RuntimeError("fail")
+    assert _count(handler, "recipes") == 0
+    assert handler.leased == []
+
+
+def test_bulk_insert_in_chunks_of_one_transaction(handler, monkeypatch):
+    monkeypatch.setattr(MySQLDatabaseHandler, "CHUNK_SIZE", 4)
+    batches = []
+    db.event.listen(handler.engine, "before_execute",
+                    lambda conn, statement, multiparams, params, options: batches.append(len(multiparams)))
+
+    assert handler.bulk_insert("recipes", [_recipe(i) for i in range(10)]) == 10
+    assert batches == [4, 4, 2]
+    assert _count(handler, "recipes") == 10
+
+    # A duplicate key in the last chunk rolls back the whole insert
+    with pytest.raises(db.exc.IntegrityError):
+        handler.bulk_insert("recipes", [_recipe(i) for i in range(10, 20)] + [_recipe(0)])
+    assert _count(handler, "recipes") == 10
+
+    assert handler.bulk_insert("recipes", [dict(_recipe(0), Name="Renamed")], replace=True) == 1
+    assert handler.query_selector("SELECT Name FROM recipes WHERE RecipeId = 0")[0][0] == "Renamed"
+    assert handler.bulk_insert("recipes", []) == 0
+
+
+def test_bulk_insert_rejects_unsafe_identifiers(handler):
+    with pytest.raises(ValueError):
+        handler.bulk_insert("recipes; DROP TABLE reviews", [_recipe(1)])
+    with pytest.raises(ValueError):
+        handler.bulk_insert("recipes", [{"RecipeId) VALUES (1); --": 1}])
+
+
+def test_load_json_into_db(handler, tmp_path):
+    path = tmp_path / "init.json"
+    path.write_text(json.dumps({"recipes": [_recipe(1), _recipe(2)], "reviews": [{"RecipeId": 1, "AggregatedRating": 4.5}]}))
+    assert handler.load_json_into_db(str(path)) == {"recipes": 2, "reviews": 1}
+    assert handler.load_json_into_db(str(path)) == {"recipes": 2, "reviews": 1}
+    assert _count(handler, "recipes") == 2
+
+
+def test_load_ndjson_chunks_one_transaction_each(handler, tmp_path):
+    def write(index, recipes, reviews):
+        paths = chunk_paths(str(tmp_path), index)
+        for table, rows in (("recipes", recipes), ("reviews", reviews)):
+            with open(paths[table], 'w') as file:
+                file.writelines(json.dumps(row) + "\n" for row in rows)
+
+    write(0, [_recipe(1), _recipe(2)], [{"RecipeId": 1, "AggregatedRating": 5.0}])
+    write(1, [_recipe(3)], [{"RecipeId": 3, "AggregatedRating": None}])
+    assert handler.load_ndjson_chunks(str(tmp_path)) == {"recipes": 3, "reviews": 2}
+
+    # A bad row in chunk 1 keeps chunk 0, and only chunk 1 is rolled back
+    handler.query_executor(["DELETE FROM recipes", "DELETE FROM reviews"])
+    write(1, [_recipe(3)], [{"RecipeId": 3, "Unknown": 1}])
+    with pytest.raises(db.exc.OperationalError):
+        handler.load_ndjson_chunks(str(tmp_path))
+    assert _count(handler, "recipes") == 2
+    assert handler.leased == []
+
+
+def test_split_sql_statements():
+    sql = """
+        -- a comment; with a semicolon
+        DROP TABLE IF EXISTS a;
+        /* a block; comment */
+        INSERT INTO a VALUES ('x;y', "it\\"s;", `b;c`); # trailing; comment
+        INSERT INTO a VALUES ('it''s')
+    """
+    assert split_sql_statements(sql) == [
+        "DROP TABLE IF EXISTS a",
+        "INSERT INTO a VALUES ('x;y', \"it\\\"s;\", `b;c`)",
+        "INSERT INTO a VALUES ('it''s')",
+    ]
+    assert split_sql_statements(";;\n") == []
@@ -0,0 +1,139 @@
+import os
+import json
+import time
+import threading
+from types import SimpleNamespace
+import numpy as np
+import pytest
+from helpers import artifacts
+from helpers.artifacts import ArtifactHolder, ArtifactSet, watch_active_bundle
+
+
+@pytest.fixture
+def bundles(tmp_path, monkeypatch):
+    bundles_dir = tmp_path / "bundles"
+    for version in ("v1", "v2", "broken"):
+        os.makedirs(bundles_dir / version)
+        (bundles_dir / version / "manifest.json").write_text(json.dumps({"version": version, "files": {}}))
+    monkeypatch.setattr(artifacts, "bundles_dir", str(bundles_dir))
+    monkeypatch.setattr(artifacts, "current_file", str(bundles_dir / "CURRENT"))
+    monkeypatch.delenv("ARTIFACT_BUNDLE", raising=False)
+
+    loads = []
+
+    def load_artifacts(bundle_dir=None):
+        version = artifacts.read_manifest(bundle_dir)[0]
+        loads.append(version)
+        if version == "broken":
+            raise ValueError("broken bundle")
+        return ArtifactSet(version, bundle_version=version)
+
+    monkeypatch.setattr(artifacts, "load_artifacts", load_artifacts)
+    return loads
+
+
+def _wait(condition, seconds=5):
+    deadline = time.monotonic() + seconds
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_workers_follow_the_active_bundle(bundles):
+    artifacts.activate("v1")
+    holder = ArtifactHolder()
+    holder.load()
+    # Derived sets keep the version of their bundle
+    assert holder.swap(holder.current, holder.current.replace("v1+reviews.1"))
+
+    watch_active_bundle(holder, interval=0.01)
+    time.sleep(0.1)
+    assert bundles == ["v1"]
+
+    artifacts.activate("v2")
+    assert _wait(lambda: holder.current.version == "v2")
+
+    # A failing version is tried once and the served set is kept
+    artifacts.activate("broken")
+    assert _wait(lambda: "broken" in bundles)
+    time.sleep(0.1)
+    assert bundles.count("broken") == 1
+    assert holder.current.version == "v2"
+    assert holder.last_error == "broken bundle"
+
+    artifacts.activate("v1")
+    assert _wait(lambda: holder.current.version == "v1")
+
+
+@pytest.mark.parametrize("version", ["../v1", "v1/../v2", "/tmp", "..", ".", "", " v1", None])
+def test_versions_must_be_bundle_names(bundles, version):
+    with pytest.raises(ValueError):
+        artifacts.resolve_bundle(version) if version is not None else artifacts.bundle_path(version)
+    with pytest.raises(ValueError):
+        artifacts.activate(version)
+    assert not os.path.exists(artifacts.current_file)
+    assert artifacts.resolve_bundle("v1") == os.path.join(artifacts.bundles_dir, "v1")
+
+
+def test_only_one_concurrent_reload_starts(bundles, monkeypatch):
+    artifacts.activate("v1")
+    deferred = []
+
+    class DeferredThread(object):
+        # The reload threads only run once every call has returned, the widest possible race
+
+        def __init__(self, target, name=None, daemon=None):
+            self.target = target
+
+        def start(self):
+            deferred.append(self.target)
+
+    holder = ArtifactHolder()
+    monkeypatch.setattr(artifacts, "threading", SimpleNamespace(Thread=DeferredThread, Lock=threading.Lock))
+    assert [holder.reload_async() for _ in range(3)] == [True, False, False]
+
+    for run in deferred:
+        run()
+    assert len(deferred) == 1
+    assert holder.current.version == "v1"
+    assert not holder._reload_lock.locked()
+    assert holder.reload_async()
+
+
+class FakeEngine(object):
+
+    def __init__(self):
+        self.disposed = threading.Event()
+
+    def dispose(self):
+        self.disposed.set()
+
+
+def _db_set(version, engine):
+    return ArtifactSet(version, recipe_store=SimpleNamespace(handler=SimpleNamespace(engine=engine)))
+
+
+def test_holder_disposes_the_pool_of_a_replaced_recipe_store():
+    holder = ArtifactHolder(retire_grace=0)
+    first = _db_set("v1", FakeEngine())
+    assert holder.swap(None, first)
+    derived = first.replace("v1+reviews.1")
+    assert holder.swap(first, derived)
+    assert not first.recipe_store.handler.engine.disposed.wait(0.1)
+
+    second = _db_set("v2", FakeEngine())
+    assert holder.swap(derived, second)
+    assert first.recipe_store.handler.engine.disposed.wait(5)
+    assert not second.recipe_store.handler.engine.disposed.is_set()
+
+
+def test_loaded_weights_are_a_read_only_array():
+    if not os.path.exists(os.path.join(artifacts.data_root, "random-recipe.json")):
+        pytest.skip("no data files")
+    loaded = artifacts.load_artifacts(None)
+    ratings, counts, weights = loaded.rating_count_weight
+    assert isinstance(weights, np.ndarray) and weights.dtype == np.float64
+    assert not weights.flags.writeable
+    assert len(weights) == len(ratings) == len(counts) == len(loaded.name_ing_data[0])
+    # Converting it per request is a no-op now
+    assert np.asarray(weights, dtype=float) is weights
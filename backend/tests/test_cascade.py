@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+from helpers.matrix import _exact_ranking
+from helpers.cascade import CascadeIndex, validate_shortlists
+
+
+@pytest.fixture
+def data():
+    rng = np.random.default_rng(0)
+    matrix = rng.normal(size=(200, 24))
+    matrix[9] = 0
+    importance = np.sort(rng.uniform(0.1, 10, 24))
+    return matrix, rng.uniform(0.5, 1.5, len(matrix)), importance
+
+
+def test_shortlist_of_every_dish_is_the_exact_ranking(data):
+    matrix, weights, importance = data
+    # Ascending singular values as written by svds: the coarse dimensions are the last columns
+    index = CascadeIndex(matrix, importance, coarse_dims=4, shortlist=len(matrix))
+    assert sorted(index.dims.tolist()) == [20, 21, 22, 23]
+    for query in (0, 150):
+        expected, _, expected_weighted = _exact_ranking(query, matrix[query], matrix, (None, None, weights))
+        for candidates in (None, 10 * len(matrix)):
+            final, _, weighted = index.search(query, matrix, weights, candidates=candidates)
+            assert list(final) == list(expected)
+            assert [weighted[i] for i in final] == pytest.approx([expected_weighted[i] for i in final])
+
+    # Nothing is similar to a dish without flavors, every score is 0
+    final, _, weighted = index.search(9, matrix, weights)
+    assert 9 not in final and set(weighted.values()) == {0.0}
+
+
+def test_zero_query_vector(data):
+    matrix, weights, importance = data
+    index = CascadeIndex(matrix, importance, coarse_dims=4, shortlist=20)
+    final, cos, weighted = index.search_vector(np.zeros(24), matrix, weights)
+    assert len(final) == 10
+    assert set(cos.values()) == {0.0} and set(weighted.values()) == {0.0}
+
+
+def test_validate_shortlists(data):
+    matrix, weights, importance = data
+    reports = validate_shortlists(matrix, weights, importance, coarse_dims=4, shortlists=(10, 50, len(matrix)), sample=30)
+    assert [report["candidates"] for report in reports] == [10, 50, len(matrix)]
+    recalls = [report["recall@10"] for report in reports]
+    assert recalls == sorted(recalls)
+    assert reports[-1]["recall@10"] == 1.0 and reports[-1]["identical_top10"] == 1.0
+    # Without Σ the variance of the normalized vectors orders the dimensions
+    assert validate_shortlists(matrix, weights, None, coarse_dims=4, shortlists=(len(matrix),), sample=5)[0]["recall@10"] == 1.0
@@ -0,0 +1,48 @@
+import json
+import numpy as np
+import pytest
+from helpers.cossimNameMatch import build_name_index, cossimNameMatch, match_scores, read_name_index
+
+
+NAMES = ["Chocolate Chip Cookies", "Oatmeal Cookies", "Chocolate Cake", "Crème Brûlée", "Beef Stew",
+         "Beef and Barley Soup", "Chicken Noodle Soup", "Chocolate Chip Cookies", "Pão de Queijo",
+         "Chocolate-Chocolate Chip Muffins", "A", "Lemon Bars II"]
+QUERIES = ["chocolate", "Chocolate chip", "COOKIES", "beef soup", "crème", "queijo", "chip chip chip",
+           "pizza", "", "a", "lemon bars"]
+
+
+@pytest.fixture
+def recipes_path(tmp_path):
+    path = tmp_path / "reduced-recipe.json"
+    path.write_text(json.dumps([{"RecipeId": i, "Name": name} for i, name in enumerate(NAMES)]), encoding='utf-8')
+    return str(path)
+
+
+def test_written_index_reads_back_the_same(recipes_path, tmp_path):
+    pytest.importorskip("sklearn")
+    out_path = str(tmp_path / "name-tfidf-index.npz")
+    names, built = build_name_index(recipes_path, out_path)
+    read_names, read = read_name_index(out_path)
+
+    assert names == read_names == NAMES
+    assert read.vocabulary == built.vocabulary
+    for query in QUERIES:
+        assert np.array_equal(read.similarities(query), built.similarities(query))
+    assert cossimNameMatch("chocolate chip", read, read_names)[:2] == ["Chocolate Chip Cookies"] * 2
+
+
+def test_match_scores_match_the_tfidf_vectorizer(recipes_path):
+    TfidfVectorizer = pytest.importorskip("sklearn.feature_extraction.text").TfidfVectorizer
+    _, index = build_name_index(recipes_path, None)
+    vectorizer = TfidfVectorizer().fit(NAMES)
+    tfidf_matrix = vectorizer.transform(NAMES)
+
+    for query in QUERIES:
+        cosine_sim = tfidf_matrix.dot(vectorizer.transform([query]).T).toarray().ravel()
+        assert index.similarities(query) == pytest.approx(cosine_sim)
+        for threshold in (0.0, 0.3):
+            expected = sorted([(i, score) for i, score in enumerate(cosine_sim) if score > threshold],
+                              key=lambda x: x[1], reverse=True)[:10]
+            found = match_scores(query, index, threshold)
+            assert [i for i, _ in found] == [i for i, _ in expected]
+            assert [score for _, score in found] == pytest.approx([score for _, score in expected])
@@ -0,0 +1,81 @@
+import os
+import json
+import numpy as np
+import pytest
+from helpers.matrix import _exact_ranking, create_dict_from_directory, flavor_matrix, parse_flavor_directory
+from helpers.foldin import FoldIn
+
+
+pytest.importorskip("scipy")
+
+N_INGREDIENTS = 30
+N_FLAVORS = 120
+N_DISHES = 150
+
+
+@pytest.fixture(scope="module")
+def build(tmp_path_factory):
+    """
+    A flavor directory and dishes small enough to build quickly, large enough for the k=80 SVD
+    of flavor_matrix. With 30 ingredients the flavor matrix has rank 30, so 50 of the 80
+    singular values are numerically zero, as on the real data.
+    """
+    base_dir = tmp_path_factory.mktemp("build")
+    flavors_dir = base_dir / "flavors"
+    os.makedirs(flavors_dir)
+    os.makedirs(base_dir / "data")
+    rng = np.random.default_rng(0)
+    flavors = [f"flavor{i:03d}" for i in range(N_FLAVORS)]
+    ingredients = [f"ingredient {i}" for i in range(N_INGREDIENTS)]
+    for i, ingredient in enumerate(ingredients):
+        molecules = [{"flavor_profile": "@".join(rng.choice(flavors, size=rng.integers(1, 6), replace=False))}
+                     for _ in range(rng.integers(5, 15))]
+        (flavors_dir / f"{i} {ingredient.title()}.json").write_text(json.dumps({"molecules": molecules}))
+
+    dishes = [list(rng.choice(ingredients, size=rng.integers(2, 6), replace=False)) for _ in range(N_DISHES)]
+    name_ing_data = ([f"dish {i}" for i in range(N_DISHES)], list(range(N_DISHES)), dishes)
+    all_flavor_profiles, counts = parse_flavor_directory(str(flavors_dir), workers=1)
+    json_dict = create_dict_from_directory(str(flavors_dir))
+    flavor_matrix(N_DISHES, len(all_flavor_profiles), name_ing_data, json_dict, all_flavor_profiles, str(base_dir), counts)
+
+    data = base_dir / "data"
+    paths = {"latentflavor_flavors": str(data / "latentflavor_flavors.npy")}
+    return {
+        "dishes": dishes,
+        "U": np.load(data / "dish-latent-flavors-matrix.npy"),
+        "importance": np.load(data / "latent-importance.npy"),
+        "fold_in": FoldIn.from_paths(paths, all_flavor_profiles, np.load(data / "latent-importance.npy"),
+                                     json_dict, str(flavors_dir)),
+    }
+
+
+def test_build_writes_u_sigma_and_v_of_one_svd(build):
+    fold_in = build["fold_in"]
+    assert fold_in.projection.shape == (len(fold_in.flavor_index), 80)
+    # Only the numerically non-zero singular values are inverted
+    assert fold_in.components.sum() == N_INGREDIENTS
+    assert np.isfinite(fold_in.projection).all()
+    assert fold_in.agreement(build["dishes"], build["U"]) == pytest.approx(1.0)
+
+
+def test_folding_in_a_dish_profile_finds_that_dish(build):
+    weights = np.ones(N_DISHES)
+    for dish in range(0, N_DISHES, 10):
+        vector, matched, unknown = build["fold_in"].query_vector(build["dishes"][dish])
+        assert unknown == []
+        final, _, _ = _exact_ranking(None, vector, build["U"], (None, None, weights))
+        assert dish in list(final[:3])
+
+
+def test_agreement_detects_v_from_another_build(build):
+    fold_in = build["fold_in"]
+    # Another svds run may flip the signs of the singular vectors
+    signs = np.where(np.arange(80) % 2, -1.0, 1.0)
+    other = FoldIn(list(fold_in.flavor_index), fold_in.projection * build["importance"] * signs, build["importance"],
+                   ingredient_files=fold_in.ingredient_files, flavors_dir=fold_in.flavors_dir)
+    assert other.agreement(build["dishes"], build["U"]) < 0.99
+
+
+def test_v_and_sigma_must_have_the_same_components():
+    with pytest.raises(ValueError):
+        FoldIn(["sweet"], np.ones((1, 3)), np.ones(2))
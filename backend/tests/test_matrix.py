@@ -0,0 +1,127 @@
+import os
+import json
+import numpy as np
+import pytest
+from helpers import matrix
+from helpers.matrix import (collect_flavor_profiles_from_directory, extract_keywords, food_warnings, format_recipe,
+                            load_flavor_profiles, parse_flavor_directory, recipe_labels, slim_dish, top_ten,
+                            top_ten_for_vector, write_flavor_profiles)
+from helpers.recipeStore import JSONRecipeStore
+
+
+NAMES = [f"dish {i}" for i in range(14)]
+IDS = list(range(100, 114))
+INSTRUCTIONS = 'c("Brown the beef.", "Add milk and bread crumbs.", "Serve with wine.")'
+
+
+@pytest.fixture
+def data(tmp_path):
+    recipes = [{"RecipeId": recipe_id, "Name": name, "AuthorName": "cook", "Description": None if i % 2 else "x" * 300,
+                "RecipeInstructions": INSTRUCTIONS} for i, (recipe_id, name) in enumerate(zip(IDS, NAMES))]
+    path = tmp_path / "random-recipe.json"
+    path.write_text(json.dumps(recipes))
+
+    matrix = np.random.default_rng(0).normal(size=(len(NAMES), 12))
+    # Every other recipe has no rating, as AggregatedRating is None for a fifth of the real recipes
+    ratings = [None if i % 2 else 4.0 for i in range(len(NAMES))]
+    rating_count_weight = (ratings, [0 if i % 2 else 3 for i in range(len(NAMES))], np.ones(len(NAMES)))
+    lat_dims = {i: [f"word{i}"] for i in range(12)}
+    return (NAMES, IDS, [[] for _ in NAMES]), matrix, JSONRecipeStore(str(path)), rating_count_weight, lat_dims
+
+
+def test_slim_dish_without_a_rating():
+    card = slim_dish(["Stew", 0.5, 0.25, 7, None, "<br>", None, 0, ["Meat"], []])
+    assert card["rating"] is None
+    assert card["summary"] == ""
+    assert json.loads(json.dumps(card)) == card
+
+
+def test_slim_top_ten_matches_the_full_rows(data):
+    name_ing_data, matrix, store, rating_count_weight, lat_dims = data
+    full = top_ten("dish 0", name_ing_data, matrix, store, rating_count_weight, lat_dims)
+    slim = top_ten("dish 0", name_ing_data, matrix, store, rating_count_weight, lat_dims, slim=True)
+
+    assert slim == [slim_dish(row) for row in full]
+    assert any(card["rating"] is None for card in slim)
+    assert all(len(card["summary"]) <= 203 for card in slim)
+    json.dumps(slim)
+
+
+def test_slim_top_ten_skips_formatting_and_explanations(data, monkeypatch):
+    from helpers import matrix as matrix_module
+    name_ing_data, matrix, store, rating_count_weight, lat_dims = data
+
+    def fail(*args, **kwargs):
+        raise AssertionError("not needed by the slim view")
+
+    recipe_labels(INSTRUCTIONS)
+    monkeypatch.setattr(matrix_module, "format_recipe", fail)
+    monkeypatch.setattr(matrix_module, "top_ten_vector", fail)
+    monkeypatch.setattr(matrix_module, "top_latent", fail)
+
+    assert len(top_ten("dish 3", name_ing_data, matrix, store, rating_count_weight, lat_dims, slim=True)) == 10
+    vector = matrix[5] + matrix[6]
+    assert len(top_ten_for_vector(vector, name_ing_data, matrix, store, rating_count_weight, lat_dims, slim=True)) == 10
+
+
+def test_recipe_labels_match_food_warnings():
+    assert list(recipe_labels(INSTRUCTIONS)) == food_warnings(format_recipe(INSTRUCTIONS))
+
+
+def _write_flavors(directory):
+    molecules = [
+        {"flavor_profile": "sweet@fruity", "fooddb_flavor_profile": "ignored@sweet", "fema_flavor_profile": "fema"},
+        {"flavor_profile": "sweet@@bitter"},
+        {"flavor_profile": ""},
+        {"common_name": "no profile"},
+        {"flavor_profile": 'smoky \\"bacon\\"@caf\\u00e9', "odor": '"flavor_profile": "decoy"'},
+    ]
+    (directory / "0 Egg.json").write_text(json.dumps({"entity_alias": "egg", "molecules": molecules}, indent=4))
+    (directory / "1 Milk.json").write_text(json.dumps({"molecules": molecules[1:3]}))
+    (directory / "2 Water.json").write_text(json.dumps({"molecules": []}))
+    (directory / "notes.txt").write_text("not an ingredient")
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_parse_flavor_directory_matches_the_json_parse(tmp_path, workers):
+    _write_flavors(tmp_path)
+    flavor_profiles, counts = parse_flavor_directory(str(tmp_path), workers=workers, chunk_size=2)
+    assert flavor_profiles == collect_flavor_profiles_from_directory(str(tmp_path))
+    assert counts == {item: extract_keywords(str(tmp_path / item))
+                      for item in ("0 Egg.json", "1 Milk.json", "2 Water.json")}
+
+
+def test_parse_flavor_directory_on_the_flavor_data():
+    directory = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "flavors")
+    if not os.path.isdir(directory):
+        pytest.skip("no data/flavors directory")
+    flavor_profiles, counts = parse_flavor_directory(directory)
+    assert flavor_profiles == collect_flavor_profiles_from_directory(directory)
+    for item in sorted(counts)[::25]:
+        assert counts[item] == extract_keywords(os.path.join(directory, item))
+
+
+def test_flavor_profile_cache_is_keyed_on_the_directory(tmp_path, monkeypatch):
+    directory = tmp_path / "flavors"
+    directory.mkdir()
+    _write_flavors(directory)
+    cache_path = str(tmp_path / "all_flavor_profiles.json")
+    flavor_profiles, _ = write_flavor_profiles(str(directory), cache_path, workers=1)
+
+    # A matching cache skips the parse
+    def parse(*args, **kwargs):
+        raise AssertionError("parsed the directory")
+    with monkeypatch.context() as patch:
+        patch.setattr(matrix, "parse_flavor_directory", parse)
+        assert load_flavor_profiles(str(directory), cache_path) == flavor_profiles
+
+    # A changed directory is parsed again, and the cache is left alone at serve time
+    cached = (tmp_path / "all_flavor_profiles.json").read_text()
+    (directory / "3 Salt.json").write_text(json.dumps({"molecules": [{"flavor_profile": "salty"}]}))
+    assert load_flavor_profiles(str(directory), cache_path) == sorted(flavor_profiles + ["salty"])
+    assert (tmp_path / "all_flavor_profiles.json").read_text() == cached
+
+    # So is an unkeyed cache
+    (tmp_path / "all_flavor_profiles.json").write_text(json.dumps(["stale"]))
+    assert load_flavor_profiles(str(directory), cache_path) == sorted(flavor_profiles + ["salty"])
+    assert json.loads((tmp_path / "all_flavor_profiles.json").read_text()) == ["stale"]
@@ -0,0 +1,21 @@
+import os
+from helpers import metrics
+
+
+def test_snapshots_of_gone_workers_are_not_aggregated(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_DIR", str(tmp_path))
+    (tmp_path / "1.json").write_text('{"histograms": {}, "counters": [["requests_total", "gone", 5]]}')
+    (tmp_path / "2.json.tmp").write_text('{')
+    metrics.incr("requests_total", "here")
+    metrics.observe("stage", 0.01)
+
+    counters = {label: value for name, label, value in metrics.aggregate()["counters"] if name == "requests_total"}
+    assert counters["gone"] == 5
+    assert os.path.exists(tmp_path / f"{os.getpid()}.json")
+
+    metrics.remove_snapshot(1)
+    counters = {label: value for name, label, value in metrics.aggregate()["counters"] if name == "requests_total"}
+    assert "gone" not in counters and counters["here"] >= 1
+
+    metrics.clear_snapshots()
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+from helpers.matrix import _exact_ranking
+from helpers.quantize import QuantizedIndex
+
+
+@pytest.fixture
+def data():
+    rng = np.random.default_rng(0)
+    matrix = rng.normal(size=(300, 16))
+    # Dishes without any flavor
+    matrix[[5, 17, 250]] = 0
+    weights = rng.uniform(0.5, 1.5, len(matrix))
+    return matrix, weights
+
+
+def _assert_same_ranking(found, expected):
+    final, cos, weighted = found
+    expected_final, expected_cos, expected_weighted = expected
+    assert list(final) == list(expected_final)
+    for i in final:
+        assert cos[i] == pytest.approx(expected_cos[i])
+        assert weighted[i] == pytest.approx(expected_weighted[i])
+
+
+def test_search_matches_the_exact_ranking(data, tmp_path):
+    matrix, weights = data
+    index = QuantizedIndex.build(matrix)
+    index.save(tmp_path / "int8.npz")
+    loaded = QuantizedIndex.load(tmp_path / "int8.npz")
+    for query in (0, 42, 299):
+        expected = _exact_ranking(query, matrix[query], matrix, (None, None, weights))
+        _assert_same_ranking(index.search(query, matrix, weights), expected)
+        _assert_same_ranking(loaded.search(query, matrix, weights), expected)
+        # A shortlist longer than the matrix is the exact scan
+        _assert_same_ranking(index.search(query, matrix, weights, candidates=1000), expected)
+
+
+def test_search_vector_matches_the_exact_ranking(data):
+    matrix, weights = data
+    index = QuantizedIndex.build(matrix)
+    vector = matrix[3] + 0.5 * matrix[8]
+    _assert_same_ranking(index.search_vector(vector, matrix, weights),
+                         _exact_ranking(None, vector, matrix, (None, None, weights)))
+
+
+def test_zero_norm_rows_and_queries(data):
+    matrix, weights = data
+    index = QuantizedIndex.build(matrix)
+    assert not index.codes[[5, 17, 250]].any()
+    assert np.isfinite(index.scales).all()
+
+    scores = index.approximate_scores(matrix[0])
+    assert np.isfinite(scores).all() and not scores[[5, 17, 250]].any()
+
+    # A query without flavors is similar to nothing, as in the exact scan
+    final, cos, weighted = index.search(5, matrix, weights)
+    assert len(final) == 10 and 5 not in final
+    assert set(cos.values()) == {0.0} and set(weighted.values()) == {0.0}
+    assert not index.approximate_scores(np.zeros(16)).any()
+
+    # A matrix of zeros only
+    empty = QuantizedIndex.build(np.zeros((4, 3)))
+    assert (empty.scales == 1).all()
+    assert len(empty.search(0, np.zeros((4, 3)), np.ones(4), k=10)[0]) == 3
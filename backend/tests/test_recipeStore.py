@@ -0,0 +1,64 @@
+import json
+import pytest
+from helpers.recipeStore import DatabaseRecipeStore, JSONRecipeStore
+from helpers.MySQLDatabaseHandler import MySQLDatabaseHandler
+
+
+RECIPES = [{"RecipeId": i, "Name": f"Dish {i}", "AuthorName": "cook", "Description": f"About {i}",
+            "RecipeInstructions": 'c("Mix.")'} for i in range(1, 6)]
+
+
+@pytest.fixture
+def handler(tmp_path):
+    handler = MySQLDatabaseHandler(None, None, None, None, engine_url=f"sqlite:///{tmp_path / 'db.sqlite'}")
+    handler.query_executor("CREATE TABLE recipes (RecipeId INTEGER PRIMARY KEY, Name TEXT, AuthorName TEXT, "
+                           "Description TEXT, RecipeInstructions TEXT)")
+    handler.bulk_insert("recipes", RECIPES)
+    return handler
+
+
+class CountingHandler(object):
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.queries = []
+
+    def query_selector(self, query, params=None):
+        self.queries.append(sorted(params.values()))
+        return self.handler.query_selector(query, params)
+
+
+def test_database_store_returns_rows_in_request_order(handler):
+    store = DatabaseRecipeStore(handler)
+    rows = store.get_recipes([4, 1, 4, 2])
+    assert [row["RecipeId"] for row in rows] == [4, 1, 4, 2]
+    assert rows[1] == RECIPES[0]
+
+
+def test_database_store_queries_only_uncached_ids(handler):
+    counting = CountingHandler(handler)
+    store = DatabaseRecipeStore(counting, cache_size=3)
+
+    store.get_recipes([1, 2])
+    store.get_recipes([2, 3])
+    assert counting.queries == [[1, 2], [3]]
+
+    # 1 is the least recently used of the three cached rows
+    store.get_recipes([4])
+    store.get_recipes([2, 3, 4])
+    store.get_recipes([1])
+    assert counting.queries[2:] == [[4], [1]]
+
+
+def test_database_store_unknown_id(handler):
+    with pytest.raises(KeyError):
+        DatabaseRecipeStore(handler).get_recipes([1, 99])
+
+
+def test_json_store(tmp_path):
+    path = tmp_path / "recipes.json"
+    path.write_text(json.dumps(RECIPES))
+    store = JSONRecipeStore(str(path))
+    assert [row["Name"] for row in store.get_recipes(["3", 5])] == ["Dish 3", "Dish 5"]
+    with pytest.raises(KeyError):
+        store.get_recipes([99])
@@ -0,0 +1,32 @@
+import json
+from types import SimpleNamespace
+import numpy as np
+from helpers.recipeStore import JSONRecipeStore
+from helpers.regression import BaselineTopTenEngine, TopTenEngine, compare_engine
+
+
+def test_rewritten_scan_matches_the_original_loop(tmp_path):
+    rng = np.random.default_rng(0)
+    names = [f"dish {i}" for i in range(60)]
+    ids = list(range(500, 560))
+    matrix = rng.normal(size=(60, 8))
+    # A dish without flavors scores 0 in both
+    matrix[7] = 0
+    path = tmp_path / "recipes.json"
+    path.write_text(json.dumps([{"RecipeId": recipe_id, "Name": name, "Description": "", "RecipeInstructions": 'c("Mix.")'}
+                                for recipe_id, name in zip(ids, names)]))
+    artifacts = SimpleNamespace(
+        name_ing_data=(names, ids, [[] for _ in names]), dish_latentflavors=matrix,
+        recipe_store=JSONRecipeStore(str(path)), lat_dims={i: [f"word{i}"] for i in range(8)},
+        rating_count_weight=([4.0] * 60, [1] * 60, rng.uniform(0.5, 1.5, 60)))
+
+    baseline = BaselineTopTenEngine(artifacts)
+    golden = {"dish": []}
+    for query in names[:12]:
+        items, scores = baseline.rank(query)
+        golden["dish"].append({"query": query, "items": items, "scores": scores})
+    assert len(golden["dish"][0]["items"]) == 10
+
+    report = compare_engine(TopTenEngine(artifacts), golden)
+    assert report["identical_top10"] == 1.0
+    assert report["max_score_delta"] < 1e-12
@@ -0,0 +1,81 @@
+import time
+import numpy as np
+import pytest
+from helpers.reviews import ReviewAggregator, append_reviews, review_weight
+from helpers.artifacts import ArtifactHolder, ArtifactSet, follow_review_log
+
+
+DISH_IDS = (10, 20, 30)
+
+
+def _weights():
+    ratings, counts = (4.0, None, 2.0), (2, 0, 1)
+    weights = np.array([review_weight(rating, count) for rating, count in zip(ratings, counts)])
+    weights.flags.writeable = False
+    return (ratings, counts, weights)
+
+
+def test_batches_fold_into_the_running_averages(tmp_path):
+    log_path = str(tmp_path / "reviews.log")
+    loaded = _weights()
+    aggregator = ReviewAggregator(DISH_IDS, loaded, log_path)
+    assert aggregator.poll() is None
+
+    append_reviews([{"RecipeId": 10, "Rating": 1}, {"RecipeId": 20, "Rating": 5}], log_path)
+    ratings, counts, weights = aggregator.poll()
+
+    # (4.0 * 2 + 1) / 3, and a first review for a dish without a rating
+    assert ratings == pytest.approx((3.0, 5.0, 2.0))
+    assert counts == (3, 1, 1)
+    assert weights[0] == pytest.approx(review_weight(3.0, 3))
+    assert weights[1] == pytest.approx(review_weight(5.0, 1))
+    assert weights[2] == loaded[2][2]
+    assert not weights.flags.writeable
+    # The vectors being served are left untouched
+    assert loaded[0] == (4.0, None, 2.0) and loaded[1] == (2, 0, 1)
+
+    append_reviews([{"RecipeId": 30, "Rating": 4}], log_path)
+    ratings, counts, _ = aggregator.poll()
+    assert ratings == pytest.approx((3.0, 5.0, 3.0))
+    assert counts == (3, 1, 2)
+
+
+def test_incomplete_malformed_and_unknown_lines(tmp_path):
+    log_path = tmp_path / "reviews.log"
+    aggregator = ReviewAggregator(DISH_IDS, _weights(), str(log_path))
+
+    log_path.write_text('not json\n{"RecipeId": 99, "Rating": 5}\n{"RecipeId": 10, "Rat')
+    # Nothing known is complete yet
+    assert aggregator.poll() is None
+
+    with open(log_path, 'a') as file:
+        file.write('ing": 5}\n')
+    ratings, counts, _ = aggregator.poll()
+    assert counts[0] == 3
+    assert ratings[0] == pytest.approx(13.0 / 3)
+
+
+def test_follower_swaps_in_a_new_version(tmp_path):
+    log_path = str(tmp_path / "reviews.log")
+    holder = ArtifactHolder()
+    base = ArtifactSet("v1", name_ing_data=(("a", "b", "c"), DISH_IDS, ((), (), ())),
+                       rating_count_weight=_weights(), search_index=None)
+    assert holder.swap(None, base)
+
+    follow_review_log(holder, log_path, interval=0.01)
+    append_reviews([{"RecipeId": 20, "Rating": 3}], log_path)
+    deadline = time.monotonic() + 5
+    while holder.current is base and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    first = holder.current
+    assert first.version == "v1+reviews.1"
+    assert first.rating_count_weight[1] == (2, 1, 1)
+    # Everything else is shared with the set it was derived from
+    assert first.name_ing_data is base.name_ing_data
+
+    append_reviews([{"RecipeId": 20, "Rating": 5}], log_path)
+    while holder.current is first and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert holder.current.version == "v1+reviews.2"
+    assert holder.current.rating_count_weight[0][1] == pytest.approx(4.0)
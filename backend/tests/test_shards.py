@@ -0,0 +1,122 @@
+import threading
+import multiprocessing
+from multiprocessing.connection import Client
+import numpy as np
+import pytest
+from helpers.matrix import _exact_ranking
+from helpers.shards import ShardedIndex, serve_shard, sharded_index_from_env
+from helpers.artifacts import ArtifactHolder, ArtifactSet
+
+
+@pytest.fixture
+def matrix_path(tmp_path):
+    path = tmp_path / "matrix.npy"
+    np.save(path, np.random.default_rng(0).normal(size=(40, 6)))
+    return str(path)
+
+
+def _start_shard(matrix_path, start, end, weights, authkey):
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(target=serve_shard, daemon=True,
+                                      args=(("127.0.0.1", 0), matrix_path, start, end, weights[start:end], authkey, sender))
+    process.start()
+    return process, receiver.recv()
+
+
+def _assert_exact(index, matrix, weights, query):
+    final, cos, weighted = index.search(query, matrix)
+    expected, expected_cos, expected_weighted = _exact_ranking(query, matrix[query], matrix, (None, None, weights))
+    assert list(final) == list(expected)
+    for i in final:
+        assert cos[i] == pytest.approx(expected_cos[i])
+        assert weighted[i] == pytest.approx(expected_weighted[i])
+
+
+def test_local_shards_use_a_private_key(matrix_path):
+    matrix = np.load(matrix_path)
+    weights = np.linspace(1, 2, len(matrix))
+    index = ShardedIndex.start_local(matrix_path, weights, n_shards=3)
+    try:
+        assert all(host == "127.0.0.1" for host, _ in index.addresses)
+        assert len(index.authkey) == 32
+        with pytest.raises(multiprocessing.AuthenticationError):
+            Client(index.addresses[0], authkey=b"flavor-shards")
+        _assert_exact(index, matrix, weights, 5)
+    finally:
+        index.close()
+    assert not any(process.is_alive() for process in index.processes)
+
+
+def test_weights_follow_the_ranges_the_shards_report(matrix_path):
+    matrix = np.load(matrix_path)
+    weights = np.ones(len(matrix))
+    authkey = b"test-key"
+    # Uneven ranges, as remote shards started by hand may have
+    shards = [_start_shard(matrix_path, start, end, weights, authkey) for start, end in ((0, 7), (7, 31), (31, 40))]
+    index = ShardedIndex([address for _, address in shards], authkey, [process for process, _ in shards])
+    try:
+        assert index.ranges() == [(0, 7), (7, 31), (31, 40)]
+        updated = np.random.default_rng(1).uniform(0.5, 2.0, len(matrix))
+        index.update_weights(updated)
+        _assert_exact(index, matrix, updated, 12)
+        with pytest.raises(ValueError):
+            index.update_weights(updated[:30])
+    finally:
+        index.close()
+
+
+def test_remote_shards_need_a_shared_key(monkeypatch, matrix_path):
+    monkeypatch.setenv("SHARD_ADDRESSES", "127.0.0.1:1")
+    monkeypatch.delenv("SHARD_AUTHKEY", raising=False)
+    with pytest.raises(RuntimeError):
+        sharded_index_from_env(matrix_path, np.ones(40))
+
+    monkeypatch.setenv("SHARD_AUTHKEY", "secret")
+    index = sharded_index_from_env(matrix_path, np.ones(40))
+    assert index.authkey == b"secret" and index.processes == []
+
+
+class FakeIndex(object):
+
+    def __init__(self):
+        self.closed = threading.Event()
+
+    def close(self):
+        self.closed.set()
+
+
+def test_holder_closes_the_replaced_search_index():
+    holder = ArtifactHolder(retire_grace=0)
+    first = ArtifactSet("v1", search_index=FakeIndex())
+    assert holder.swap(None, first)
+
+    # A derived set (e.g. new review weights) keeps the index running
+    derived = first.replace("v1+reviews.1")
+    assert holder.swap(first, derived)
+    assert not first.search_index.closed.wait(0.1)
+
+    second = ArtifactSet("v2", search_index=FakeIndex())
+    assert holder.swap(derived, second)
+    assert first.search_index.closed.wait(5)
+    assert not second.search_index.closed.is_set()
+
+
+def _close_in_child(index):
+    index.close()
+
+
+def test_forked_processes_leave_the_shards_running(matrix_path):
+    matrix = np.load(matrix_path)
+    weights = np.ones(len(matrix))
+    index = ShardedIndex.start_local(matrix_path, weights, n_shards=2)
+    try:
+        # As a gunicorn worker retiring the set it inherited from the preloading master
+        child = multiprocessing.get_context("fork").Process(target=_close_in_child, args=(index,))
+        child.start()
+        child.join(10)
+        assert child.exitcode == 0
+        assert all(process.is_alive() for process in index.processes)
+        _assert_exact(index, matrix, weights, 3)
+    finally:
+        index.close()
+    assert not any(process.is_alive() for process in index.processes)
@@ -0,0 +1,142 @@
+import threading
+from concurrent.futures import TimeoutError as FutureTimeoutError
+import pytest
+from helpers.singleflight import SingleFlight
+
+
+def _start(target, results, *args):
+    thread = threading.Thread(target=lambda: results.append(target(*args)))
+    thread.start()
+    return thread
+
+
+def _wait_in_flight(flight, count):
+    for _ in range(1000):
+        if flight.in_flight() == count:
+            return
+        threading.Event().wait(0.001)
+    raise AssertionError("computation did not start")
+
+
+def test_followers_share_the_leader_result():
+    flight = SingleFlight("test")
+    release = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        release.wait(5)
+        return object()
+
+    results = []
+    leader = _start(flight.do, results, "key", compute)
+    _wait_in_flight(flight, 1)
+    followers = [_start(flight.do, results, "key", compute) for _ in range(4)]
+    release.set()
+    for thread in [leader] + followers:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert len(results) == 5
+    assert all(result is results[0] for result in results)
+    assert flight.in_flight() == 0
+
+
+def test_different_keys_compute_separately():
+    flight = SingleFlight("test")
+    assert flight.do("a", lambda: 1) == 1
+    assert flight.do("b", lambda: 2) == 2
+    # A finished key is not cached: the next call computes again
+    assert flight.do("a", lambda: 3) == 3
+
+
+def test_followers_get_the_leader_exception():
+    flight = SingleFlight("test")
+    release = threading.Event()
+
+    def fail():
+        release.wait(5)
+        raise ValueError("boom")
+
+    errors = []
+
+    def call():
+        try:
+            flight.do("key", fail)
+        except ValueError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call)]
+    threads[0].start()
+    _wait_in_flight(flight, 1)
+    threads += [threading.Thread(target=call) for _ in range(2)]
+    for thread in threads[1:]:
+        thread.start()
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(errors) == 3
+    assert all(error is errors[0] for error in errors)
+    assert flight.in_flight() == 0
+
+
+def test_follower_timeout_leaves_the_leader_running():
+    flight = SingleFlight("test")
+    release = threading.Event()
+    results = []
+    leader = _start(flight.do, results, "key", lambda: release.wait(5) and "done")
+    _wait_in_flight(flight, 1)
+
+    with pytest.raises(FutureTimeoutError):
+        flight.do("key", lambda: "other", timeout=0.01)
+    assert flight.in_flight() == 1
+
+    release.set()
+    leader.join(5)
+    assert results == ["done"]
+    assert flight.in_flight() == 0
+
+
+def test_wait_joins_a_running_computation_only():
+    flight = SingleFlight("test")
+    # Nothing running: wait does not start a computation
+    assert flight.wait("key") is None
+    assert flight.in_flight() == 0
+
+    release = threading.Event()
+    results = []
+    leader = _start(flight.do, results, "key", lambda: release.wait(5) and "done")
+    _wait_in_flight(flight, 1)
+    with pytest.raises(FutureTimeoutError):
+        flight.wait("key", timeout=0.01)
+
+    waiter = _start(flight.wait, results, "key", 5)
+    release.set()
+    for thread in (leader, waiter):
+        thread.join(5)
+    assert results == ["done", "done"]
+    assert flight.wait("key") is None
+
+
+def test_leader_timeout_and_late_waiters():
+    flight = SingleFlight("test", linger=5)
+    release = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        release.wait(5)
+        return "done"
+
+    # The first caller times out like the followers, the computation keeps running
+    with pytest.raises(FutureTimeoutError):
+        flight.do("key", compute, timeout=0.01)
+    assert flight.in_flight() == 1
+    release.set()
+    _wait_in_flight(flight, 0)
+
+    # A caller that timed out just before the computation finished still gets its result
+    assert flight.wait("key", timeout=0) == "done"
+    assert calls == [1]
+    assert SingleFlight("test").wait("key") is None
@@ -0,0 +1,18 @@
+import pytest
+from helpers import startup
+
+
+@pytest.mark.parametrize("enabled", [False, True])
+def test_stages_are_recorded_for_the_report_only(monkeypatch, enabled):
+    monkeypatch.setattr(startup, "ENABLED", enabled)
+    monkeypatch.setattr(startup, "_stages", [])
+    for _ in range(3):
+        with startup.stage("reload"):
+            pass
+    assert [name for name, _ in startup._stages] == (["reload"] * 3 if enabled else [])
+
+    # Exceptions leave the stage either way
+    with pytest.raises(ValueError):
+        with startup.stage("failing"):
+            raise ValueError()
+    assert ("failing" in [name for name, _ in startup._stages]) == enabled
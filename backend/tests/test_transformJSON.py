@@ -0,0 +1,90 @@
+import os
+import json
+import pytest
+from helpers import transformJSON
+from helpers.MySQLDatabaseHandler import MySQLDatabaseHandler
+
+
+def _recipes(count):
+    return [{"RecipeId": i, "Name": f"Dish {i} é", "AuthorName": "cook", "Description": None,
+             "RecipeInstructions": 'c("Mix.", "Bake [5] minutes.")', "RecipeIngredientParts": "c()",
+             "AggregatedRating": None if i % 3 else 4.5, "ReviewCount": i % 4}
+            for i in range(1, count + 1)]
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / "reduced-recipe.json"
+    path.write_text(json.dumps(_recipes(23), indent=4), encoding='utf-8')
+    return str(path)
+
+
+def _rows(out_dir, table):
+    return [row for _, paths in transformJSON.iter_chunks(out_dir) for row in transformJSON.read_ndjson(paths[table])]
+
+
+def test_iter_json_array_across_block_boundaries(source):
+    with open(source, 'r', encoding='utf-8') as file:
+        expected = json.load(file)
+    assert list(transformJSON.iter_json_array(source, block_size=7)) == expected
+
+
+def test_export_writes_both_tables_in_chunks(source, tmp_path):
+    out_dir = str(tmp_path / "chunks")
+    manifest = transformJSON.export_chunks(source, out_dir, chunk_size=5, workers=1)
+
+    assert manifest["rows"] == 23
+    assert [chunk["rows"] for chunk in manifest["chunks"]] == [5, 5, 5, 5, 3]
+    recipes = _recipes(23)
+    assert _rows(out_dir, "recipes") == [{field: r[field] for field in transformJSON.RECIPE_FIELDS} for r in recipes]
+    assert _rows(out_dir, "reviews") == [{field: r[field] for field in transformJSON.REVIEW_FIELDS} for r in recipes]
+
+
+def test_parallel_export_matches_serial(source, tmp_path):
+    transformJSON.export_chunks(source, str(tmp_path / "serial"), chunk_size=4, workers=1)
+    transformJSON.export_chunks(source, str(tmp_path / "parallel"), chunk_size=4, workers=2)
+    for table in transformJSON.TABLES:
+        assert _rows(str(tmp_path / "parallel"), table) == _rows(str(tmp_path / "serial"), table)
+
+
+def test_resume_redoes_only_the_interrupted_chunk(source, tmp_path):
+    out_dir = str(tmp_path / "chunks")
+    transformJSON.export_chunks(source, out_dir, chunk_size=5, workers=1)
+    expected = {table: _rows(out_dir, table) for table in transformJSON.TABLES}
+
+    # Interrupted between the two renames of chunk 2, with a temporary file left behind
+    paths = transformJSON.chunk_paths(out_dir, 2)
+    os.replace(paths["recipes"], paths["recipes"] + ".tmp-1234")
+    os.remove(os.path.join(out_dir, transformJSON.MANIFEST))
+    untouched = os.path.getmtime(transformJSON.chunk_paths(out_dir, 0)["recipes"])
+
+    manifest = transformJSON.export_chunks(source, out_dir, chunk_size=5, workers=1)
+    assert manifest["resumed_chunks"] == 4
+    assert not [item for item in os.listdir(out_dir) if ".tmp-" in item]
+    assert os.path.getmtime(transformJSON.chunk_paths(out_dir, 0)["recipes"]) == untouched
+    assert {table: _rows(out_dir, table) for table in transformJSON.TABLES} == expected
+
+    with pytest.raises(ValueError):
+        transformJSON.export_chunks(source, out_dir, chunk_size=6, workers=1)
+
+
+def test_init_json_and_chunked_db_load(source, tmp_path):
+    out_dir = str(tmp_path / "chunks")
+    transformJSON.export_chunks(source, out_dir, chunk_size=10, workers=1)
+
+    init_path = transformJSON.write_init_json(str(tmp_path / "init.json"), out_dir)
+    with open(init_path, 'r', encoding='utf-8') as file:
+        data = json.load(file)
+    assert data == {table: _rows(out_dir, table) for table in transformJSON.TABLES}
+
+    handler = MySQLDatabaseHandler(None, None, None, None, engine_url=f"sqlite:///{tmp_path / 'db.sqlite'}")
+    handler.query_executor([
+        "CREATE TABLE recipes (RecipeId INTEGER PRIMARY KEY, Name TEXT, AuthorName TEXT, Description TEXT, "
+        "RecipeInstructions TEXT)",
+        "CREATE TABLE reviews (RecipeId INTEGER PRIMARY KEY, AggregatedRating REAL)",
+    ])
+    assert handler.load_ndjson_chunks(out_dir) == {"recipes": 23, "reviews": 23}
+    # Loading again replaces the rows instead of failing on the keys
+    assert handler.load_ndjson_chunks(out_dir) == {"recipes": 23, "reviews": 23}
+    assert handler.query_selector("SELECT COUNT(*) FROM recipes")[0][0] == 23
+    assert handler.query_selector("SELECT AggregatedRating FROM reviews WHERE RecipeId = 3")[0][0] == 4.5
@@ -4,4 +4,20 @@ CREATE TABLE episodes(
     id int,
     title varchar(64),
     descr varchar(1024)
-);
\ No newline at end of file
+);
+DROP TABLE IF EXISTS recipes;
+
+CREATE TABLE recipes(
+    RecipeId int PRIMARY KEY,
+    Name varchar(255),
+    AuthorName varchar(255),
+    Description text,
+    RecipeInstructions mediumtext
+);
+
+DROP TABLE IF EXISTS reviews;
+
+CREATE TABLE reviews(
+    RecipeId int PRIMARY KEY,
+    AggregatedRating float
+);